@@ -0,0 +1,104 @@
+"""Log append-only das escritas em agendamentos e a sincronização por cursor.
+
+Toda mutação (services, importação) grava aqui, antes do commit, o id de
+cada agendamento alterado. O cliente guarda o último id visto e pede em
+/api/changes?since=<cursor> só o que mudou depois dele: os agendamentos
+gravados (no mesmo formato dos eventos ao vivo) e os ids apagados.
+
+O log é podado após DIAS_RETENCAO; um cursor anterior ao que restou (ou
+de outro banco) recebe "reset" e o cliente recarrega tudo.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert
+
+from models import db, AlteracaoAgendamento
+from cache import versao_agendamentos
+import serializacao
+
+
+LIMITE = 500
+DIAS_RETENCAO = 7
+
+
+def registrar(ids, operacao="UPSERT"):
+    """Acrescenta as linhas na transação atual; o chamador faz o commit.
+
+    Incrementa também a versão compartilhada dos agendamentos, que
+    invalida os caches dos outros processos.
+    """
+    if not ids:
+        return
+    agora = datetime.now()
+    db.session.execute(
+        insert(AlteracaoAgendamento),
+        [{"agendamento_id": int(i), "operacao": operacao, "criado_em": agora} for i in ids],
+    )
+    versao_agendamentos.registrar()
+
+
+def cursor_atual():
+    return db.session.query(func.max(AlteracaoAgendamento.id)).scalar() or 0
+
+
+def decodificar_cursor(valor):
+    try:
+        cursor = int(valor)
+    except (TypeError, ValueError):
+        raise ValueError("cursor inválido")
+    if cursor < 0:
+        raise ValueError("cursor inválido")
+    return cursor
+
+
+def desde(cursor, limite=LIMITE):
+    """Alterações com id > cursor, da mais antiga para a mais nova.
+
+    Devolve {"cursor", "upserts", "deletes", "mais", "reset"}; cada
+    agendamento aparece uma vez, com o estado atual.
+    """
+    primeiro, ultimo = db.session.query(
+        func.min(AlteracaoAgendamento.id), func.max(AlteracaoAgendamento.id)
+    ).one()
+    ultimo = ultimo or 0
+    # cursor de outro banco, ou anterior ao que a poda deixou
+    if cursor > ultimo or (primeiro is not None and cursor < primeiro - 1):
+        return {"cursor": str(ultimo), "upserts": [], "deletes": [], "mais": False, "reset": True}
+    if cursor == ultimo:
+        return {"cursor": str(cursor), "upserts": [], "deletes": [], "mais": False, "reset": False}
+
+    linhas = (
+        db.session.query(AlteracaoAgendamento.id, AlteracaoAgendamento.agendamento_id,
+                         AlteracaoAgendamento.operacao)
+        .filter(AlteracaoAgendamento.id > cursor)
+        .order_by(AlteracaoAgendamento.id)
+        .limit(limite + 1)
+        .all()
+    )
+    mais = len(linhas) > limite
+    linhas = linhas[:limite]
+
+    # só a última operação de cada agendamento importa
+    ultima_operacao = {}
+    for _, ag_id, operacao in linhas:
+        ultima_operacao[ag_id] = operacao
+
+    gravados = [i for i, op in ultima_operacao.items() if op == "UPSERT"]
+    upserts = [serializacao.delta_agendamento(l) for l in serializacao.linhas_por_ids(gravados)]
+    encontrados = {u["id"] for u in upserts}
+    # gravado e apagado depois (a exclusão está adiante do limite da página)
+    deletes = [i for i, op in ultima_operacao.items() if op == "DELETE" or i not in encontrados]
+
+    return {"cursor": str(linhas[-1][0]), "upserts": upserts, "deletes": deletes,
+            "mais": mais, "reset": False}
+
+
+def podar(dias=DIAS_RETENCAO):
+    """Apaga o log mais antigo que `dias`, mantendo sempre a última linha."""
+    ultimo = cursor_atual()
+    n = AlteracaoAgendamento.query.filter(
+        AlteracaoAgendamento.criado_em < datetime.now() - timedelta(days=dias),
+        AlteracaoAgendamento.id < ultimo,
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return n
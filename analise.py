@@ -0,0 +1,263 @@
+"""Análises de ocupação e uso dos espaços, vetorizadas com NumPy.
+
+Os agendamentos são carregados como colunas (arrays) e todas as métricas
+são calculadas sem laços por linha. Horários são epochs em segundos do
+horário local "ingênuo" gravado no banco.
+"""
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import text
+
+from models import db, Espaco
+import arquivo
+
+
+STATUS = ["PENDENTE", "APROVADO", "RECUSADO", "CANCELADO"]
+HORAS_SEMANA = 168
+# 1970-01-01 foi quinta-feira: +72h alinha a hora 0 com segunda 00:00
+DESLOCAMENTO_SEGUNDA = 72
+
+
+def epoch(dt):
+    return int((dt - datetime(1970, 1, 1)).total_seconds())
+
+
+# --------------------------
+# CARGA EM COLUNAS
+# --------------------------
+class Colunas:
+    def __init__(self, espaco, setor, inicio, fim, status, criado):
+        self.espaco = espaco    # int64
+        self.setor = setor      # int64
+        self.inicio = inicio    # int64 (epoch s)
+        self.fim = fim          # int64 (epoch s)
+        self.status = status    # int8, índice em STATUS
+        self.criado = criado    # int64 (epoch s), -1 quando desconhecido
+
+    def __len__(self):
+        return len(self.inicio)
+
+    def filtrar(self, mascara):
+        return Colunas(self.espaco[mascara], self.setor[mascara], self.inicio[mascara],
+                       self.fim[mascara], self.status[mascara], self.criado[mascara])
+
+
+def carregar_colunas(inicio=None, fim=None, setor_id=None):
+    """Agendamentos que tocam [inicio, fim) como arrays NumPy.
+
+    As conversões (datas para epoch, status para código) são feitas pelo
+    próprio SQLite, então o Python só copia inteiros.
+    """
+    casos = " ".join(f"WHEN '{s}' THEN {i}" for i, s in enumerate(STATUS))
+    condicoes = ""
+    params = {}
+    if inicio:
+        condicoes += " AND a.fim > :inicio"
+        params["inicio"] = inicio.strftime("%Y-%m-%d %H:%M:%S")
+    if fim:
+        condicoes += " AND a.inicio < :fim"
+        params["fim"] = fim.strftime("%Y-%m-%d %H:%M:%S")
+    if setor_id:
+        condicoes += " AND e.setor_id = :setor_id"
+        params["setor_id"] = int(setor_id)
+
+    # períodos antigos também leem a tabela de arquivo (mesmas colunas)
+    tabelas = ["agendamentos"]
+    if arquivo.alcanca(inicio):
+        tabelas.append("agendamentos_arquivo")
+    sql = " UNION ALL ".join(f"""
+        SELECT a.espaco_id, e.setor_id,
+               CAST(strftime('%s', a.inicio) AS INTEGER),
+               CAST(strftime('%s', a.fim) AS INTEGER),
+               CASE a.status {casos} ELSE 0 END,
+               COALESCE(CAST(strftime('%s', a.criado_em) AS INTEGER), -1)
+        FROM {tabela} a
+        JOIN espacos e ON e.id = a.espaco_id
+        WHERE 1 = 1 {condicoes}
+    """ for tabela in tabelas)
+
+    linhas = db.session.execute(text(sql), params).fetchall()
+    dados = np.array(linhas, dtype=np.int64).reshape(-1, 6)
+
+    return Colunas(
+        espaco=dados[:, 0],
+        setor=dados[:, 1],
+        inicio=dados[:, 2],
+        fim=dados[:, 3],
+        status=dados[:, 4].astype(np.int8),
+        criado=dados[:, 5],
+    )
+
+
+# --------------------------
+# MÉTRICAS
+# --------------------------
+def hora_da_semana(segundos):
+    return (segundos // 3600 + DESLOCAMENTO_SEGUNDA) % HORAS_SEMANA
+
+
+def ocupacao_hora_semana(col, inicio, fim):
+    """Fração ocupada de cada (espaço, hora da semana) em [inicio, fim).
+
+    Cada agendamento é explodido nas horas que atravessa (np.repeat) e os
+    segundos de sobreposição são somados com np.bincount. O denominador é
+    quantas vezes cada hora da semana ocorre no período.
+    """
+    ini = np.maximum(col.inicio, inicio)
+    f = np.minimum(col.fim, fim)
+    validos = f > ini
+    ini, f, espaco = ini[validos], f[validos], col.espaco[validos]
+
+    espacos, idx_espaco = np.unique(espaco, return_inverse=True)
+
+    h0 = ini // 3600
+    h1 = -(-f // 3600)              # teto
+    n = h1 - h0
+    linha = np.repeat(np.arange(len(n)), n)
+    primeiro = np.repeat(np.cumsum(n) - n, n)
+    hora = h0[linha] + (np.arange(len(linha)) - primeiro)
+
+    segundos = (np.minimum(f[linha], (hora + 1) * 3600)
+                - np.maximum(ini[linha], hora * 3600))
+    how = (hora + DESLOCAMENTO_SEGUNDA) % HORAS_SEMANA
+
+    ocupado = np.bincount(
+        idx_espaco[linha] * HORAS_SEMANA + how,
+        weights=segundos,
+        minlength=len(espacos) * HORAS_SEMANA,
+    ).reshape(len(espacos), HORAS_SEMANA)
+
+    horas_periodo = np.arange(inicio // 3600, -(-fim // 3600))
+    disponivel = np.bincount(hora_da_semana(horas_periodo * 3600),
+                             minlength=HORAS_SEMANA) * 3600.0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fracao = np.where(disponivel > 0, ocupado / disponivel, 0.0)
+    return espacos, fracao
+
+
+def pico_concorrencia(col):
+    """Maior número de agendamentos simultâneos por espaço.
+
+    Eventos +1 (início) e -1 (fim) ordenados por (espaço, instante, delta);
+    como cada espaço soma zero, o cumsum global volta a 0 entre espaços e
+    basta um maximum.reduceat por grupo.
+    """
+    if not len(col):
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+
+    espaco = np.concatenate([col.espaco, col.espaco])
+    instante = np.concatenate([col.inicio, col.fim])
+    delta = np.concatenate([np.ones(len(col), np.int64), -np.ones(len(col), np.int64)])
+
+    ordem = np.lexsort((delta, instante, espaco))   # -1 antes de +1 no mesmo instante
+    espaco, delta = espaco[ordem], delta[ordem]
+    nivel = np.cumsum(delta)
+
+    espacos, inicios = np.unique(espaco, return_index=True)
+    return espacos, np.maximum.reduceat(nivel, inicios)
+
+
+def taxas_status(col, chave):
+    """Contagem e taxas por status agrupadas por `chave` (array de ids)."""
+    grupos, idx = np.unique(chave, return_inverse=True)
+    contagem = np.bincount(idx * len(STATUS) + col.status,
+                           minlength=len(grupos) * len(STATUS)).reshape(len(grupos), len(STATUS))
+    decididos = contagem[:, STATUS.index("APROVADO")] + contagem[:, STATUS.index("RECUSADO")]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        aprovacao = np.where(decididos > 0, contagem[:, STATUS.index("APROVADO")] / decididos, 0.0)
+    return grupos, contagem, aprovacao
+
+
+def antecedencia(col, chave):
+    """Antecedência (horas entre a criação e o início) por grupo: mediana e p90."""
+    conhecidos = col.criado >= 0
+    horas = (col.inicio[conhecidos] - col.criado[conhecidos]) / 3600.0
+    chave = chave[conhecidos]
+    if not len(horas):
+        return np.array([], dtype=np.int64), np.empty((0, 2))
+
+    ordem = np.lexsort((horas, chave))
+    chave, horas = chave[ordem], horas[ordem]
+    grupos, inicios, tamanhos = np.unique(chave, return_index=True, return_counts=True)
+
+    # percentis por grupo direto nos índices do array ordenado
+    med = horas[inicios + (tamanhos - 1) // 2]
+    p90 = horas[inicios + ((tamanhos - 1) * 0.9).astype(np.int64)]
+    return grupos, np.column_stack([med, p90])
+
+
+# --------------------------
+# RELATÓRIO (JSON / CLI)
+# --------------------------
+def todos_os_espacos(setor_id=None):
+    """(ids ordenados, setor de cada um) de todos os espaços, com ou sem agendamentos."""
+    q = db.session.query(Espaco.id, Espaco.setor_id).order_by(Espaco.id)
+    if setor_id:
+        q = q.filter(Espaco.setor_id == setor_id)
+    linhas = q.all()
+    return (np.array([i for i, _ in linhas], dtype=np.int64),
+            np.array([s or 0 for _, s in linhas], dtype=np.int64))
+
+
+def relatorio(inicio, fim, setor_id=None):
+    col = carregar_colunas(inicio, fim, setor_id)
+    ini_s, fim_s = epoch(inicio), epoch(fim)
+
+    aprovados = col.filtrar(col.status == STATUS.index("APROVADO"))
+    ocupados, fracao_ocupados = ocupacao_hora_semana(aprovados, ini_s, fim_s)
+    esp_pico, picos = pico_concorrencia(col.filtrar(col.status != STATUS.index("CANCELADO")))
+    pico_por_espaco = dict(zip(esp_pico.tolist(), picos.tolist()))
+
+    # espaços sem agendamento no período entram com ocupação zero (e contam
+    # no denominador do setor)
+    espacos, setores_esp = todos_os_espacos(setor_id)
+    fracao = np.zeros((len(espacos), HORAS_SEMANA))
+    fracao[np.searchsorted(espacos, ocupados)] = fracao_ocupados
+    setor_do_espaco = dict(zip(espacos.tolist(), setores_esp.tolist()))
+    por_espaco = []
+    for i, espaco_id in enumerate(espacos.tolist()):
+        por_espaco.append({
+            "espaco_id": espaco_id,
+            "setor_id": setor_do_espaco.get(espaco_id),
+            "ocupacao_media": round(float(fracao[i].mean()), 4),
+            "ocupacao_hora_semana": np.round(fracao[i], 4).tolist(),
+            "pico_concorrencia": pico_por_espaco.get(espaco_id, 0),
+        })
+
+    # setor: soma das matrizes dos espaços / nº de espaços do setor
+    por_setor = {}
+    if len(espacos):
+        grupos_s, idx_s = np.unique(setores_esp, return_inverse=True)
+        soma = np.zeros((len(grupos_s), HORAS_SEMANA))
+        np.add.at(soma, idx_s, fracao)
+        media = soma / np.bincount(idx_s)[:, None]
+        for i, s in enumerate(grupos_s.tolist()):
+            por_setor[s] = {
+                "setor_id": s,
+                "ocupacao_media": round(float(media[i].mean()), 4),
+                "ocupacao_hora_semana": np.round(media[i], 4).tolist(),
+            }
+
+    grupos, contagem, aprovacao = taxas_status(col, col.setor)
+    for i, s in enumerate(grupos.tolist()):
+        item = por_setor.setdefault(s, {"setor_id": s})
+        item["status"] = dict(zip(STATUS, contagem[i].tolist()))
+        item["taxa_aprovacao"] = round(float(aprovacao[i]), 4)
+
+    grupos, antec = antecedencia(col, col.setor)
+    for i, s in enumerate(grupos.tolist()):
+        item = por_setor.setdefault(s, {"setor_id": s})
+        item["antecedencia_horas"] = {
+            "mediana": round(float(antec[i, 0]), 1),
+            "p90": round(float(antec[i, 1]), 1),
+        }
+
+    return {
+        "inicio": inicio.isoformat(),
+        "fim": fim.isoformat(),
+        "total_agendamentos": len(col),
+        "espacos": por_espaco,
+        "setores": list(por_setor.values()),
+    }
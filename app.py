@@ -1,45 +1,133 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_file
+from flask import Flask, Response, g, render_template, request, redirect, url_for, session, jsonify, send_file
+import click
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.utils import simpleSplit
-from models import db, Usuario, Setor, Espaco, Agendamento
+from datetime import datetime, timedelta
+import hashlib
+import io
+import json
+import os
+import queue
+import secrets
+import tempfile
+import threading
+from sqlalchemy.exc import OperationalError
+from models import db, Usuario, Setor, Espaco, Agendamento, AgendamentoArquivo, Tarefa
 import services
+import relatorios
+import serializacao
+import disponibilidade
+import analise
+import importacao
+import fila_pendentes
+import busca
+import metricas
+import feeds
+import tarefas
+import referencias
+import alteracoes
+import arquivo
+from banco import configurar_sqlite, atualizar_esquema, versao_esquema, marcar_esquema, VERSAO_ESQUEMA
+from cache import versao_agendamentos, versao_referencias, cache_dashboard
+from eventos import broker
 
 app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///sala_agenda.db"
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///sala_agenda.db")
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.secret_key = "segredo-top"
+app.secret_key = os.environ.get("SECRET_KEY", "segredo-top")
+configurar_sqlite(app)
+metricas.instalar(app)
+db.init_app(app)
 
 
 # --------------------------------
-# Inicializa o banco e cria admin
+# Inicialização do banco (uma vez, fora do import)
 # --------------------------------
-db.init_app(app)
+# Importar o módulo não toca no banco. O esquema, a busca e o admin padrão
+# são criados por `flask init-db` (ou pelo servidor antes de abrir os
+# workers); um processo que encontra o banco atrás de VERSAO_ESQUEMA faz a
+# inicialização sozinho na primeira requisição.
+_processo = {"pronto": False}
+_processo_lock = threading.Lock()
+
+
+def inicializar_banco():
+    """Cria tabelas, índices, a busca FTS5 e o admin padrão. Idempotente."""
+    with app.app_context():
+        db.create_all()
+
+        atualizar_esquema(db)
+        arquivo.reservar_ids_arquivados()
+        busca.criar_indice_busca(db)
+
+        # cria admin padrão se não existir
+        if not Usuario.query.filter_by(email="admin@admin.com").first():
+            admin = Usuario(
+                nome="Administrador",
+                email="admin@admin.com",
+                senha_hash=generate_password_hash("admin"),
+                papel="ADMIN"
+            )
+            db.session.add(admin)
+            db.session.commit()
 
-with app.app_context():
-    db.create_all()
+        marcar_esquema(db)
+
+
+def preparar_processo():
+    """Uma vez por processo: confere o esquema e sobe as threads da fila."""
+    if _processo["pronto"]:
+        return
+    with _processo_lock:
+        if _processo["pronto"]:
+            return
+        with app.app_context():
+            atual = versao_esquema(db)
+        if atual is None or atual < VERSAO_ESQUEMA:
+            try:
+                inicializar_banco()
+            except OperationalError:
+                # outro processo criava as mesmas tabelas ao mesmo tempo
+                db.session.remove()
+                inicializar_banco()
+        else:
+            with app.app_context():
+                busca.detectar(db)
+        tarefas.iniciar(app)
+        _processo["pronto"] = True
 
-    # cria admin padrão se não existir
-    if not Usuario.query.filter_by(email="admin@admin.com").first():
-        admin = Usuario(
-            nome="Administrador",
-            email="admin@admin.com",
-            senha_hash=generate_password_hash("admin"),
-            papel="ADMIN"
-        )
-        db.session.add(admin)
-        db.session.commit()
+
+@app.before_request
+def _preparar_na_primeira_requisicao():
+    preparar_processo()
+
+
+def criar_app():
+    """Ponto de entrada para servidores WSGI: o app já preparado neste processo.
+
+    As rotas ficam registradas no `app` do módulo; a fábrica só garante que
+    o banco e as threads de segundo plano estão prontos antes de servir.
+    """
+    preparar_processo()
+    return app
+
+
+@app.cli.command("init-db")
+def init_db_cli():
+    """Cria ou atualiza o esquema, o índice de busca e o admin padrão."""
+    inicializar_banco()
+    click.echo(f"Banco pronto (esquema versão {VERSAO_ESQUEMA}).")
 
 
 # --------------------------------
 # Helper: usuário logado
 # --------------------------------
 def usuario_logado():
-    if "usuario_id" in session:
-        return Usuario.query.get(session["usuario_id"])
-    return None
+    # memoizado por requisição: a view e o context processor usam o mesmo
+    if "usuario_logado" not in g:
+        g.usuario_logado = None
+        if "usuario_id" in session:
+            g.usuario_logado = Usuario.query.get(session["usuario_id"])
+    return g.usuario_logado
 
 
 # --------------------------------
@@ -50,8 +138,36 @@ def inject_pendentes_count():
     user = usuario_logado()
     if not user or not user.pode_aprovar():
         return {"pendentes_count": None}
-    count = Agendamento.query.filter_by(status="PENDENTE").count()
-    return {"pendentes_count": count, "usuario": user}
+    return {"pendentes_count": services.total_pendentes(), "usuario": user}
+
+
+# --------------------------------
+# Métricas (Prometheus) - ADMIN ou token METRICAS_TOKEN
+# --------------------------------
+def pode_ver_metricas():
+    token = os.environ.get("METRICAS_TOKEN")
+    if token and request.headers.get("Authorization") == f"Bearer {token}":
+        return True
+    user = usuario_logado()
+    return bool(user and user.papel == "ADMIN")
+
+
+@app.route("/metrics")
+def metrics():
+    if not metricas.ativo():
+        return jsonify({"erro": "métricas desligadas (METRICAS=1)"}), 404
+    if not pode_ver_metricas():
+        return jsonify({"erro": "acesso negado"}), 403
+    return Response(metricas.registro.prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/metrics/perfis")
+def metrics_perfis():
+    if not metricas.ativo():
+        return jsonify({"erro": "métricas desligadas (METRICAS=1)"}), 404
+    if not pode_ver_metricas():
+        return jsonify({"erro": "acesso negado"}), 403
+    return Response(metricas.perfis.texto(), mimetype="text/plain")
 
 
 # --------------------------------
@@ -101,33 +217,17 @@ def verificar_conflitos():
     inicio = datetime.fromisoformat(inicio)
     fim = datetime.fromisoformat(fim)
 
-    conflitos = (
-        Agendamento.query
-        .filter(Agendamento.espaco_id == espaco_id)
-        .filter(Agendamento.status != "CANCELADO")
-        .filter(Agendamento.fim > inicio)
-        .filter(Agendamento.inicio < fim)
-        .order_by(Agendamento.inicio)
-        .all()
-    )
+    ids = services.indice.conflitos(espaco_id, inicio, fim)
 
     pendentes = []
     aprovados = []
 
-    for ag in conflitos:
-        dado = {
-            "id": ag.id,
-            "inicio": ag.inicio.strftime("%H:%M"),
-            "fim": ag.fim.strftime("%H:%M"),
-            "usuario": ag.usuario.nome,
-            "status": ag.status,
-            "setor": ag.espaco.setor.nome,
-            "espaco": ag.espaco.nome
-        }
-
-        if ag.status == "PENDENTE":
+    for linha in serializacao.linhas_por_ids(ids):
+        dado = serializacao.item_conflito(linha)
+
+        if linha.status == "PENDENTE":
             pendentes.append(dado)
-        elif ag.status == "APROVADO":
+        elif linha.status == "APROVADO":
             aprovados.append(dado)
 
     return jsonify({
@@ -135,6 +235,66 @@ def verificar_conflitos():
         "aprovados": aprovados
     })
 
+# --------------------------------
+# Eventos ao vivo (Server-Sent Events)
+# --------------------------------
+@app.route("/api/eventos")
+def api_eventos():
+    if "usuario_id" not in session:
+        return jsonify({"erro": "não autenticado"}), 401
+
+    fila = broker.assinar()
+    if fila is None:
+        # limite de streams do processo (ou encerrando): a página segue pelo /api/changes
+        return jsonify({"erro": "tempo real indisponível"}), 503, {"Retry-After": "60"}
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    mensagem = fila.get(timeout=15)
+                except queue.Empty:
+                    yield ": ping\n\n"   # mantém a conexão viva em proxies
+                    continue
+                if mensagem is None:
+                    break  # cliente lento: o navegador reconecta
+                yield mensagem
+        finally:
+            broker.cancelar(fila)
+
+    resposta = Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # o gerador pode nunca começar (cliente que desiste antes do primeiro byte)
+    resposta.call_on_close(lambda: broker.cancelar(fila))
+    return resposta
+
+
+# --------------------------------
+# Sincronização incremental (log de alterações)
+# --------------------------------
+@app.route("/api/changes")
+def api_changes():
+    if "usuario_id" not in session:
+        return jsonify({"erro": "não autenticado"}), 401
+
+    # sem cursor: só informa a posição atual do log
+    if not request.args.get("since"):
+        return jsonify({"cursor": str(alteracoes.cursor_atual())})
+
+    try:
+        cursor = alteracoes.decodificar_cursor(request.args["since"])
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+
+    dados = alteracoes.desde(cursor)
+    dados["pendentes_count"] = services.total_pendentes()
+    return jsonify(dados)
+
+
 # --------------------------------
 # Agenda (FullCalendar)
 # --------------------------------
@@ -147,8 +307,8 @@ def agenda():
     return render_template(
         "agenda.html",
         user=user,
-        Setor=Setor,   # 🔥 agora o template enxerga Setor
-        Espaco=Espaco  # (não obrigatório, mas útil)
+        setores=referencias.setores(),
+        cursor_alteracoes=alteracoes.cursor_atual(),
     )
 
 
@@ -159,76 +319,66 @@ def api_agendamentos():
     setor_id = request.args.get("setor_id")
     espaco_id = request.args.get("espaco_id")
 
-    query = Agendamento.query
+    # janela visível enviada pelo FullCalendar (start/end)
+    try:
+        inicio = parse_data_param(request.args.get("start"))
+        fim = parse_data_param(request.args.get("end"))
+    except ValueError:
+        return jsonify({"erro": "Período inválido"}), 400
 
-    if status:
-        query = query.filter(Agendamento.status.in_(status))
+    def montar(modelo):
+        query = serializacao.consulta_agendamentos(modelo)
 
-    if setor_id:
-        query = query.join(Espaco).filter(Espaco.setor_id == setor_id)
+        if inicio:
+            query = query.filter(modelo.fim > inicio)
 
-    if espaco_id:
-        query = query.filter(Agendamento.espaco_id == espaco_id)
+        if fim:
+            query = query.filter(modelo.inicio < fim)
 
-    eventos = query.all()
+        if status:
+            query = query.filter(modelo.status.in_(status))
 
-    lista = []
-    for e in eventos:
+        if setor_id:
+            query = query.filter(Espaco.setor_id == setor_id)
 
-        motivo_curto = ""
-        if e.motivo:
-            motivo_curto = e.motivo[:25] + ("..." if len(e.motivo) > 25 else "")
+        if espaco_id:
+            query = query.filter(modelo.espaco_id == espaco_id)
 
-        lista.append({
-            "id": e.id,
-            "title": f"{e.espaco.setor.acronimo} – {e.espaco.nome}\n{motivo_curto}",
-            "start": e.inicio.isoformat(),
-            "end": e.fim.isoformat(),
-            "color": cor_status(e.status),
+        return query
 
-            # Enviamos para o tooltip (opcional, mas profissional)
-            "setor": e.espaco.setor.nome,
-            "acronimo": e.espaco.setor.acronimo,
-            "espaco": e.espaco.nome,
-            "motivo": e.motivo,
-            "usuario": e.usuario.nome,
-            "status": e.status
-        })
+    # semanas antigas também trazem o que já foi arquivado
+    query = arquivo.incluir_arquivo(montar, inicio)
+    return jsonify([serializacao.evento_calendario(l) for l in query.all()])
 
-    return jsonify(lista)
 
+# Função auxiliar: datas ISO vindas da query string
+def parse_data_param(valor):
+    if not valor:
+        return None
+    # FullCalendar manda o offset do fuso; o banco guarda horário local ingênuo
+    return datetime.fromisoformat(valor).replace(tzinfo=None)
 
-# Função auxiliar de cores
-def cor_status(status):
-    return {
-        "APROVADO": "#28a745",   # verde
-        "PENDENTE": "#ffc107",   # amarelo
-        "RECUSADO": "#dc3545",   # vermelho
-        "CANCELADO": "#6c757d",  # cinza
-    }.get(status, "#0d6efd")     # padrão azul
 
 @app.route("/api/agendamento/<int:id>")
 def api_agendamento(id):
-    ag = Agendamento.query.get(id)
-    if not ag:
+    linha = (
+        serializacao.consulta_agendamentos()
+        .filter(Agendamento.id == id)
+        .first()
+    )
+    if not linha:
+        linha = (
+            serializacao.consulta_agendamentos(AgendamentoArquivo)
+            .filter(AgendamentoArquivo.id == id)
+            .first()
+        )
+    if not linha:
         return jsonify({"erro": "Agendamento não encontrado"}), 404
 
-    return jsonify({
-        "id": ag.id,
-        "espaco": ag.espaco.nome,
-        "setor": ag.espaco.setor.nome,
-        "acronimo": ag.espaco.setor.acronimo,
-        "status": ag.status,
-        "motivo": ag.motivo,
-        "motivo_recusa": ag.motivo_recusa,
-        "usuario": ag.usuario.nome,
-        "inicio": ag.inicio.strftime("%d/%m/%Y %H:%M"),
-        "fim": ag.fim.strftime("%d/%m/%Y %H:%M"),
-        "color": cor_status(ag.status)
-    })
+    return jsonify(serializacao.detalhe_agendamento(linha))
 
 # --------------------------------
-# Exportar Agenda do Dia (PDF)
+# Exportar Agenda (PDF) - dia, semana, mês ou período personalizado
 # -------------------------------
 @app.route("/exportar_pdf")
 def exportar_pdf():
@@ -236,154 +386,117 @@ def exportar_pdf():
     if not user:
         return redirect(url_for("login"))
 
-    # ----- COLETAR OS FILTROS -----
-    status_filtros = request.args.getlist("status")
-    setor_id = request.args.get("setor_id")
-    espaco_id = request.args.get("espaco_id")
-
-    # ----- PERÍODO (apenas dia atual por enquanto) -----
-    hoje = datetime.now().date()
-    inicio = datetime(hoje.year, hoje.month, hoje.day)
-    fim = datetime(hoje.year, hoje.month, hoje.day, 23, 59, 59)
-
-    # ----- QUERY BASE -----
-    q = (
-        Agendamento.query
-        .filter(
-            Agendamento.inicio >= inicio,
-            Agendamento.inicio <= fim,
-            Agendamento.status != "CANCELADO",
-        )
-        .join(Espaco)
-        .order_by(Espaco.setor_id, Agendamento.inicio)
+    # arquivo temporário por requisição (removido ao fechar)
+    pdf = tempfile.TemporaryFile()
+    try:
+        relatorios.gerar_pdf_agenda(pdf, parametros_pdf(request.args))
+    except ValueError as e:
+        pdf.close()
+        return jsonify({"erro": str(e)}), 400
+    pdf.seek(0)
+
+    return send_file(
+        pdf,
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name="agenda_filtrada.pdf"
     )
 
-    # ----- APLICAR FILTROS -----
-    if status_filtros:
-        q = q.filter(Agendamento.status.in_(status_filtros))
-
-    if setor_id:
-        q = q.filter(Espaco.setor_id == setor_id)
-
-    if espaco_id:
-        q = q.filter(Agendamento.espaco_id == espaco_id)
-
-    agendamentos = q.all()
-
-    # AGRUPAR POR SETOR
-    setores = {}
-    for ag in agendamentos:
-        nome_setor = ag.espaco.setor.nome
-        setores.setdefault(nome_setor, []).append(ag)
-
-    # ----- CRIAR PDF -----
-    caminho_pdf = "agenda_filtrada.pdf"
-    c = canvas.Canvas(caminho_pdf, pagesize=A4)
-    largura, altura = A4
 
-    # TÍTULO PRINCIPAL
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(40, altura - 40, "Agenda – Relatório Filtrado")
+# Função auxiliar: filtros do PDF a partir da query string (ou formulário)
+def parametros_pdf(valores):
+    parametros = {
+        chave: valores.get(chave)
+        for chave in ("periodo", "data", "data_inicio", "data_fim", "setor_id", "espaco_id")
+        if valores.get(chave)
+    }
+    parametros["status"] = valores.getlist("status")
+    return parametros
 
-    y = altura - 80
-
-    # ----- DESCREVER OS FILTROS USADOS -----
-    c.setFont("Helvetica", 11)
-
-    filtros_desc = [
-        f"Período: {hoje.strftime('%d/%m/%Y')}",
-        f"Status: {', '.join(status_filtros) if status_filtros else 'Todos'}",
-        f"Setor: {Setor.query.get(setor_id).nome if setor_id else 'Todos'}",
-        f"Espaço: {Espaco.query.get(espaco_id).nome if espaco_id else 'Todos'}",
-    ]
 
-    for linha in filtros_desc:
-        c.drawString(40, y, linha)
-        y -= 18
-
-    y -= 15
-
-    # ----- SEM RESULTADOS -----
-    if not setores:
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(40, y, "Nenhum resultado para os filtros aplicados.")
-        c.save()
-        return send_file(caminho_pdf, as_attachment=True)
-
-    # ----- TABELA POR SETOR -----
-    for nome_setor, lista in setores.items():
-
-        # Nome do setor
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(40, y, f"SETOR: {nome_setor}")
-        y -= 28
-
-        # Cabeçalho da tabela
-        c.setFont("Helvetica-Bold", 11)
-        c.drawString(40, y,  "HORÁRIO")
-        c.drawString(120, y, "ESPAÇO")
-        c.drawString(260, y, "USUÁRIO")
-        c.drawString(380, y, "STATUS")
-        c.drawString(450, y, "MOTIVO / RECUSA")
-        y -= 10
-        c.line(40, y, largura - 40, y)
-        y -= 15
-
-        c.setFont("Helvetica", 10)
-
-        # LINHAS DA TABELA
-        for ag in lista:
+# --------------------------------
+# Tarefas em segundo plano (PDF assíncrono + acompanhamento)
+# --------------------------------
+@app.route("/api/tarefas/exportar_pdf", methods=["POST"])
+def enfileirar_pdf():
+    user = usuario_logado()
+    if not user:
+        return {"erro": "não autorizado"}, 401
+
+    parametros = parametros_pdf(request.values)
+    try:
+        relatorios.periodo_relatorio(
+            parametros.get("periodo"),
+            data=parametros.get("data"),
+            data_inicio=parametros.get("data_inicio"),
+            data_fim=parametros.get("data_fim"),
+        )
+    except ValueError as e:
+        return {"erro": str(e)}, 400
 
-            # coluna 1 - horário
-            c.drawString(40, y, f"{ag.inicio.strftime('%H:%M')}–{ag.fim.strftime('%H:%M')}")
+    tarefa = tarefas.enfileirar("exportar_pdf", parametros, usuario_id=user.id)
+    db.session.commit()
+    tarefas.acordar()
+    return {"id": tarefa.id, "status": tarefa.status}, 202
 
-            # coluna 2 - espaço
-            c.drawString(120, y, ag.espaco.nome[:18])
 
-            # coluna 3 - usuário
-            c.drawString(260, y, ag.usuario.nome[:18])
+# Função auxiliar: tarefa visível para o usuário logado (dono ou ADMIN)
+def tarefa_do_usuario(id):
+    user = usuario_logado()
+    tarefa = db.session.get(Tarefa, id)
+    if not tarefa or (tarefa.usuario_id != user.id and user.papel != "ADMIN"):
+        return None
+    return tarefa
 
-            # coluna 4 - status
-            c.drawString(380, y, ag.status)
 
-            # coluna 5 - motivo + recusa (quebra automática)
-            motivo_texto = f"{ag.motivo or ''}"
-            if ag.motivo_recusa:
-                motivo_texto += f"\nRecusa: {ag.motivo_recusa}"
+@app.route("/api/tarefas/<int:id>")
+def situacao_tarefa(id):
+    if not usuario_logado():
+        return {"erro": "não autorizado"}, 401
+    tarefa = tarefa_do_usuario(id)
+    if not tarefa:
+        return {"erro": "não encontrada"}, 404
 
-            linhas = simpleSplit(motivo_texto, 'Helvetica', 10, 120)
+    dados = tarefas.situacao(tarefa)
+    if tarefa.status == "CONCLUIDA" and tarefa.tipo == "exportar_pdf":
+        dados["download"] = url_for("baixar_tarefa", id=tarefa.id)
+    return dados
 
-            # desenhar as linhas do motivo
-            yy = y
-            for l in linhas:
-                c.drawString(450, yy, l)
-                yy -= 12
 
-            y -= max(20, 12 * len(linhas))
+@app.route("/tarefas/<int:id>/download")
+def baixar_tarefa(id):
+    if not usuario_logado():
+        return redirect(url_for("login"))
+    tarefa = tarefa_do_usuario(id)
+    if not tarefa or tarefa.status != "CONCLUIDA" or tarefa.tipo != "exportar_pdf":
+        return {"erro": "não encontrada"}, 404
+    if not tarefa.resultado or not os.path.exists(tarefa.resultado):
+        return {"erro": "arquivo expirado"}, 410
+
+    return send_file(
+        tarefa.resultado,
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name="agenda_filtrada.pdf"
+    )
 
-            # quebra de página
-            if y < 50:
-                c.showPage()
-                y = altura - 50
-                c.setFont("Helvetica-Bold", 14)
-                c.drawString(40, y, f"SETOR: {nome_setor} (continuação)")
-                y -= 28
 
-                c.setFont("Helvetica-Bold", 11)
-                c.drawString(40, y,  "HORÁRIO")
-                c.drawString(120, y, "ESPAÇO")
-                c.drawString(260, y, "USUÁRIO")
-                c.drawString(380, y, "STATUS")
-                c.drawString(450, y, "MOTIVO / RECUSA")
-                y -= 10
-                c.line(40, y, largura - 40, y)
-                y -= 15
-                c.setFont("Helvetica", 10)
+@app.cli.command("processar-tarefas")
+def processar_tarefas_cli():
+    """Executa as tarefas pendentes em primeiro plano até esvaziar a fila."""
+    tarefas.recuperar_abandonadas()
+    click.echo(f"{tarefas.processar()} tarefa(s) executada(s).")
 
-        y -= 30
 
-    c.save()
-    return send_file(caminho_pdf, as_attachment=True)
+@app.cli.command("arquivar")
+@click.option("--dias", type=int, default=None,
+              help=f"Horizonte em dias (padrão: ARQUIVO_DIAS ou {arquivo.DIAS_PADRAO}; mínimo {arquivo.DIAS_MINIMO})")
+def arquivar_cli(dias):
+    """Move para o arquivo os agendamentos terminados antes do horizonte."""
+    movidos = arquivo.arquivar(dias)
+    if movidos:
+        services.indice.invalidar()
+    click.echo(f"{movidos} agendamento(s) arquivado(s) antes de {arquivo.corte(dias):%d/%m/%Y}.")
 
 
 # --------------------------------
@@ -398,8 +511,8 @@ def dashboard():
     return render_template(
         "dashboard.html",
         usuario=user,
-        Setor=Setor,       # 🔥 necessário para carregar setores
-        Espaco=Espaco      # opcional, mas útil
+        setores=referencias.setores(),
+        cursor_alteracoes=alteracoes.cursor_atual(),
     )
 
 @app.route("/api/dashboard")
@@ -409,14 +522,45 @@ def api_dashboard():
     espaco_id = request.args.get("espaco_id")
 
     hoje = datetime.now().date()
+
+    # resultado em cache por (dia, status, setor, espaço) e versão de escrita;
+    # o ETag vem do conteúdo, então vale entre processos e reinícios
+    chave = (
+        versao_agendamentos.atual(),
+        hoje.isoformat(),
+        tuple(sorted(set(status))),
+        setor_id or "",
+        espaco_id or "",
+    )
+
+    em_cache = cache_dashboard.get(chave)
+    if em_cache is None:
+        corpo = json.dumps(consultar_dashboard(hoje, status, setor_id, espaco_id),
+                           ensure_ascii=False).encode("utf-8")
+        em_cache = (corpo, hashlib.sha1(corpo).hexdigest())
+        cache_dashboard.put(chave, em_cache)
+    corpo, etag = em_cache
+
+    if etag in request.if_none_match:
+        resp = app.response_class(status=304)
+        resp.set_etag(etag)
+        return resp
+
+    resp = app.response_class(corpo, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+def consultar_dashboard(hoje, status, setor_id, espaco_id):
     inicio = datetime(hoje.year, hoje.month, hoje.day)
     fim = datetime(hoje.year, hoje.month, hoje.day, 23, 59, 59)
 
-    q = Agendamento.query.filter(
+    q = serializacao.consulta_agendamentos().filter(
         Agendamento.inicio >= inicio,
         Agendamento.inicio <= fim,
         Agendamento.status != "CANCELADO"
-    ).join(Espaco)
+    )
 
     if status:
         q = q.filter(Agendamento.status.in_(status))
@@ -427,23 +571,88 @@ def api_dashboard():
     if espaco_id:
         q = q.filter(Agendamento.espaco_id == espaco_id)
 
-    ags = q.order_by(Agendamento.inicio).all()
+    return [serializacao.item_dashboard(l) for l in q.order_by(Agendamento.inicio).all()]
 
-    lista = []
-    for ag in ags:
-        lista.append({
-            "id": ag.id,
-            "setor": ag.espaco.setor.nome,
-            "espaco": ag.espaco.nome,
-            "usuario": ag.usuario.nome,
-            "inicio": ag.inicio.strftime("%H:%M"),
-            "fim": ag.fim.strftime("%H:%M"),
-            "status": ag.status,
-            "motivo": ag.motivo,
-            "motivo_recusa": ag.motivo_recusa
-        })
 
-    return jsonify(lista)
+# --------------------------------
+# Análise de ocupação (ADMIN/AGENDADOR)
+# --------------------------------
+@app.route("/api/analise")
+def api_analise():
+    user = usuario_logado()
+    if not user or not user.pode_aprovar():
+        return jsonify({"erro": "não autorizado"}), 403
+
+    try:
+        inicio, fim = periodo_analise(request.args.get("inicio"), request.args.get("fim"))
+    except ValueError:
+        return jsonify({"erro": "Período inválido"}), 400
+
+    setor_id = request.args.get("setor_id")
+    if setor_id:
+        try:
+            setor_id = int(setor_id)
+        except ValueError:
+            return jsonify({"erro": "setor_id inválido"}), 400
+
+    return jsonify(analise.relatorio(inicio, fim, setor_id or None))
+
+
+@app.cli.command("analise")
+@click.option("--inicio", help="Data inicial (AAAA-MM-DD); padrão: 30 dias atrás")
+@click.option("--fim", help="Data final exclusiva (AAAA-MM-DD); padrão: hoje")
+@click.option("--setor-id", type=int, default=None)
+def analise_cli(inicio, fim, setor_id):
+    """Imprime o relatório de ocupação em JSON."""
+    inicio, fim = periodo_analise(inicio, fim)
+    click.echo(json.dumps(analise.relatorio(inicio, fim, setor_id), ensure_ascii=False, indent=2))
+
+
+# Função auxiliar: período da análise (padrão: últimos 30 dias)
+def periodo_analise(inicio, fim):
+    fim = parse_data_param(fim) or datetime.combine(datetime.now().date(), datetime.min.time())
+    inicio = parse_data_param(inicio) or fim - timedelta(days=30)
+    if fim <= inicio:
+        raise ValueError("período vazio")
+    return inicio, fim
+
+
+# --------------------------------
+# Importação em massa (CSV) - somente ADMIN/AGENDADOR
+# --------------------------------
+@app.route("/importar", methods=["GET", "POST"])
+def importar():
+    user = usuario_logado()
+    if not user or not user.pode_aprovar():
+        return redirect(url_for("login"))
+
+    if request.method == "POST":
+        tipo = request.form.get("tipo")
+        enviado = request.files.get("arquivo")
+
+        if not enviado or not enviado.filename:
+            return render_template("importar.html", usuario=user, erro="Selecione um arquivo CSV.")
+
+        # lê o upload em streaming, sem carregar o arquivo inteiro na memória
+        texto = io.TextIOWrapper(enviado.stream, encoding="utf-8-sig", newline="")
+        try:
+            relatorio = importacao.importar(tipo, texto)
+        except (ValueError, UnicodeDecodeError) as e:
+            return render_template("importar.html", usuario=user, erro=str(e))
+
+        return render_template("importar.html", usuario=user, relatorio=relatorio.como_dict())
+
+    return render_template("importar.html", usuario=user)
+
+
+@app.cli.command("importar")
+@click.argument("tipo", type=click.Choice(sorted(importacao.IMPORTADORES)))
+@click.argument("caminho", type=click.Path(exists=True, dir_okay=False))
+def importar_cli(tipo, caminho):
+    """Importa um CSV de setores, espacos, usuarios ou agendamentos."""
+    with open(caminho, encoding="utf-8-sig", newline="") as f:
+        relatorio = importacao.importar(tipo, f)
+    click.echo(json.dumps(relatorio.como_dict(), ensure_ascii=False, indent=2))
 
 
 # --------------------------------
@@ -503,7 +712,9 @@ def setores_novo():
         nome = request.form["nome"]
         setor = Setor(nome=nome)
         db.session.add(setor)
+        versao_referencias.registrar()
         db.session.commit()
+        versao_referencias.incrementar()
         return redirect(url_for("setores_list"))
 
     return render_template("setores_form.html", usuario=user)
@@ -528,7 +739,7 @@ def espacos_novo():
     if not user or not user.pode_aprovar():
         return redirect(url_for("login"))
 
-    setores = Setor.query.all()
+    setores = referencias.setores()
 
     if request.method == "POST":
         nome = request.form["nome"]
@@ -539,7 +750,9 @@ def espacos_novo():
             setor_id=setor_id
         )
         db.session.add(espaco)
+        versao_referencias.registrar()
         db.session.commit()
+        versao_referencias.incrementar()
 
         return redirect(url_for("espacos_list"))
 
@@ -557,7 +770,9 @@ def espaco_status(id):
         return redirect(url_for("espacos_list"))
 
     espaco.status = "LIVRE" if espaco.status == "BLOQUEADO" else "BLOQUEADO"
+    versao_referencias.registrar()
     db.session.commit()
+    versao_referencias.incrementar()
 
     return redirect(url_for("espacos_list"))
 
@@ -567,15 +782,161 @@ def espaco_status(id):
 # --------------------------------
 @app.route("/api/espacos/<int:setor_id>")
 def api_espacos_por_setor(setor_id):
-    espacos = Espaco.query.filter_by(setor_id=setor_id).all()
-    return jsonify([
-        {
-            "id": e.id,
-            "nome": e.nome,
-            "status": e.status
-        }
-        for e in espacos
-    ])
+    # lista em cache; o navegador revalida e recebe 304 enquanto não mudar
+    corpo, etag = referencias.espacos_do_setor_json(setor_id)
+    if etag in request.if_none_match:
+        resp = app.response_class(status=304)
+    else:
+        resp = Response(corpo, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp
+
+
+# --------------------------------
+# API: espaços livres em uma janela de tempo
+# --------------------------------
+@app.route("/api/disponibilidade")
+def api_disponibilidade():
+    setor_id = request.args.get("setor_id")
+
+    try:
+        inicio = parse_data_param(request.args.get("inicio"))
+        fim = parse_data_param(request.args.get("fim"))
+        duracao = int(request.args.get("duracao_min") or 0)
+    except ValueError:
+        return jsonify({"erro": "Parâmetros inválidos"}), 400
+
+    if not inicio or not fim or fim <= inicio:
+        return jsonify({"erro": "Informe início e fim"}), 400
+
+    espacos = disponibilidade.consultar_disponibilidade(
+        inicio, fim, timedelta(minutes=duracao), setor_id
+    )
+
+    return jsonify({
+        "inicio": inicio.isoformat(),
+        "fim": fim.isoformat(),
+        "espacos": espacos
+    })
+
+
+# --------------------------------
+# API: busca textual (FTS5) por motivo, usuário, espaço e setor
+# --------------------------------
+@app.route("/api/busca")
+def api_busca():
+    if "usuario_id" not in session:
+        return jsonify({"erro": "não autenticado"}), 401
+
+    consulta = request.args.get("q", "")
+    pagina = request.args.get("pagina", 1, type=int)
+    limite = request.args.get("limite", busca.LIMITE_PADRAO, type=int)
+
+    resultados, tem_mais = busca.buscar(consulta, pagina, limite)
+
+    return jsonify({
+        "q": consulta,
+        "pagina": pagina,
+        "tem_mais": tem_mais,
+        "resultados": resultados
+    })
+
+
+@app.cli.command("reindexar-busca")
+def reindexar_busca_cli():
+    """Refaz o índice FTS5 da busca a partir das tabelas."""
+    busca.reconstruir(db)
+    click.echo("Índice de busca reconstruído.")
+
+
+# --------------------------------
+# Feeds ICS (assinatura de calendário por token)
+# --------------------------------
+def usuario_por_token(token):
+    if not token:
+        return None
+    return Usuario.query.filter_by(token_feed=token).first()
+
+
+def responder_feed(tipo, ident, nome, chaves, gerar):
+    vers = feeds.versoes(chaves)
+    etag, ultima = feeds.validadores(tipo, ident, vers)
+
+    # If-None-Match tem precedência; If-Modified-Since só vale sem ele
+    nao_mudou = etag in request.if_none_match if request.if_none_match else (
+        request.if_modified_since is not None and ultima <= request.if_modified_since
+    )
+    if nao_mudou:
+        resp = app.response_class(status=304)
+    else:
+        resp = Response(feeds.documento(nome, gerar(vers)), mimetype="text/calendar")
+    resp.set_etag(etag)
+    resp.last_modified = ultima
+    resp.cache_control.private = True
+    resp.cache_control.max_age = 300
+    return resp
+
+
+@app.route("/ics/espaco/<int:id>.ics")
+def ics_espaco(id):
+    if not usuario_por_token(request.args.get("token")):
+        return Response("token inválido", status=403)
+    espaco = db.session.get(Espaco, id)
+    if not espaco:
+        return Response("espaço não encontrado", status=404)
+
+    return responder_feed("espaco", id, f"{espaco.nome} ({espaco.setor.nome})",
+                          [f"espaco:{id}"], feeds.blocos_espacos)
+
+
+@app.route("/ics/setor/<int:id>.ics")
+def ics_setor(id):
+    if not usuario_por_token(request.args.get("token")):
+        return Response("token inválido", status=403)
+    setor = db.session.get(Setor, id)
+    if not setor:
+        return Response("setor não encontrado", status=404)
+
+    return responder_feed("setor", id, setor.nome, feeds.chaves_setor(id), feeds.blocos_espacos)
+
+
+@app.route("/ics/usuario/<int:id>.ics")
+def ics_usuario(id):
+    dono = usuario_por_token(request.args.get("token"))
+    # cada um vê o próprio feed; aprovadores veem o de qualquer usuário
+    if not dono or (dono.id != id and not dono.pode_aprovar()):
+        return Response("token inválido", status=403)
+    usuario = db.session.get(Usuario, id)
+    if not usuario:
+        return Response("usuário não encontrado", status=404)
+
+    return responder_feed(
+        "usuario", id, f"Reservas de {usuario.nome}", [f"usuario:{id}"],
+        lambda vers: [feeds.bloco_usuario(id, vers[f"usuario:{id}"][0])],
+    )
+
+
+@app.route("/calendarios", methods=["GET", "POST"])
+def calendarios():
+    user = usuario_logado()
+    if not user:
+        return redirect(url_for("login"))
+
+    # POST gera um token novo (invalida as assinaturas antigas)
+    if not user.token_feed or request.method == "POST":
+        user.token_feed = secrets.token_urlsafe(24)
+        db.session.commit()
+
+    return render_template(
+        "calendarios.html",
+        usuario=user,
+        setores=referencias.setores(),
+        token=user.token_feed,
+        dias_passados=feeds.DIAS_PASSADOS,
+        dias_futuros=feeds.DIAS_FUTUROS,
+    )
 
 
 # --------------------------------
@@ -587,7 +948,7 @@ def novo_agendamento():
     if not user:
         return redirect(url_for("login"))
 
-    setores = Setor.query.all()
+    setores = referencias.setores()
 
     if request.method == "POST":
         espaco = Espaco.query.get(request.form["espaco_id"])
@@ -607,6 +968,41 @@ def novo_agendamento():
         inicio = datetime.fromisoformat(f"{data}T{inicio_str}")
         fim = datetime.fromisoformat(f"{data}T{fim_str}")
 
+        # ----- SÉRIE RECORRENTE -----
+        repeticao = request.form.get("repeticao", "nenhuma")
+        if repeticao != "nenhuma":
+            ate = request.form.get("repetir_ate")
+            ocorrencias = request.form.get("ocorrencias")
+            try:
+                criados, conflitantes = services.criar_agendamentos_recorrentes(
+                    usuario=user,
+                    espaco=espaco,
+                    inicio=inicio,
+                    fim=fim,
+                    motivo=motivo,
+                    frequencia=repeticao,
+                    ate=datetime.fromisoformat(ate) if ate else None,
+                    ocorrencias=int(ocorrencias) if ocorrencias else None
+                )
+            except ValueError as e:
+                return render_template(
+                    "agendamentos_form.html",
+                    erro=str(e),
+                    usuario=user,
+                    setores=setores
+                )
+
+            if not conflitantes:
+                return redirect(url_for("dashboard"))
+
+            return render_template(
+                "agendamentos_form.html",
+                usuario=user,
+                setores=setores,
+                criados=len(criados),
+                conflitantes=conflitantes
+            )
+
         try:
             services.criar_agendamento(
                 usuario=user,
@@ -636,10 +1032,40 @@ def agendamentos_pendentes():
     if not user or not user.pode_aprovar():
         return redirect(url_for("dashboard"))
 
-    pendentes = Agendamento.query.filter_by(status="PENDENTE").all()
+    filtros = {
+        "setor_id": request.args.get("setor_id", type=int),
+        "espaco_id": request.args.get("espaco_id", type=int),
+        "usuario_id": request.args.get("usuario_id", type=int),
+        "busca": request.args.get("busca", "").strip() or None,
+    }
+    try:
+        data_inicio = request.args.get("data_inicio")
+        data_fim = request.args.get("data_fim")
+        filtros["data_inicio"] = datetime.strptime(data_inicio, "%Y-%m-%d") if data_inicio else None
+        # data final inclusiva: até o início do dia seguinte
+        filtros["data_fim"] = datetime.strptime(data_fim, "%Y-%m-%d") + timedelta(days=1) if data_fim else None
+    except ValueError:
+        filtros["data_inicio"] = filtros["data_fim"] = None
+
+    pendentes, anterior, proximo = fila_pendentes.pagina(
+        apos=fila_pendentes.decodificar_cursor(request.args.get("apos")),
+        antes=fila_pendentes.decodificar_cursor(request.args.get("antes")),
+        **filtros,
+    )
+    conflitos = fila_pendentes.marcar_conflitos(pendentes)
+
+    # repete os filtros nos links de navegação, sem os cursores
+    parametros = {k: v for k, v in request.args.items() if k not in ("apos", "antes") and v}
 
     return render_template("agendamentos_pendentes.html",
                            pendentes=pendentes,
+                           conflitos=conflitos,
+                           anterior=anterior,
+                           proximo=proximo,
+                           parametros=parametros,
+                           setores=referencias.setores(),
+                           espacos=referencias.espacos(),
+                           usuarios=Usuario.query.order_by(Usuario.nome).all(),
                            usuario=user)
 
 
@@ -652,8 +1078,7 @@ def aceitar_agendamento(id):
     if not ag:
         return {"erro": "não encontrado"}, 404
 
-    ag.status = "APROVADO"
-    db.session.commit()
+    services.aprovar_agendamento(ag)
     return {"ok": True}
 
 
@@ -667,51 +1092,70 @@ def recusar_agendamento(id):
     if not ag:
         return {"erro": "não encontrado"}, 404
 
-    ag.status = "RECUSADO"
-    ag.motivo_recusa = justificativa
-    db.session.commit()
+    services.recusar_agendamento(ag, justificativa)
     return {"ok": True}
 
 
+# --------------------------------
+# Aprovar recusando os conflitantes (uma transação)
+# --------------------------------
+@app.route("/agendamentos/aceitar_com_conflitos/<int:id>", methods=["POST"])
+def aceitar_com_conflitos(id):
+    user = usuario_logado()
+    if not user or not user.pode_aprovar():
+        return {"erro": "não autorizado"}, 403
+
+    justificativa = (request.json or {}).get("justificativa")
+    if not justificativa:
+        return {"erro": "Justificativa obrigatória"}, 400
+
+    ag = Agendamento.query.get(id)
+    if not ag:
+        return {"erro": "não encontrado"}, 404
+
+    recusados = services.aprovar_com_conflitos(ag, justificativa)
+    return {"ok": True, "recusados": recusados}
+
+
+# --------------------------------
+# Aprovar vários pendentes de uma vez
+# --------------------------------
+@app.route("/agendamentos/aceitar_lote", methods=["POST"])
+def aceitar_lote():
+    user = usuario_logado()
+    if not user or not user.pode_aprovar():
+        return {"erro": "não autorizado"}, 403
+
+    ids = (request.json or {}).get("ids") or []
+    try:
+        ids = [int(i) for i in ids]
+    except (TypeError, ValueError):
+        return {"erro": "ids inválidos"}, 400
+
+    if not ids:
+        return {"ok": True, "aprovados": []}
+
+    aprovados, em_conflito = services.aprovar_em_lote(ids)
+    return {"ok": True, "aprovados": aprovados, "em_conflito": em_conflito}
+
+
 
 # --------------------------------
 # Aceitar com conflitos
 # --------------------------------
 @app.route("/api/conflitos_aceitar/<int:id>")
 def conflitos_aceitar(id):
-    ag = Agendamento.query.get(id)
+    ag = (
+        db.session.query(Agendamento.espaco_id, Agendamento.inicio, Agendamento.fim)
+        .filter(Agendamento.id == id)
+        .first()
+    )
     if not ag:
         return jsonify({"erro": "Agendamento não encontrado"}), 404
 
-    inicio = ag.inicio
-    fim = ag.fim
-    espaco_id = ag.espaco_id
-
-    conflitos = (
-        Agendamento.query
-        .filter(Agendamento.id != ag.id)
-        .filter(Agendamento.espaco_id == espaco_id)
-        .filter(Agendamento.status != "CANCELADO")
-        .filter(Agendamento.fim > inicio)
-        .filter(Agendamento.inicio < fim)
-        .order_by(Agendamento.inicio)
-        .all()
-    )
+    ids = services.indice.conflitos(ag.espaco_id, ag.inicio, ag.fim, ignorar_id=id)
 
-    lista = []
-    for c in conflitos:
-        lista.append({
-            "id": c.id,
-            "status": c.status,
-            "setor": c.espaco.setor.nome,
-            "espaco": c.espaco.nome,
-            "inicio": c.inicio.strftime("%H:%M"),
-            "fim": c.fim.strftime("%H:%M"),
-            "usuario": c.usuario.nome,
-            "motivo": c.motivo
-        })
-
-    return jsonify(lista)
+    return jsonify([serializacao.item_conflito(l) for l in serializacao.linhas_por_ids(ids)])
 
 @app.route("/agendamentos/<int:id>/editar")
 def agendamento_editar(id):
@@ -719,13 +1163,12 @@ def agendamento_editar(id):
     if not user or not user.pode_aprovar():
         return redirect("/agenda")
     ag = Agendamento.query.get_or_404(id)
-    setores = Setor.query.all()
-    espacos = Espaco.query.all()
+    setores = referencias.setores()
 
     # envia JSON com os espaços
     espacos_json = [
         {"id": e.id, "nome": e.nome, "setor_id": e.setor_id}
-        for e in espacos
+        for e in referencias.espacos()
     ]
 
     return render_template(
@@ -742,17 +1185,18 @@ def agendamento_salvar(id):
         return redirect("/agenda")
     ag = Agendamento.query.get_or_404(id)
 
-    espaco_id = request.form["espaco_id"]
+    espaco_id = int(request.form["espaco_id"])
     data = request.form["data"]
     inicio = request.form["inicio"]
     fim = request.form["fim"]
 
-    ag.espaco_id = espaco_id
-    ag.inicio = datetime.strptime(f"{data} {inicio}", "%Y-%m-%d %H:%M")
-    ag.fim = datetime.strptime(f"{data} {fim}", "%Y-%m-%d %H:%M")
-    ag.motivo = request.form["motivo"]
-
-    db.session.commit()
+    services.editar_agendamento(
+        ag,
+        espaco_id=espaco_id,
+        inicio=datetime.strptime(f"{data} {inicio}", "%Y-%m-%d %H:%M"),
+        fim=datetime.strptime(f"{data} {fim}", "%Y-%m-%d %H:%M"),
+        motivo=request.form["motivo"]
+    )
     return redirect("/agenda")
 
 @app.route("/agendamentos/<int:id>/excluir")
@@ -762,12 +1206,12 @@ def agendamento_excluir(id):
         return redirect("/agenda")  # bloqueia quem não pode excluir
 
     ag = Agendamento.query.get_or_404(id)
-    db.session.delete(ag)
-    db.session.commit()
+    services.excluir_agendamento(ag)
     return redirect("/agenda")
 
 # --------------------------------
-# Execução
+# Execução (desenvolvimento; produção: servidor.py)
 # --------------------------------
 if __name__ == "__main__":
+    inicializar_banco()
     app.run(debug=True)
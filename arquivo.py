@@ -0,0 +1,171 @@
+"""Arquivamento de agendamentos antigos (tabela quente / tabela fria).
+
+Agendamentos que terminaram há mais de ARQUIVO_DIAS (padrão 180) saem de
+`agendamentos` para `agendamentos_arquivo`, em lotes de TAMANHO_LOTE por
+transação, numa tarefa da fila em segundo plano (uma vez por dia) ou com
+`flask arquivar`. A tabela quente fica com alguns meses; o arquivo guarda
+o histórico com os mesmos ids.
+
+As leituras que podem alcançar o passado (calendário, conflitos, PDF,
+análise) passam por `incluir_arquivo`: a tabela fria só entra na consulta
+quando a janela pedida começa antes da fronteira do que já foi arquivado.
+O arquivo é só leitura: agendamentos arquivados não são editados nem
+entram no log de alterações, mas continuam na busca textual (o índice
+FTS5 mantém a linha quando ela passa para o arquivo).
+"""
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, text
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Agendamento, AgendamentoArquivo
+from cache import versao_agendamentos, versao_arquivo
+from banco import iniciar_escrita
+
+
+DIAS_PADRAO = 180
+DIAS_MINIMO = 60           # os feeds ICS olham 30 dias para trás
+TAMANHO_LOTE = 2000
+
+_COLUNAS = "id, inicio, fim, status, motivo, motivo_recusa, criado_em, espaco_id, usuario_id"
+
+_fronteira = {"valor": None, "versao": None}
+_lock = threading.Lock()
+
+
+def dias_horizonte():
+    """ARQUIVO_DIAS; 0 desliga o arquivamento automático."""
+    dias = int(os.environ.get("ARQUIVO_DIAS", DIAS_PADRAO))
+    return 0 if dias <= 0 else max(dias, DIAS_MINIMO)
+
+
+def corte(dias=None):
+    dias = max(dias or dias_horizonte() or DIAS_PADRAO, DIAS_MINIMO)
+    hoje = datetime.combine(datetime.now().date(), datetime.min.time())
+    return hoje - timedelta(days=dias)
+
+
+# --------------------------
+# FRONTEIRA (até onde o arquivo vai)
+# --------------------------
+def fronteira():
+    """Maior `fim` arquivado (None com o arquivo vazio).
+
+    Relida só quando versao_arquivo muda: `arquivar`, deste ou de outro
+    processo, registra a versão na mesma transação que move as linhas.
+    """
+    versao = versao_arquivo.atual()
+    with _lock:
+        if _fronteira["versao"] != versao:
+            _fronteira["valor"] = db.session.query(func.max(AgendamentoArquivo.fim)).scalar()
+            _fronteira["versao"] = versao
+        return _fronteira["valor"]
+
+
+def alcanca(inicio):
+    """A janela que começa em `inicio` (None = sem limite) pode ter linhas arquivadas?"""
+    limite = fronteira()
+    if limite is None:
+        return False
+    return inicio is None or inicio < limite
+
+
+def incluir_arquivo(montar, inicio):
+    """`montar(modelo)` devolve a query para um dos modelos; une as duas se preciso."""
+    q = montar(Agendamento)
+    if alcanca(inicio):
+        q = q.union_all(montar(AgendamentoArquivo))
+    return q
+
+
+def ocupados(espaco_id, inicio, fim):
+    # (id, inicio, fim) arquivados que ocupam algo de [inicio, fim) no espaço
+    return db.session.query(AgendamentoArquivo.id, AgendamentoArquivo.inicio, AgendamentoArquivo.fim).filter(
+        AgendamentoArquivo.espaco_id == espaco_id,
+        AgendamentoArquivo.status != "CANCELADO",
+        AgendamentoArquivo.inicio < fim,
+        AgendamentoArquivo.fim > inicio,
+    ).all()
+
+
+# --------------------------
+# MOVER PARA O ARQUIVO
+# --------------------------
+def reservar_ids_arquivados():
+    """Leva a sequência de ids de `agendamentos` até o maior id arquivado.
+
+    Com AUTOINCREMENT um id nunca volta, mas bancos migrados de antes dele
+    podem ter a sequência abaixo do que já foi para o arquivo.
+    """
+    if db.engine.dialect.name != "sqlite":
+        return
+    maior = db.session.query(func.max(AgendamentoArquivo.id)).scalar()
+    if maior is None:
+        return
+    atualizadas = db.session.execute(
+        text("UPDATE sqlite_sequence SET seq = max(seq, :maior) WHERE name = 'agendamentos'"),
+        {"maior": maior},
+    ).rowcount
+    if not atualizadas:
+        db.session.execute(
+            text("INSERT INTO sqlite_sequence (name, seq) VALUES ('agendamentos', :maior)"),
+            {"maior": maior},
+        )
+    db.session.commit()
+
+
+def arquivar(dias=None, lote=TAMANHO_LOTE):
+    """Move em lotes os agendamentos com fim anterior ao corte; devolve quantos.
+
+    O chamador invalida o índice de conflitos deste processo (nos outros,
+    as entradas antigas continuam valendo: o período segue ocupado).
+    """
+    limite = corte(dias)
+    total = 0
+    while True:
+        # com o lock de escrita desde a leitura, dois processos arquivando
+        # ao mesmo tempo se revezam em vez de copiar o mesmo lote
+        iniciar_escrita(db.session)
+        linhas = (
+            db.session.query(Agendamento.id)
+            # inicio < fim sempre; o filtro em inicio usa o índice de período
+            .filter(Agendamento.inicio < limite, Agendamento.fim < limite)
+            .order_by(Agendamento.inicio)
+            .limit(lote)
+            .all()
+        )
+        if not linhas:
+            db.session.rollback()
+            break
+        ids = [i for (i,) in linhas]
+        marcadores = ", ".join(str(int(i)) for i in ids)
+        agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+        # INSERT simples: um id que já está no arquivo é erro, nunca motivo
+        # para apagar a linha da tabela quente sem cópia
+        try:
+            db.session.execute(text(f"""
+                INSERT INTO agendamentos_arquivo ({_COLUNAS}, arquivado_em)
+                SELECT {_COLUNAS}, :agora FROM agendamentos WHERE id IN ({marcadores})
+            """), {"agora": agora})
+        except IntegrityError:
+            db.session.rollback()
+            repetidos = [i for (i,) in db.session.query(AgendamentoArquivo.id)
+                         .filter(AgendamentoArquivo.id.in_(ids))]
+            raise RuntimeError(f"ids já presentes no arquivo: {repetidos[:20]}; nada foi movido neste lote")
+        # só apaga o que acabou de ser copiado
+        movidos = db.session.execute(text(f"""
+            DELETE FROM agendamentos WHERE id IN ({marcadores}) AND id IN (
+                SELECT id FROM agendamentos_arquivo WHERE id IN ({marcadores}) AND arquivado_em = :agora
+            )
+        """), {"agora": agora}).rowcount
+        versao_agendamentos.registrar()
+        versao_arquivo.registrar()
+        db.session.commit()
+        total += movidos
+
+    if total:
+        versao_agendamentos.incrementar()
+        versao_arquivo.incrementar()
+    return total
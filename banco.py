@@ -0,0 +1,188 @@
+import os
+import random
+import sqlite3
+import time
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+
+# --------------------------
+# AJUSTES DO SQLITE
+# --------------------------
+# Valores padrão; cada um pode ser trocado por variável de ambiente
+# (SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, ...) ou por app.config.
+PRAGMAS_PADRAO = {
+    "journal_mode": "WAL",        # leitores não bloqueiam o escritor
+    "synchronous": "NORMAL",      # seguro com WAL, fsync só no checkpoint
+    "busy_timeout": 5000,         # ms esperando o lock antes de "database is locked"
+    "cache_size": -64000,         # negativo = KiB (64 MB por conexão)
+    "mmap_size": 268435456,       # 256 MB de leitura mapeada em memória
+    "temp_store": "MEMORY",
+}
+
+_pragmas_ativos = {}
+
+
+def configurar_sqlite(app):
+    """Prepara app.config para o SQLite; chamar antes de db.init_app(app).
+
+    SQLITE_AJUSTES=0 desliga os pragmas (modo padrão do SQLite, útil para
+    comparar em benchmarks). Pool: DB_POOL_SIZE, DB_MAX_OVERFLOW e
+    DB_POOL_TIMEOUT.
+    """
+    ativo = os.environ.get("SQLITE_AJUSTES", "1") != "0"
+
+    pragmas = {}
+    if ativo:
+        for nome, padrao in PRAGMAS_PADRAO.items():
+            pragmas[nome] = os.environ.get(f"SQLITE_{nome.upper()}", padrao)
+        pragmas.update(app.config.get("SQLITE_PRAGMAS", {}))
+    app.config["SQLITE_PRAGMAS"] = pragmas
+
+    _pragmas_ativos.clear()
+    _pragmas_ativos.update(pragmas)
+
+    uri = app.config.get("SQLALCHEMY_DATABASE_URI", "")
+    if not uri.startswith("sqlite") or ":memory:" in uri:
+        return
+
+    opcoes = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+    opcoes.setdefault("pool_size", int(os.environ.get("DB_POOL_SIZE", 10)))
+    opcoes.setdefault("max_overflow", int(os.environ.get("DB_MAX_OVERFLOW", 20)))
+    opcoes.setdefault("pool_timeout", int(os.environ.get("DB_POOL_TIMEOUT", 30)))
+    opcoes.setdefault("pool_pre_ping", False)
+
+    connect_args = opcoes.setdefault("connect_args", {})
+    # conexões do pool circulam entre as threads do servidor
+    connect_args.setdefault("check_same_thread", False)
+    if ativo:
+        connect_args.setdefault("timeout", int(pragmas["busy_timeout"]) / 1000)
+
+
+@event.listens_for(Engine, "connect")
+def _aplicar_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection) or not _pragmas_ativos:
+        return
+    cursor = dbapi_connection.cursor()
+    for nome, valor in _pragmas_ativos.items():
+        cursor.execute(f"PRAGMA {nome}={valor}")
+    cursor.close()
+
+
+# --------------------------
+# ESCRITA COM LOCK ANTECIPADO
+# --------------------------
+# O SQLite tem um escritor por vez. Uma transação comum só pede o lock de
+# escrita no primeiro INSERT/UPDATE, depois das leituras de verificação;
+# BEGIN IMMEDIATE pede já no início, então o que foi lido continua valendo
+# até o commit. Se o lock não sai dentro do busy_timeout, o SQLite devolve
+# "database is locked" e a operação inteira é repetida com espera crescente.
+TENTATIVAS_OCUPADO = 5
+ESPERA_OCUPADO = 0.05      # s antes da 2ª tentativa; dobra a cada nova
+
+
+def iniciar_escrita(sessao):
+    """Abre a transação da sessão com BEGIN IMMEDIATE (no-op fora do SQLite)."""
+    conexao = sessao.connection()
+    if conexao.dialect.name != "sqlite":
+        return
+    # já com escrita pendente na transação, o lock já é nosso
+    if not conexao.connection.dbapi_connection.in_transaction:
+        conexao.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def ocupado(erro):
+    """O erro é o banco travado por outro escritor (vale repetir)?"""
+    texto = str(getattr(erro, "orig", erro)).lower()
+    return "database is locked" in texto or "database is busy" in texto
+
+
+def repetir_se_ocupado(funcao, sessao, tentativas=TENTATIVAS_OCUPADO):
+    """Chama `funcao()`; com o banco ocupado, desfaz a transação e tenta de novo."""
+    for n in range(1, tentativas + 1):
+        try:
+            return funcao()
+        except OperationalError as e:
+            sessao.rollback()
+            if n == tentativas or not ocupado(e):
+                raise
+            # variação aleatória: quem colidiu não volta todo mundo junto
+            time.sleep(ESPERA_OCUPADO * 2 ** (n - 1) * random.uniform(0.5, 1.5))
+
+
+# --------------------------
+# ESQUEMA
+# --------------------------
+def atualizar_esquema(db):
+    """Completa bancos criados por versões anteriores.
+
+    create_all não mexe em tabelas existentes: aqui criamos os índices que
+    faltam e adicionamos colunas novas (sempre anuláveis) com ALTER TABLE.
+    """
+    inspetor = inspect(db.engine)
+    for tabela in db.metadata.sorted_tables:
+        existentes = {c["name"] for c in inspetor.get_columns(tabela.name)}
+        for coluna in tabela.columns:
+            if coluna.name not in existentes and coluna.nullable:
+                tipo = coluna.type.compile(db.engine.dialect)
+                with db.engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {tipo}"))
+
+        for indice in tabela.indexes:
+            indice.create(db.engine, checkfirst=True)
+
+        if tabela.dialect_options["sqlite"]["autoincrement"] and db.engine.dialect.name == "sqlite":
+            _garantir_autoincrement(db, tabela)
+
+
+def _garantir_autoincrement(db, tabela):
+    """Recria a tabela com AUTOINCREMENT se o banco é de antes dele.
+
+    Sem AUTOINCREMENT o SQLite dá a um id novo o maior id existente + 1:
+    ids que saíram da tabela (arquivados) voltariam a ser usados.
+    """
+    with db.engine.begin() as conn:
+        ddl = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :n"), {"n": tabela.name},
+        ).scalar()
+        if ddl is None or "AUTOINCREMENT" in ddl.upper():
+            return
+        antiga = f"{tabela.name}_antiga"
+        colunas = ", ".join(c.name for c in tabela.columns)
+        # os triggers da tabela vão junto com a renomeada e somem com ela
+        # (busca.criar_indice_busca os recria); legacy_alter_table impede que
+        # o RENAME reescreva os triggers de outras tabelas que citam esta
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+        conn.execute(text(f"ALTER TABLE {tabela.name} RENAME TO {antiga}"))
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+        for indice in tabela.indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {indice.name}"))
+        tabela.create(conn)
+        conn.execute(text(f"INSERT INTO {tabela.name} ({colunas}) SELECT {colunas} FROM {antiga}"))
+        conn.execute(text(f"DROP TABLE {antiga}"))
+
+
+# --------------------------
+# VERSÃO DO ESQUEMA
+# --------------------------
+# Incrementar sempre que models.py ganhar tabela, coluna ou índice (ou os
+# triggers da busca mudarem): os processos comparam com PRAGMA user_version
+# e só refazem a inicialização (create_all, atualizar_esquema, busca)
+# quando o banco está atrás.
+VERSAO_ESQUEMA = 4
+
+
+def versao_esquema(db):
+    """user_version do SQLite; None em outros bancos (sempre inicializa)."""
+    if db.engine.dialect.name != "sqlite":
+        return None
+    with db.engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def marcar_esquema(db):
+    if db.engine.dialect.name == "sqlite":
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(f"PRAGMA user_version = {int(VERSAO_ESQUEMA)}")
@@ -0,0 +1,82 @@
+"""Benchmark do analise.py em 1M agendamentos sintéticos (sem banco).
+
+Compara a ocupação por hora da semana vetorizada com o laço Python
+equivalente e mede as demais métricas.
+
+    python benchmarks/bench_analise.py --total 1000000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import analise  # noqa: E402
+
+
+def gerar(total, espacos=300, setores=20, anos=3, seed=42):
+    rnd = np.random.default_rng(seed)
+    inicio0 = analise.epoch(datetime(2022, 1, 1))
+    dias = rnd.integers(0, 365 * anos, total)
+    meia_hora = rnd.integers(14, 40, total)            # 07:00 .. 20:00
+    inicio = inicio0 + dias * 86400 + meia_hora * 1800
+    fim = inicio + rnd.integers(1, 9, total) * 1800
+    espaco = rnd.integers(1, espacos + 1, total)
+    setor = espaco % setores + 1
+    status = rnd.choice(4, total, p=[0.1, 0.7, 0.15, 0.05]).astype(np.int8)
+    criado = inicio - rnd.integers(1, 60 * 24, total) * 3600
+    col = analise.Colunas(espaco, setor, inicio, fim, status, criado)
+    return col, inicio0, inicio0 + 365 * anos * 86400
+
+
+def ocupacao_python(col, inicio, fim):
+    ocupado = {}
+    for e, ini, f in zip(col.espaco.tolist(), col.inicio.tolist(), col.fim.tolist()):
+        ini, f = max(ini, inicio), min(f, fim)
+        hora = ini // 3600
+        while hora * 3600 < f:
+            seg = min(f, (hora + 1) * 3600) - max(ini, hora * 3600)
+            chave = (e, (hora + analise.DESLOCAMENTO_SEGUNDA) % analise.HORAS_SEMANA)
+            ocupado[chave] = ocupado.get(chave, 0) + seg
+            hora += 1
+    return ocupado
+
+
+def medir(rotulo, funcao):
+    t0 = time.perf_counter()
+    resultado = funcao()
+    print(f"{rotulo:38s} {(time.perf_counter() - t0) * 1e3:9.1f} ms")
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--total", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    col, inicio, fim = gerar(args.total)
+    print(f"{args.total} agendamentos sintéticos")
+
+    espacos, fracao = medir("ocupação hora-da-semana (NumPy)",
+                            lambda: analise.ocupacao_hora_semana(col, inicio, fim))
+    ocupado = medir("ocupação hora-da-semana (laço Python)",
+                    lambda: ocupacao_python(col, inicio, fim))
+    medir("pico de concorrência por espaço", lambda: analise.pico_concorrencia(col))
+    medir("taxas de status por setor", lambda: analise.taxas_status(col, col.setor))
+    medir("antecedência por setor", lambda: analise.antecedencia(col, col.setor))
+
+    # confere que os dois cálculos batem
+    e0 = int(espacos[0])
+    horas_periodo = np.arange(inicio // 3600, -(-fim // 3600))
+    disponivel = np.bincount(analise.hora_da_semana(horas_periodo * 3600), minlength=168) * 3600.0
+    esperado = np.array([ocupado.get((e0, h), 0) for h in range(168)]) / disponivel
+    assert np.allclose(esperado, fracao[0]), "NumPy e laço Python divergem"
+    print("resultados conferem")
+
+
+if __name__ == "__main__":
+    main()
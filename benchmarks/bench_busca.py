@@ -0,0 +1,110 @@
+"""Benchmark da busca FTS5 (busca.py) em um banco com 1M agendamentos.
+
+Gera o banco num arquivo temporário (os triggers preenchem o índice),
+depois mede busca.buscar() para consultas típicas: p50/p95/máx em ms.
+
+    python benchmarks/bench_busca.py --total 1000000
+    python benchmarks/bench_busca.py --banco /tmp/busca.db   # reaproveita um banco já gerado
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+EVENTOS = ["Reunião", "Aula", "Defesa de tese", "Defesa de dissertação", "Seminário",
+           "Workshop", "Palestra", "Treinamento", "Banca", "Oficina", "Entrevista",
+           "Conselho", "Colegiado", "Prova", "Orientação", "Grupo de estudos"]
+TEMAS = ["química", "física", "matemática", "história", "biologia", "direito",
+         "economia", "medicina", "computação", "letras", "filosofia", "engenharia",
+         "geografia", "psicologia", "artes", "música", "educação", "estatística"]
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Felipe", "Gabriela", "Heitor",
+         "Isabela", "João", "Karina", "Lucas", "Marina", "Nicolas", "Olívia", "Paulo"]
+SOBRENOMES = ["Silva", "Souza", "Oliveira", "Santos", "Pereira", "Costa", "Ferreira",
+              "Almeida", "Ribeiro", "Carvalho", "Gomes", "Martins", "Rocha", "Lima"]
+
+CONSULTAS = ["defesa tese", "defesa tese química", "seminário física", "banca Oliveira",
+             "workshop comp", "reunião conselho março", "palestra música", "Ana Souza",
+             "lab 12", "treinamento estat", "prova direito", "orientação filo"]
+
+
+def popular(caminho, total, seed=42):
+    rnd = random.Random(seed)
+    con = sqlite3.connect(caminho)
+    con.executemany("INSERT INTO setores (nome) VALUES (?)",
+                    [(f"Departamento de {t.capitalize()}",) for t in TEMAS])
+    setores = [r[0] for r in con.execute("SELECT id FROM setores WHERE nome LIKE 'Departamento%'")]
+    con.executemany("INSERT INTO espacos (nome, setor_id, status) VALUES (?, ?, 'LIVRE')",
+                    [(f"{tipo} {n}", rnd.choice(setores))
+                     for tipo in ("Sala", "Lab", "Auditório") for n in range(1, 101)])
+    espacos = [r[0] for r in con.execute("SELECT id FROM espacos")]
+    con.executemany("INSERT INTO usuarios (nome, email, senha_hash, papel) VALUES (?, ?, 'x', 'SOLICITANTE')",
+                    [(f"{n} {s}", f"{n}.{s}.{i}@exemplo.com".lower())
+                     for i, (n, s) in enumerate((n, s) for n in NOMES for s in SOBRENOMES)])
+    usuarios = [r[0] for r in con.execute("SELECT id FROM usuarios")]
+
+    base = datetime(2022, 1, 1, 7)
+    meses = ["janeiro", "fevereiro", "março", "abril", "maio", "junho", "julho",
+             "agosto", "setembro", "outubro", "novembro", "dezembro"]
+
+    def linhas():
+        for _ in range(total):
+            inicio = base + timedelta(days=rnd.randrange(365 * 3), minutes=30 * rnd.randrange(26))
+            motivo = f"{rnd.choice(EVENTOS)} de {rnd.choice(TEMAS)}"
+            if rnd.random() < 0.3:
+                motivo += f" - {rnd.choice(meses)} turma {rnd.randrange(1, 40)}"
+            recusa = "Sala em manutenção" if rnd.random() < 0.05 else None
+            yield (inicio, inicio + timedelta(hours=1), rnd.choice(["APROVADO", "PENDENTE", "RECUSADO"]),
+                   motivo, recusa, rnd.choice(espacos), rnd.choice(usuarios))
+
+    con.executemany(
+        "INSERT INTO agendamentos (inicio, fim, status, motivo, motivo_recusa, espaco_id, usuario_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)", linhas())
+    con.commit()
+    con.execute("INSERT INTO agendamentos_busca (agendamentos_busca) VALUES ('optimize')")
+    con.commit()
+    con.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--total", type=int, default=1_000_000)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--banco", help="arquivo SQLite; é gerado se ainda não existir")
+    args = parser.parse_args()
+
+    caminho = args.banco or os.path.join(tempfile.mkdtemp(), "busca.db")
+    gerar = not os.path.exists(caminho)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(caminho)}"
+    sys.path.insert(0, RAIZ)
+    from app import app, preparar_processo
+    import busca
+
+    preparar_processo()
+
+    if gerar:
+        t0 = time.perf_counter()
+        popular(caminho, args.total)
+        print(f"{args.total} agendamentos gerados e indexados em {time.perf_counter() - t0:.1f} s")
+
+    with app.app_context():
+        print(f"{'consulta':28s} {'p50':>8s} {'p95':>8s} {'máx':>8s}  resultados")
+        for consulta in CONSULTAS:
+            tempos = []
+            for _ in range(args.repeticoes):
+                t0 = time.perf_counter()
+                resultados, tem_mais = busca.buscar(consulta)
+                tempos.append((time.perf_counter() - t0) * 1e3)
+            tempos.sort()
+            p95 = tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))]
+            print(f"{consulta:28s} {tempos[len(tempos) // 2]:8.1f} {p95:8.1f} {tempos[-1]:8.1f}"
+                  f"  {len(resultados)}{'+' if tem_mais else ''}")
+
+
+if __name__ == "__main__":
+    main()
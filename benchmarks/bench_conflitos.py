@@ -0,0 +1,89 @@
+"""Benchmark: varredura linear (existe_conflito antigo) x AgendaEspaco.
+
+Gera um histórico sintético em memória e mede o custo médio de uma checagem
+de conflito nos dois modelos. Não usa banco: o objetivo é comparar só a
+lógica de sobreposição.
+
+    python benchmarks/bench_conflitos.py --total 1000000 --espacos 50
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from models import Agendamento  # noqa: E402
+from conflitos import AgendaEspaco  # noqa: E402
+
+
+def gerar_historico(total, espacos, seed=42):
+    rnd = random.Random(seed)
+    base = datetime(2015, 1, 1, 7)
+    por_espaco = {e: [] for e in range(1, espacos + 1)}
+    for ag_id in range(1, total + 1):
+        espaco_id = rnd.randint(1, espacos)
+        inicio = base + timedelta(days=rnd.randint(0, 3650), minutes=30 * rnd.randint(0, 28))
+        fim = inicio + timedelta(minutes=30 * rnd.randint(1, 8))
+        por_espaco[espaco_id].append((ag_id, inicio, fim))
+    return por_espaco
+
+
+def varredura(linhas_objs, novo):
+    # mesma lógica do existe_conflito original
+    for x in linhas_objs:
+        if Agendamento.conflita_com(novo, x):
+            return True
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--total", type=int, default=1_000_000)
+    parser.add_argument("--espacos", type=int, default=50)
+    parser.add_argument("--consultas", type=int, default=200)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    por_espaco = gerar_historico(args.total, args.espacos)
+    print(f"histórico: {args.total} agendamentos em {args.espacos} espaços "
+          f"({time.perf_counter() - t0:.1f}s)")
+
+    objs = {
+        e: [SimpleNamespace(espaco_id=e, inicio=i, fim=f) for _, i, f in linhas]
+        for e, linhas in por_espaco.items()
+    }
+
+    t0 = time.perf_counter()
+    agendas = {e: AgendaEspaco(linhas) for e, linhas in por_espaco.items()}
+    print(f"construção do índice: {time.perf_counter() - t0:.2f}s")
+
+    rnd = random.Random(7)
+    consultas = []
+    for _ in range(args.consultas):
+        espaco_id = rnd.randint(1, args.espacos)
+        inicio = datetime(2030, 1, 1, 8) + timedelta(days=rnd.randint(0, 30))
+        consultas.append(SimpleNamespace(espaco_id=espaco_id, inicio=inicio,
+                                         fim=inicio + timedelta(hours=1)))
+
+    # pior caso da varredura: sem conflito, percorre todo o histórico do espaço
+    t0 = time.perf_counter()
+    for c in consultas:
+        varredura(objs[c.espaco_id], c)
+    t_scan = (time.perf_counter() - t0) / len(consultas)
+
+    t0 = time.perf_counter()
+    for c in consultas:
+        agendas[c.espaco_id].sobrepostos(c.inicio, c.fim)
+    t_indice = (time.perf_counter() - t0) / len(consultas)
+
+    print(f"varredura linear: {t_scan * 1e3:9.3f} ms/consulta")
+    print(f"AgendaEspaco:     {t_indice * 1e3:9.3f} ms/consulta")
+    print(f"ganho:            {t_scan / t_indice:9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark de contenção de escrita: N threads chamando criar_agendamento.
+
+Roda duas vezes, cada uma em um banco novo e processo próprio: com os
+ajustes de banco.py (WAL, synchronous=NORMAL, ...) e sem eles
+(SQLITE_AJUSTES=0). Reporta vazão, p50/p99 e erros ("database is locked").
+
+    python benchmarks/bench_escrita.py --threads 16 --por-thread 100
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def executar(threads, por_thread):
+    sys.path.insert(0, RAIZ)
+    from app import app, preparar_processo
+    from models import db, Usuario, Setor, Espaco
+    import services
+
+    preparar_processo()
+
+    with app.app_context():
+        setor = Setor(nome="Setor Benchmark")
+        db.session.add(setor)
+        db.session.flush()
+        espacos = [Espaco(nome=f"Sala {i}", setor_id=setor.id) for i in range(threads)]
+        db.session.add_all(espacos)
+        db.session.commit()
+        espaco_ids = [e.id for e in espacos]
+        admin_id = Usuario.query.filter_by(email="admin@admin.com").first().id
+
+    latencias = []
+    erros = []
+    lock = threading.Lock()
+    barreira = threading.Barrier(threads)
+
+    def trabalhador(n):
+        with app.app_context():
+            usuario = db.session.get(Usuario, admin_id)
+            espaco = db.session.get(Espaco, espaco_ids[n])
+            base = datetime(2030, 1, 1, 8)
+            barreira.wait()
+            for i in range(por_thread):
+                inicio = base + timedelta(hours=i)
+                t0 = time.perf_counter()
+                try:
+                    services.criar_agendamento(usuario, espaco, inicio,
+                                               inicio + timedelta(minutes=50), "bench")
+                    dt = time.perf_counter() - t0
+                    with lock:
+                        latencias.append(dt)
+                except Exception as e:  # noqa: BLE001 - queremos contar qualquer falha
+                    db.session.rollback()
+                    with lock:
+                        erros.append(type(e).__name__)
+
+    ths = [threading.Thread(target=trabalhador, args=(n,)) for n in range(threads)]
+    t0 = time.perf_counter()
+    for t in ths:
+        t.start()
+    for t in ths:
+        t.join()
+    duracao = time.perf_counter() - t0
+
+    latencias.sort()
+    print(json.dumps({
+        "ok": len(latencias),
+        "erros": len(erros),
+        "vazao": len(latencias) / duracao,
+        "p50_ms": latencias[len(latencias) // 2] * 1e3 if latencias else None,
+        "p99_ms": latencias[int(len(latencias) * 0.99) - 1] * 1e3 if latencias else None,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--por-thread", type=int, default=100)
+    parser.add_argument("--filho", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        executar(args.threads, args.por_thread)
+        return
+
+    for rotulo, ajustes in (("sem ajustes", "0"), ("com ajustes", "1")):
+        banco = os.path.join(tempfile.mkdtemp(), "escrita.db")
+        env = dict(os.environ, DATABASE_URL="sqlite:///" + banco, SQLITE_AJUSTES=ajustes)
+        saida = subprocess.run(
+            [sys.executable, __file__, "--filho",
+             "--threads", str(args.threads), "--por-thread", str(args.por_thread)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(saida)
+        print(f"{rotulo:12s} {r['ok']:6d} ok {r['erros']:4d} erros  "
+              f"{r['vazao']:8.1f} criações/s  p50 {r['p50_ms']:7.1f} ms  p99 {r['p99_ms']:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
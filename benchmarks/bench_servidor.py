@@ -0,0 +1,198 @@
+"""Partida a frio e vazão: servidor de desenvolvimento (uma thread) x servidor.py.
+
+Partida a frio: tempo de `import app` num processo novo (não deve tocar
+no banco) e tempo até a primeira resposta de cada servidor. Vazão: C
+clientes concorrentes, já logados, repetem uma mistura de páginas e APIs
+de leitura por D segundos.
+
+    python benchmarks/gerar_dados.py /tmp/pequeno.db --tamanho pequeno
+    python benchmarks/bench_servidor.py --banco /tmp/pequeno.db --workers 4 --threads 16
+"""
+import argparse
+import http.client
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from datetime import date, timedelta
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+# --------------------------
+# PROCESSOS
+# --------------------------
+def ambiente(banco):
+    return dict(os.environ, DATABASE_URL=f"sqlite:///{banco}", TAREFAS_THREADS="0", PYTHONPATH=RAIZ)
+
+
+def tempo_import(banco):
+    codigo = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    saida = subprocess.run([sys.executable, "-c", codigo], env=ambiente(banco), cwd=RAIZ,
+                           capture_output=True, text=True, check=True)
+    return float(saida.stdout.strip())
+
+
+def subir(comando, banco, porta):
+    """Inicia o servidor e devolve (processo, segundos até a primeira resposta)."""
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(comando, env=ambiente(banco), cwd=RAIZ,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    while time.perf_counter() - t0 < 60:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", porta, timeout=5)
+            conn.request("GET", "/login")
+            conn.getresponse().read()
+            conn.close()
+            return proc, time.perf_counter() - t0
+        except OSError:
+            time.sleep(0.02)
+    proc.terminate()
+    raise RuntimeError(f"servidor não respondeu: {' '.join(comando)}")
+
+
+def derrubar(proc):
+    proc.terminate()
+    try:
+        proc.wait(15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+# --------------------------
+# CARGA
+# --------------------------
+def login(porta):
+    conn = http.client.HTTPConnection("127.0.0.1", porta)
+    corpo = urllib.parse.urlencode({"email": "admin@admin.com", "senha": "admin"})
+    conn.request("POST", "/login", corpo, {"Content-Type": "application/x-www-form-urlencoded"})
+    resp = conn.getresponse()
+    resp.read()
+    return resp.getheader("Set-Cookie").split(";")[0]
+
+
+def caminhos():
+    segunda = date.today() - timedelta(days=date.today().weekday())
+    janela = urllib.parse.urlencode({"start": segunda.isoformat(), "end": (segunda + timedelta(days=7)).isoformat()})
+    return [
+        "/dashboard",
+        f"/api/agendamentos?{janela}",
+        "/api/espacos/1",
+        "/agenda",
+    ]
+
+
+def carga(porta, cookie, clientes, duracao):
+    lista = caminhos()
+    latencias = []
+    erros = [0]
+    lock = threading.Lock()
+    fim = time.perf_counter() + duracao
+
+    def cliente(n):
+        minhas = []
+        falhas = 0
+        i = n
+        while time.perf_counter() < fim:
+            caminho = lista[i % len(lista)]
+            i += 1
+            t = time.perf_counter()
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", porta, timeout=30)
+                conn.request("GET", caminho, headers={"Cookie": cookie})
+                resp = conn.getresponse()
+                resp.read()
+                conn.close()
+                if resp.status >= 400:
+                    falhas += 1
+            except OSError:
+                falhas += 1
+                continue
+            minhas.append(time.perf_counter() - t)
+        with lock:
+            latencias.extend(minhas)
+            erros[0] += falhas
+
+    threads = [threading.Thread(target=cliente, args=(n,)) for n in range(clientes)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    decorrido = time.perf_counter() - t0
+
+    latencias.sort()
+    return {
+        "requisicoes": len(latencias),
+        "rps": len(latencias) / decorrido,
+        "p50": percentil(latencias, 0.50) * 1000 if latencias else 0,
+        "p95": percentil(latencias, 0.95) * 1000 if latencias else 0,
+        "erros": erros[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--banco", help="banco gerado por gerar_dados.py (é copiado; vazio = banco novo)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--clientes", type=int, default=32)
+    parser.add_argument("--duracao", type=float, default=10.0)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp()
+    banco = os.path.join(pasta, "servidor.db")
+    if args.banco:
+        shutil.copy(args.banco, banco)
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app", "init-db"],
+                   env=ambiente(banco), cwd=RAIZ, check=True, capture_output=True)
+
+    imports = sorted(tempo_import(banco) for _ in range(5))
+    print(f"import app (processo novo, mediana de 5): {imports[2] * 1000:.0f} ms")
+
+    porta = porta_livre()
+    dev = [sys.executable, "-c",
+           f"from app import app; app.run(port={porta}, threaded=False, debug=False, use_reloader=False)"]
+    porta_prod = porta_livre()
+    prod = [sys.executable, "servidor.py", "--porta", str(porta_prod),
+            "--workers", str(args.workers), "--threads", str(args.threads)]
+
+    resultados = []
+    for nome, comando, p in [("dev (1 thread)", dev, porta),
+                             (f"servidor.py {args.workers}x{args.threads}", prod, porta_prod)]:
+        proc, partida = subir(comando, banco, p)
+        try:
+            cookie = login(p)
+            carga(p, cookie, args.clientes, 1.0)   # aquecimento (caches, índice de conflitos)
+            r = carga(p, cookie, args.clientes, args.duracao)
+        finally:
+            derrubar(proc)
+        resultados.append((nome, partida, r))
+
+    print(f"\n{args.clientes} clientes, {args.duracao:.0f} s, CPUs: {os.cpu_count()}")
+    print(f"{'servidor':24s} {'1ª resp. ms':>11s} {'req/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'erros':>6s}")
+    for nome, partida, r in resultados:
+        print(f"{nome:24s} {partida * 1000:11.0f} {r['rps']:8.1f} {r['p50']:8.1f} {r['p95']:8.1f} {r['erros']:6d}")
+    base = resultados[0][2]["rps"]
+    if base:
+        print(f"\nvazão relativa: {resultados[1][2]['rps'] / base:.2f}x")
+    shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Teste de carga do stream /api/eventos.
+
+Sobe o app em um servidor werkzeug com threads, conecta N assinantes SSE
+e publica M eventos pelo broker, medindo a latência de entrega (publicação
+até leitura no cliente) e se todos os eventos chegaram a todos.
+
+    python benchmarks/bench_sse.py --assinantes 300 --eventos 50
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(_tmp, "sse.db"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from werkzeug.serving import make_server  # noqa: E402
+from app import app, preparar_processo  # noqa: E402
+from eventos import broker  # noqa: E402
+
+preparar_processo()
+
+
+def login(porta):
+    conn = http.client.HTTPConnection("127.0.0.1", porta)
+    corpo = urllib.parse.urlencode({"email": "admin@admin.com", "senha": "admin"})
+    conn.request("POST", "/login", corpo, {"Content-Type": "application/x-www-form-urlencoded"})
+    resp = conn.getresponse()
+    resp.read()
+    return resp.getheader("Set-Cookie").split(";")[0]
+
+
+def assinante(porta, cookie, total, latencias, prontos):
+    conn = http.client.HTTPConnection("127.0.0.1", porta, timeout=60)
+    conn.request("GET", "/api/eventos", headers={"Cookie": cookie})
+    resp = conn.getresponse()
+    prontos.release()
+
+    recebidos = 0
+    while recebidos < total:
+        linha = resp.fp.readline()
+        if not linha:
+            break
+        if linha.startswith(b"data: "):
+            dados = json.loads(linha[6:])
+            latencias.append(time.perf_counter() - dados["enviado"])
+            recebidos += 1
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--assinantes", type=int, default=300)
+    parser.add_argument("--eventos", type=int, default=50)
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    servidor = make_server("127.0.0.1", 0, app, threaded=True)
+    porta = servidor.server_port
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    cookie = login(porta)
+    latencias = []
+    prontos = threading.Semaphore(0)
+
+    t0 = time.perf_counter()
+    threads = [
+        threading.Thread(target=assinante,
+                         args=(porta, cookie, args.eventos, latencias, prontos))
+        for _ in range(args.assinantes)
+    ]
+    for t in threads:
+        t.start()
+    for _ in threads:
+        prontos.acquire()
+    while len(broker) < args.assinantes:
+        time.sleep(0.01)
+    print(f"{args.assinantes} assinantes conectados em {time.perf_counter() - t0:.2f}s")
+
+    t0 = time.perf_counter()
+    for i in range(args.eventos):
+        broker.publicar("agendamento", {"tipo": "teste", "seq": i, "enviado": time.perf_counter()})
+        time.sleep(0.01)
+    for t in threads:
+        t.join()
+    duracao = time.perf_counter() - t0
+
+    esperado = args.assinantes * args.eventos
+    latencias.sort()
+    print(f"entregues: {len(latencias)}/{esperado} em {duracao:.2f}s "
+          f"({len(latencias) / duracao:.0f} msg/s)")
+    print(f"latência p50: {statistics.median(latencias) * 1e3:.1f} ms  "
+          f"p99: {latencias[int(len(latencias) * 0.99) - 1] * 1e3:.1f} ms")
+
+    servidor.shutdown()
+    sys.exit(0 if len(latencias) == esperado else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Confere que os endpoints JSON fazem um número fixo de SELECTs.
+
+Popula um banco temporário com poucos e depois muitos agendamentos e
+compara a quantidade de comandos SQL de cada endpoint nos dois cenários.
+Sai com código 1 se algum endpoint crescer com o número de linhas.
+
+    python benchmarks/contagem_consultas.py
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_tmp, "contagem.db")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import event  # noqa: E402
+from app import app, preparar_processo  # noqa: E402
+from models import db, Usuario, Setor, Espaco, Agendamento  # noqa: E402
+
+preparar_processo()
+
+
+@contextmanager
+def contar_consultas():
+    contagem = [0]
+
+    def antes(conn, cursor, statement, parameters, context, executemany):
+        contagem[0] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", antes)
+    try:
+        yield contagem
+    finally:
+        event.remove(engine, "before_cursor_execute", antes)
+
+
+def popular(quantidade):
+    with app.app_context():
+        Agendamento.query.delete()
+        admin = Usuario.query.filter_by(email="admin@admin.com").first()
+        setor = Setor.query.first() or Setor(nome="Setor de Medição")
+        db.session.add(setor)
+        db.session.flush()
+        espacos = Espaco.query.all()
+        if not espacos:
+            espacos = [Espaco(nome=f"Sala {i}", setor_id=setor.id) for i in range(5)]
+            db.session.add_all(espacos)
+            db.session.flush()
+
+        hoje = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+        db.session.bulk_insert_mappings(Agendamento, [
+            {
+                "inicio": hoje + timedelta(minutes=5 * i),
+                "fim": hoje + timedelta(minutes=5 * i + 60),
+                "status": ("PENDENTE", "APROVADO", "RECUSADO")[i % 3],
+                "motivo": f"motivo {i}",
+                "espaco_id": espacos[i % len(espacos)].id,
+                "usuario_id": admin.id,
+            }
+            for i in range(quantidade)
+        ])
+        db.session.commit()
+        primeiro = Agendamento.query.order_by(Agendamento.id).first()
+        return admin.id, primeiro.id, primeiro.espaco_id, hoje
+
+
+def medir(quantidade):
+    import services
+    from cache import cache_dashboard
+    services.indice.invalidar()
+    cache_dashboard.limpar()
+
+    admin_id, ag_id, espaco_id, hoje = popular(quantidade)
+    cliente = app.test_client()
+    with cliente.session_transaction() as s:
+        s["usuario_id"] = admin_id
+
+    inicio = hoje.isoformat()
+    fim = (hoje + timedelta(days=1)).isoformat()
+    urls = {
+        "api_agendamentos": f"/api/agendamentos?start={inicio}&end={fim}",
+        "api_dashboard": "/api/dashboard",
+        "verificar_conflitos": f"/api/verificar_conflitos?espaco_id={espaco_id}&inicio={inicio}&fim={fim}",
+        "conflitos_aceitar": f"/api/conflitos_aceitar/{ag_id}",
+        "api_agendamento": f"/api/agendamento/{ag_id}",
+    }
+
+    # aquece o índice de conflitos para medir só o caminho do endpoint
+    cliente.get(urls["verificar_conflitos"])
+
+    resultado = {}
+    for nome, url in urls.items():
+        with contar_consultas() as contagem:
+            resp = cliente.get(url)
+        assert resp.status_code == 200, (nome, resp.status_code)
+        resultado[nome] = contagem[0]
+    return resultado
+
+
+def main():
+    poucos = medir(10)
+    muitos = medir(2000)
+
+    ok = True
+    for nome in poucos:
+        marca = "ok" if poucos[nome] == muitos[nome] else "CRESCEU"
+        ok = ok and marca == "ok"
+        print(f"{nome:22s} {poucos[nome]:3d} consultas (10 linhas)  "
+              f"{muitos[nome]:3d} consultas (2000 linhas)  {marca}")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Gera um banco SQLite novo com dados sintéticos realistas.
+
+Setores, espaços, usuários e anos de agendamentos até alguns meses à
+frente de hoje. Cada espaço tem aulas semanais fixas por semestre
+(recorrência) e o resto do dia é preenchido com reservas avulsas em
+horário comercial, sem sobreposição dentro do espaço. O status depende
+de o horário já ter passado ou não. Mesma semente, mesmo banco.
+
+    python benchmarks/gerar_dados.py /tmp/reserveja.db --anos 3 --espacos 150
+"""
+import argparse
+import importlib
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+TAMANHOS = {
+    # setores, espaços, usuários, anos de histórico, reservas avulsas por espaço/dia útil
+    "pequeno": dict(setores=4, espacos=20, usuarios=60, anos=1, avulsas=2.0),
+    "medio": dict(setores=10, espacos=120, usuarios=600, anos=2, avulsas=3.0),
+    "grande": dict(setores=20, espacos=300, usuarios=3000, anos=4, avulsas=4.0),
+}
+
+DEPARTAMENTOS = ["Administração", "Biologia", "Computação", "Direito", "Economia",
+                 "Educação", "Engenharia", "Física", "Geografia", "História", "Letras",
+                 "Matemática", "Medicina", "Música", "Psicologia", "Química",
+                 "Artes", "Filosofia", "Estatística", "Pós-Graduação"]
+TIPOS_ESPACO = [("Sala", 0.55), ("Laboratório", 0.2), ("Auditório", 0.08),
+                ("Sala de Reunião", 0.12), ("Estúdio", 0.05)]
+EVENTOS = ["Reunião", "Aula", "Defesa de tese", "Defesa de dissertação", "Seminário",
+           "Workshop", "Palestra", "Treinamento", "Banca", "Oficina", "Entrevista",
+           "Conselho departamental", "Colegiado", "Prova", "Orientação", "Grupo de estudos"]
+TEMAS = ["química orgânica", "cálculo", "história do Brasil", "genética", "direito civil",
+         "macroeconomia", "anatomia", "algoritmos", "literatura", "ética", "circuitos",
+         "cartografia", "psicologia social", "harmonia", "didática", "estatística"]
+RECUSAS = ["Espaço em manutenção", "Conflito com evento institucional",
+           "Capacidade insuficiente", "Solicitação fora do prazo"]
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Felipe", "Gabriela", "Heitor",
+         "Isabela", "João", "Karina", "Lucas", "Marina", "Nicolas", "Olívia", "Paulo",
+         "Quésia", "Rafael", "Sofia", "Tiago", "Úrsula", "Vítor", "Yasmin", "Zeca"]
+SOBRENOMES = ["Silva", "Souza", "Oliveira", "Santos", "Pereira", "Costa", "Ferreira",
+              "Almeida", "Ribeiro", "Carvalho", "Gomes", "Martins", "Rocha", "Lima",
+              "Barbosa", "Araújo", "Mendes", "Cardoso"]
+
+FECHAMENTO = 22 * 60       # minutos do dia; nada termina depois das 22h
+# horários de início mais procurados (manhã e começo da tarde)
+PICOS = [(8 * 60, 3), (9 * 60, 4), (10 * 60, 4), (13 * 60, 2), (14 * 60, 4),
+         (15 * 60, 3), (16 * 60, 2), (18 * 60, 1), (19 * 60, 2)]
+
+
+def _escolher_peso(rnd, pares):
+    return rnd.choices([v for v, _ in pares], weights=[p for _, p in pares])[0]
+
+
+def _status(rnd, inicio, agora):
+    if inicio < agora:
+        return _escolher_peso(rnd, [("APROVADO", 78), ("RECUSADO", 11), ("CANCELADO", 9), ("PENDENTE", 2)])
+    return _escolher_peso(rnd, [("APROVADO", 55), ("PENDENTE", 37), ("CANCELADO", 5), ("RECUSADO", 3)])
+
+
+def texto(dt):
+    # mesmo formato que o SQLAlchemy grava (as consultas comparam como texto)
+    return dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _semestres(primeiro_dia, ultimo_dia):
+    # semestres letivos: março-junho e agosto-novembro
+    for ano in range(primeiro_dia.year, ultimo_dia.year + 1):
+        for ini, fim in ((date(ano, 3, 1), date(ano, 6, 30)), (date(ano, 8, 1), date(ano, 11, 30))):
+            ini, fim = max(ini, primeiro_dia), min(fim, ultimo_dia)
+            if ini <= fim:
+                yield ini, fim
+
+
+def gerar(caminho, setores, espacos, usuarios, anos, avulsas, meses_futuro=3, seed=42):
+    """Cria o banco em `caminho` (que não pode existir) e devolve as contagens."""
+    if os.path.exists(caminho):
+        raise FileExistsError(caminho)
+
+    # o app cria tabelas, índices, triggers da busca e o admin
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(caminho)}"
+    sys.path.insert(0, RAIZ)
+    importlib.import_module("app").inicializar_banco()
+    from werkzeug.security import generate_password_hash
+
+    rnd = random.Random(seed)
+    con = sqlite3.connect(caminho)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=OFF")
+
+    # ---- cadastros
+    nomes_setores = DEPARTAMENTOS[:setores] + [f"Setor {i}" for i in range(len(DEPARTAMENTOS), setores)]
+    con.executemany("INSERT INTO setores (nome) VALUES (?)", [(n,) for n in nomes_setores])
+    setor_ids = [r[0] for r in con.execute("SELECT id FROM setores ORDER BY id")][-setores:]
+
+    linhas_espacos = []
+    contador = {}
+    for i in range(espacos):
+        tipo = _escolher_peso(rnd, TIPOS_ESPACO)
+        contador[tipo] = contador.get(tipo, 0) + 1
+        status = "BLOQUEADO" if rnd.random() < 0.03 else "LIVRE"
+        linhas_espacos.append((f"{tipo} {contador[tipo]:03d}", setor_ids[i % setores], status))
+    con.executemany("INSERT INTO espacos (nome, setor_id, status) VALUES (?, ?, ?)", linhas_espacos)
+    espaco_ids = [r[0] for r in con.execute("SELECT id FROM espacos ORDER BY id")]
+
+    senha = generate_password_hash("senha123")
+    linhas_usuarios = []
+    for i in range(usuarios):
+        nome = f"{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)}"
+        papel = "ADMIN" if i < 2 else "AGENDADOR" if i < 2 + max(1, usuarios // 50) else "SOLICITANTE"
+        email = f"{nome.lower().replace(' ', '.')}.{i}@exemplo.edu.br"
+        linhas_usuarios.append((nome, email, senha, papel))
+    con.executemany("INSERT INTO usuarios (nome, email, senha_hash, papel) VALUES (?, ?, ?, ?)",
+                    linhas_usuarios)
+    usuario_ids = [r[0] for r in con.execute("SELECT id FROM usuarios WHERE email LIKE '%@exemplo.edu.br'")]
+    # poucos usuários fazem a maior parte das reservas
+    pesos_usuarios = [1.0 / (i + 1) ** 0.8 for i in range(len(usuario_ids))]
+
+    # ---- agendamentos
+    hoje = date.today()
+    agora = datetime.now()
+    primeiro_dia = hoje - timedelta(days=365 * anos)
+    ultimo_dia = hoje + timedelta(days=30 * meses_futuro)
+
+    def linha(espaco_id, inicio, fim, motivo, usuario_id):
+        status = _status(rnd, inicio, agora)
+        antecedencia = timedelta(hours=rnd.lognormvariate(4.0, 1.0))   # mediana ~2 dias
+        return (texto(inicio), texto(fim), status, motivo,
+                rnd.choice(RECUSAS) if status == "RECUSADO" else None,
+                texto(min(inicio - antecedencia, agora)), espaco_id, usuario_id)
+
+    comando = ("INSERT INTO agendamentos (inicio, fim, status, motivo, motivo_recusa, criado_em, "
+               "espaco_id, usuario_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+    total = 0
+    for espaco_id in espaco_ids:
+        lote = []
+
+        # aulas semanais recorrentes: ocupam o mesmo horário o semestre inteiro
+        fixos = {}     # dia da semana -> [(ini_min, fim_min, motivo, usuario)]
+        for _ in range(rnd.randint(0, 6)):
+            dia = rnd.randrange(5)
+            ini = _escolher_peso(rnd, PICOS)
+            fim = ini + rnd.choice((100, 100, 120, 180))
+            if fim > FECHAMENTO or any(not (fim <= a or ini >= b) for a, b, _, _ in fixos.get(dia, [])):
+                continue
+            usuario = rnd.choices(usuario_ids, weights=pesos_usuarios)[0]
+            fixos.setdefault(dia, []).append((ini, fim, f"Aula de {rnd.choice(TEMAS)}", usuario))
+
+        letivos = list(_semestres(primeiro_dia, ultimo_dia))
+        dia = primeiro_dia
+        while dia <= ultimo_dia:
+            base = datetime(dia.year, dia.month, dia.day)
+            ocupados = []
+            if dia.weekday() < 5 and any(a <= dia <= b for a, b in letivos):
+                for ini, fim, motivo, usuario in fixos.get(dia.weekday(), []):
+                    ocupados.append((ini, fim))
+                    lote.append(linha(espaco_id, base + timedelta(minutes=ini),
+                                      base + timedelta(minutes=fim), motivo, usuario))
+
+            media = avulsas if dia.weekday() < 5 else avulsas * 0.15
+            for _ in range(int(rnd.expovariate(1.0 / media)) if media else 0):
+                ini = _escolher_peso(rnd, PICOS) + rnd.choice((0, 0, 30))
+                fim = ini + rnd.choice((30, 60, 60, 60, 90, 120, 120, 180, 240))
+                if fim > FECHAMENTO or any(not (fim <= a or ini >= b) for a, b in ocupados):
+                    continue
+                ocupados.append((ini, fim))
+                motivo = f"{rnd.choice(EVENTOS)} de {rnd.choice(TEMAS)}"
+                usuario = rnd.choices(usuario_ids, weights=pesos_usuarios)[0]
+                lote.append(linha(espaco_id, base + timedelta(minutes=ini),
+                                  base + timedelta(minutes=fim), motivo, usuario))
+            dia += timedelta(days=1)
+
+        con.executemany(comando, lote)
+        total += len(lote)
+    con.commit()
+    con.close()
+
+    return {"setores": setores, "espacos": espacos, "usuarios": usuarios + 1, "agendamentos": total}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("caminho")
+    parser.add_argument("--tamanho", choices=TAMANHOS, default="medio",
+                        help="valores base; as opções abaixo sobrescrevem")
+    parser.add_argument("--setores", type=int)
+    parser.add_argument("--espacos", type=int)
+    parser.add_argument("--usuarios", type=int)
+    parser.add_argument("--anos", type=int)
+    parser.add_argument("--avulsas", type=float, help="média de reservas avulsas por espaço em dia útil")
+    parser.add_argument("--meses-futuro", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    parametros = dict(TAMANHOS[args.tamanho])
+    for nome in parametros:
+        if getattr(args, nome) is not None:
+            parametros[nome] = getattr(args, nome)
+
+    t0 = time.perf_counter()
+    contagens = gerar(args.caminho, meses_futuro=args.meses_futuro, seed=args.seed, **parametros)
+    print(f"{args.caminho}: {contagens} em {time.perf_counter() - t0:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
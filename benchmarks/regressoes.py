@@ -0,0 +1,232 @@
+"""Confere, num banco temporário, cenários que já quebraram em revisão.
+
+Cada caso monta o que precisa, roda e levanta AssertionError se o
+comportamento voltou. Sai com código 1 se algum caso falhar.
+
+    python benchmarks/regressoes.py
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import traceback
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+
+_tmp = tempfile.mkdtemp()
+BANCO = os.path.join(_tmp, "regressoes.db")
+os.environ["DATABASE_URL"] = "sqlite:///" + BANCO
+os.environ["TAREFAS_THREADS"] = "0"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app import app, preparar_processo  # noqa: E402
+from models import db, Usuario, Setor, Espaco, Agendamento, AgendamentoArquivo  # noqa: E402
+import arquivo  # noqa: E402
+import busca  # noqa: E402
+import feeds  # noqa: E402
+import services  # noqa: E402
+
+preparar_processo()
+
+CASOS = []
+
+
+def caso(funcao):
+    CASOS.append(funcao)
+    return funcao
+
+
+def preparar():
+    """Apaga os agendamentos e devolve (admin, espaco) de um cadastro mínimo."""
+    AgendamentoArquivo.query.delete()
+    Agendamento.query.delete()
+    db.session.commit()
+    services.indice.invalidar()
+    admin = Usuario.query.filter_by(email="admin@admin.com").first()
+    espaco = Espaco.query.first()
+    if espaco is None:
+        setor = Setor(nome="Setor de Regressão")
+        db.session.add(setor)
+        db.session.flush()
+        espaco = Espaco(nome="Sala 1", setor_id=setor.id)
+        db.session.add(espaco)
+        db.session.commit()
+    return admin, espaco
+
+
+# --------------------------
+# CASOS
+# --------------------------
+@caso
+def arquivar_criar_arquivar():
+    # o id de um agendamento arquivado não pode voltar para um agendamento novo
+    admin, espaco = preparar()
+    antigo = datetime.now() - timedelta(days=400)
+    ag = services.criar_agendamento(admin, espaco, antigo, antigo + timedelta(hours=1), "antigo")
+    primeiro_id = ag.id
+    assert arquivo.arquivar(dias=arquivo.DIAS_MINIMO) == 1
+
+    novo = services.criar_agendamento(admin, espaco, antigo + timedelta(days=1),
+                                      antigo + timedelta(days=1, hours=1), "novo")
+    assert novo.id != primeiro_id, "id arquivado reaproveitado"
+    assert arquivo.arquivar(dias=arquivo.DIAS_MINIMO) == 1
+
+    assert Agendamento.query.count() == 0
+    motivos = sorted(m for (m,) in db.session.query(AgendamentoArquivo.motivo))
+    assert motivos == ["antigo", "novo"], motivos
+
+
+def cliente_logado(usuario):
+    cliente = app.test_client()
+    with cliente.session_transaction() as s:
+        s["usuario_id"] = usuario.id
+    return cliente
+
+
+def banco_livre():
+    # outra conexão consegue o lock de escrita na hora?
+    conn = sqlite3.connect(BANCO, timeout=0)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.rollback()
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+@caso
+def serie_vazia_recusada():
+    # data final antes do início ou ocorrências <= 0: erro claro, sem abrir escrita
+    admin, espaco = preparar()
+    inicio = datetime(2031, 6, 2, 8)
+    entradas = [
+        ({"ate": datetime(2020, 1, 1)}, "anterior ao início"),
+        ({"ocorrencias": -3}, "pelo menos 1"),
+        ({"ocorrencias": 0}, "pelo menos 1"),
+    ]
+    for argumentos, mensagem in entradas:
+        try:
+            services.criar_agendamentos_recorrentes(admin, espaco, inicio, inicio + timedelta(hours=1),
+                                                    "série", "semanal", **argumentos)
+        except ValueError as e:
+            assert mensagem in str(e), (argumentos, str(e))
+        else:
+            raise AssertionError(f"série vazia aceita: {argumentos}")
+        assert banco_livre(), f"lock de escrita preso após {argumentos}"
+
+    cliente = cliente_logado(admin)
+    for campo, valor in (("repetir_ate", "2020-01-01"), ("ocorrencias", "-3")):
+        resp = cliente.post("/agendamentos/novo", data={
+            "espaco_id": espaco.id, "data": "2031-06-02", "inicio": "08:00", "fim": "09:00",
+            "motivo": "série", "repeticao": "semanal", campo: valor,
+        })
+        corpo = resp.get_data(as_text=True)
+        assert resp.status_code == 200 and "min() arg" not in corpo, (campo, resp.status_code)
+    assert Agendamento.query.count() == 0
+    assert services.ocupados_no_banco(espaco.id, []) == []
+
+
+@caso
+def aprovar_lote_sobrepostos():
+    # dois pendentes sobrepostos no mesmo lote: só o primeiro é aprovado
+    admin, espaco = preparar()
+    inicio = datetime(2031, 7, 1, 8)
+    a = services.criar_agendamento(admin, espaco, inicio, inicio + timedelta(hours=2), "a")
+    b_inicio = inicio + timedelta(hours=1)
+    b = Agendamento(usuario_id=admin.id, espaco_id=espaco.id, inicio=b_inicio,
+                    fim=b_inicio + timedelta(hours=2), motivo="b", status="PENDENTE")
+    # c: sobreposto a um aprovado que já existia
+    aprovado = Agendamento(usuario_id=admin.id, espaco_id=espaco.id, inicio=inicio + timedelta(days=1),
+                           fim=inicio + timedelta(days=1, hours=1), motivo="aprovado", status="APROVADO")
+    c = Agendamento(usuario_id=admin.id, espaco_id=espaco.id, inicio=inicio + timedelta(days=1),
+                    fim=inicio + timedelta(days=1, hours=1), motivo="c", status="PENDENTE")
+    db.session.add_all([b, aprovado, c])
+    db.session.commit()
+    ids = [a.id, b.id, c.id]
+
+    resp = cliente_logado(admin).post("/agendamentos/aceitar_lote", json={"ids": ids})
+    assert resp.status_code == 200, resp.status_code
+    assert resp.json["aprovados"] == [a.id], resp.json
+    assert sorted(resp.json["em_conflito"]) == sorted([b.id, c.id]), resp.json
+    status = dict(db.session.query(Agendamento.id, Agendamento.status).filter(Agendamento.id.in_(ids)))
+    assert status == {a.id: "APROVADO", b.id: "PENDENTE", c.id: "PENDENTE"}, status
+
+
+@caso
+def dtstamp_em_utc():
+    # criado_em é hora local: o DTSTAMP com "Z" precisa ser convertido para UTC
+    fuso_original = os.environ.get("TZ")
+    os.environ["TZ"] = "America/Sao_Paulo"
+    time.tzset()
+    try:
+        inicio = datetime(2031, 8, 1, 8)
+        linha = SimpleNamespace(id=1, inicio=inicio, fim=inicio + timedelta(hours=1), motivo="m",
+                                espaco="Sala", setor="Setor", usuario="Fulano",
+                                criado_em=datetime(2031, 7, 20, 21, 30))
+        assert "DTSTAMP:20310721T003000Z" in feeds.vevent(linha), feeds.vevent(linha)
+
+        # sem criado_em: momento da geração, nunca o início do evento
+        linha.criado_em = None
+        gerado_em = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        assert "DTSTAMP:20260102T030405Z" in feeds.vevent(linha, gerado_em)
+        antes = datetime.now(timezone.utc).replace(microsecond=0)
+        carimbo = feeds.vevent(linha).split("DTSTAMP:")[1][:15]
+        assert datetime.strptime(carimbo, "%Y%m%dT%H%M%S").replace(tzinfo=timezone.utc) >= antes, carimbo
+    finally:
+        if fuso_original is None:
+            os.environ.pop("TZ", None)
+        else:
+            os.environ["TZ"] = fuso_original
+        time.tzset()
+
+
+@caso
+def arquivado_continua_na_busca():
+    # arquivar não pode tirar o agendamento do índice de busca
+    admin, espaco = preparar()
+    antigo = datetime.now() - timedelta(days=400)
+    ag_id = services.criar_agendamento(admin, espaco, antigo, antigo + timedelta(hours=1), "palestra xilofone").id
+    assert arquivo.arquivar(dias=arquivo.DIAS_MINIMO) == 1
+    assert Agendamento.query.count() == 0
+
+    cliente = cliente_logado(admin)
+    fts = busca._disponivel["fts5"]
+    try:
+        for usar_fts in (fts, False):
+            busca._disponivel["fts5"] = usar_fts
+            resp = cliente.get("/api/busca?q=xilofone")
+            ids = [r["id"] for r in resp.json["resultados"]]
+            assert ids == [ag_id], (usar_fts, resp.json)
+    finally:
+        busca._disponivel["fts5"] = fts
+
+    # apagar do arquivo tira do índice
+    AgendamentoArquivo.query.delete()
+    db.session.commit()
+    assert busca.buscar("xilofone") == ([], False)
+
+
+# --------------------------
+# EXECUÇÃO
+# --------------------------
+def main():
+    falhas = 0
+    for funcao in CASOS:
+        with app.app_context():
+            try:
+                funcao()
+                marca = "ok"
+            except Exception:  # noqa: BLE001 - qualquer erro é falha do caso
+                falhas += 1
+                marca = "FALHOU\n" + traceback.format_exc()
+            finally:
+                db.session.rollback()
+        print(f"{funcao.__name__:32s} {marca}")
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Teste de estresse: criação concorrente disputando os mesmos horários.
+
+P processos com T threads cada pedem reservas em E espaços, sorteando
+entre H horários por espaço (com deslocamento de 0 ou 30 min, então os
+pedidos se sobrepõem parcialmente). No fim, uma junção da tabela consigo
+mesma conta os pares sobrepostos no mesmo espaço: tem que dar zero.
+
+--ingenuo repete a lógica antiga (verifica no índice, grava em outro
+passo, sem trava) para mostrar a corrida que a criação serializada fecha.
+
+    python benchmarks/stress_reservas.py --processos 4 --threads 8 --espacos 20
+    python benchmarks/stress_reservas.py --processos 4 --threads 8 --espacos 20 --ingenuo
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BASE = datetime(2031, 3, 3, 8)
+
+
+def criar_ingenuo(usuario, espaco, inicio, fim):
+    # criar_agendamento antes da serialização por espaço
+    from models import db, Agendamento
+    import services
+    ag = Agendamento(usuario_id=usuario.id, espaco_id=espaco.id, inicio=inicio, fim=fim,
+                     motivo="estresse", status="PENDENTE")
+    with db.session.no_autoflush:
+        if services.existe_conflito(ag):
+            raise ValueError(services.MSG_CONFLITO)
+    db.session.add(ag)
+    db.session.commit()
+    services.indice.registrar(ag)
+
+
+def filho(args):
+    sys.path.insert(0, RAIZ)
+    from app import app, preparar_processo
+    from models import db, Usuario, Espaco
+    import services
+
+    preparar_processo()
+    with app.app_context():
+        espaco_ids = [i for (i,) in db.session.query(Espaco.id).order_by(Espaco.id)]
+        admin_id = Usuario.query.filter_by(email="admin@admin.com").first().id
+
+    contagem = {"ok": 0, "conflito": 0, "erro": 0}
+    erros = {}
+    lock = threading.Lock()
+    barreira = threading.Barrier(args.threads)
+
+    def trabalhador(n):
+        rnd = random.Random(args.semente * 1000 + os.getpid() * 100 + n)
+        local = {"ok": 0, "conflito": 0, "erro": 0}
+        with app.app_context():
+            usuario = db.session.get(Usuario, admin_id)
+            espacos = {i: db.session.get(Espaco, i) for i in espaco_ids}
+            barreira.wait()
+            for _ in range(args.pedidos):
+                espaco = espacos[rnd.choice(espaco_ids)]
+                inicio = BASE + timedelta(hours=rnd.randrange(args.horarios), minutes=rnd.choice((0, 30)))
+                fim = inicio + timedelta(minutes=50)
+                try:
+                    if args.ingenuo:
+                        criar_ingenuo(usuario, espaco, inicio, fim)
+                    else:
+                        services.criar_agendamento(usuario, espaco, inicio, fim, "estresse")
+                    local["ok"] += 1
+                except ValueError:
+                    local["conflito"] += 1
+                except Exception as e:  # noqa: BLE001 - contamos qualquer outra falha
+                    db.session.rollback()
+                    local["erro"] += 1
+                    with lock:
+                        erros[type(e).__name__] = erros.get(type(e).__name__, 0) + 1
+        with lock:
+            for k, v in local.items():
+                contagem[k] += v
+
+    ths = [threading.Thread(target=trabalhador, args=(n,)) for n in range(args.threads)]
+    for t in ths:
+        t.start()
+    for t in ths:
+        t.join()
+    print(json.dumps({**contagem, "tipos_erro": erros}))
+
+
+def preparar_banco(caminho, espacos):
+    os.environ["DATABASE_URL"] = f"sqlite:///{caminho}"
+    os.environ["TAREFAS_THREADS"] = "0"
+    sys.path.insert(0, RAIZ)
+    import app as modulo
+    from models import db, Setor, Espaco
+
+    modulo.inicializar_banco()
+    with modulo.app.app_context():
+        setor = Setor(nome="Setor Estresse")
+        db.session.add(setor)
+        db.session.flush()
+        db.session.add_all([Espaco(nome=f"Sala {i}", setor_id=setor.id) for i in range(espacos)])
+        db.session.commit()
+
+
+def sobreposicoes(caminho):
+    import sqlite3
+    con = sqlite3.connect(caminho)
+    total, duplas = con.execute("""
+        SELECT (SELECT count(*) FROM agendamentos),
+               (SELECT count(*) FROM agendamentos a JOIN agendamentos b
+                  ON a.espaco_id = b.espaco_id AND a.id < b.id
+                 AND a.inicio < b.fim AND b.inicio < a.fim
+                 AND a.status != 'CANCELADO' AND b.status != 'CANCELADO')
+    """).fetchone()
+    con.close()
+    return total, duplas
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processos", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--espacos", type=int, default=20)
+    parser.add_argument("--horarios", type=int, default=10, help="horários disputados por espaço")
+    parser.add_argument("--pedidos", type=int, default=50, help="pedidos por thread")
+    parser.add_argument("--semente", type=int, default=1)
+    parser.add_argument("--ingenuo", action="store_true", help="verifica e grava sem serializar (lógica antiga)")
+    parser.add_argument("--filho", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        filho(args)
+        return
+
+    caminho = os.path.join(tempfile.mkdtemp(), "estresse.db")
+    preparar_banco(caminho, args.espacos)
+
+    comando = [sys.executable, os.path.abspath(__file__), "--filho",
+               "--threads", str(args.threads), "--pedidos", str(args.pedidos),
+               "--horarios", str(args.horarios), "--semente", str(args.semente)]
+    if args.ingenuo:
+        comando.append("--ingenuo")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{caminho}", TAREFAS_THREADS="0")
+
+    t0 = time.perf_counter()
+    procs = [subprocess.Popen(comando, env=env, stdout=subprocess.PIPE, text=True)
+             for _ in range(args.processos)]
+    saidas = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in procs]
+    duracao = time.perf_counter() - t0
+
+    soma = {k: sum(s[k] for s in saidas) for k in ("ok", "conflito", "erro")}
+    tipos = {}
+    for s in saidas:
+        for nome, n in s["tipos_erro"].items():
+            tipos[nome] = tipos.get(nome, 0) + n
+    total, duplas = sobreposicoes(caminho)
+    pedidos = args.processos * args.threads * args.pedidos
+
+    print(f"{'ingênuo' if args.ingenuo else 'serializado'}: {args.processos} processos x {args.threads} threads, "
+          f"{args.espacos} espaços x {args.horarios} horários")
+    print(f"  {pedidos} pedidos em {duracao:.1f} s ({pedidos / duracao:.0f} pedidos/s)")
+    print(f"  criados {soma['ok']} (no banco: {total}), conflitos {soma['conflito']}, erros {soma['erro']} {tipos or ''}")
+    print(f"  reservas sobrepostas no mesmo espaço: {duplas}")
+    sys.exit(1 if duplas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Suíte de benchmarks dos caminhos quentes, com saída em JSON para comparar execuções.
+
+Roda sobre uma cópia de um banco gerado por gerar_dados.py (o original não
+é alterado). Cada caso é chamado pelo test client do Flask ou direto na
+camada de serviços e registra vazão, latência (p50/p95/p99), consultas SQL
+por chamada e pico de memória (tracemalloc, numa passada separada para não
+distorcer os tempos).
+
+    python benchmarks/gerar_dados.py /tmp/medio.db --tamanho medio
+    python benchmarks/suite.py --banco /tmp/medio.db --saida antes.json
+    python benchmarks/suite.py --banco /tmp/medio.db --saida depois.json --comparar antes.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+# --------------------------
+# MEDIÇÃO
+# --------------------------
+def percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def medir(funcao, repeticoes, contador):
+    funcao()    # aquecimento (índice de conflitos, caches de template)
+
+    latencias = []
+    consultas = 0
+    t_total = time.perf_counter()
+    for _ in range(repeticoes):
+        antes = contador[0]
+        t0 = time.perf_counter()
+        funcao()
+        latencias.append((time.perf_counter() - t0) * 1e3)
+        consultas += contador[0] - antes
+    t_total = time.perf_counter() - t_total
+
+    tracemalloc.start()
+    for _ in range(min(3, repeticoes)):
+        funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencias.sort()
+    return {
+        "repeticoes": repeticoes,
+        "vazao_por_s": round(repeticoes / t_total, 1),
+        "media_ms": round(sum(latencias) / len(latencias), 3),
+        "p50_ms": round(percentil(latencias, 0.50), 3),
+        "p95_ms": round(percentil(latencias, 0.95), 3),
+        "p99_ms": round(percentil(latencias, 0.99), 3),
+        "max_ms": round(latencias[-1], 3),
+        "consultas_por_chamada": round(consultas / repeticoes, 2),
+        "pico_memoria_kb": round(pico / 1024, 1),
+    }
+
+
+# --------------------------
+# CASOS
+# --------------------------
+def montar_casos(app, db):
+    from sqlalchemy import func
+    from models import Usuario, Espaco, Agendamento
+    import services
+    from cache import cache_dashboard
+
+    rnd = random.Random(7)
+    with app.app_context():
+        admin_id = Usuario.query.filter_by(papel="ADMIN").order_by(Usuario.id).first().id
+        espaco_ids = [e.id for e in Espaco.query.filter(Espaco.status != "BLOQUEADO")]
+        ultimo = db.session.query(func.max(Agendamento.id)).scalar()
+
+    cliente = app.test_client()
+    with cliente.session_transaction() as s:
+        s["usuario_id"] = admin_id
+
+    hoje = date.today()
+    segunda = hoje - timedelta(days=hoje.weekday())
+    inicio_mes = hoje.replace(day=1)
+
+    def get(url):
+        def chamar():
+            resp = cliente.get(url)
+            assert resp.status_code in (200, 304), (url, resp.status_code)
+            resp.get_data()     # consome respostas em streaming (PDF)
+        return chamar
+
+    def api_dashboard_frio():
+        cache_dashboard.limpar()
+        get("/api/dashboard")()
+
+    def existe_conflito():
+        with app.app_context():
+            dia = datetime.combine(hoje + timedelta(days=rnd.randrange(-300, 60)), datetime.min.time())
+            inicio = dia + timedelta(hours=rnd.randrange(8, 20))
+            ag = Agendamento(espaco_id=rnd.choice(espaco_ids), inicio=inicio,
+                             fim=inicio + timedelta(hours=1))
+            services.existe_conflito(ag)
+
+    proximo_horario = [datetime.combine(hoje + timedelta(days=400), datetime.min.time())]
+
+    def criar_agendamento():
+        # horários sempre novos, bem depois dos dados gerados
+        with app.app_context():
+            usuario = db.session.get(Usuario, admin_id)
+            espaco = db.session.get(Espaco, rnd.choice(espaco_ids))
+            inicio = proximo_horario[0]
+            proximo_horario[0] += timedelta(hours=1)
+            services.criar_agendamento(usuario, espaco, inicio, inicio + timedelta(minutes=50), "benchmark")
+
+    def api_agendamento():
+        get(f"/api/agendamento/{rnd.randint(1, ultimo)}")()
+
+    semana = f"start={segunda.isoformat()}T00:00:00&end={(segunda + timedelta(days=7)).isoformat()}T00:00:00"
+    mes = f"start={inicio_mes.isoformat()}T00:00:00&end={(inicio_mes + timedelta(days=42)).isoformat()}T00:00:00"
+    dia = f"inicio={hoje.isoformat()}T08:00:00&fim={hoje.isoformat()}T18:00:00"
+    return {
+        # (função, peso das repetições: 1 = padrão)
+        "services.existe_conflito": (existe_conflito, 10),
+        "services.criar_agendamento": (criar_agendamento, 1),
+        "api_agendamentos_semana": (get(f"/api/agendamentos?{semana}"), 1),
+        "api_agendamentos_mes": (get(f"/api/agendamentos?{mes}"), 1),
+        "api_agendamento": (api_agendamento, 2),
+        "api_dashboard_cache": (get("/api/dashboard"), 5),
+        "api_dashboard_frio": (api_dashboard_frio, 1),
+        "api_disponibilidade": (get(f"/api/disponibilidade?{dia}&duracao_min=60"), 1),
+        "api_busca": (get("/api/busca?q=defesa+tese"), 1),
+        "api_changes_sem_mudancas": (get("/api/changes?since=0"), 5),
+        "agendamentos_pendentes": (get("/agendamentos/pendentes"), 1),
+        "exportar_pdf_dia": (get(f"/exportar_pdf?periodo=dia&data={hoje.isoformat()}"), 0.2),
+        "exportar_pdf_semana": (get(f"/exportar_pdf?periodo=semana&data={hoje.isoformat()}"), 0.1),
+        "api_analise_ano": (get(f"/api/analise?inicio={(hoje - timedelta(days=365)).isoformat()}"
+                                f"&fim={hoje.isoformat()}"), 0.1),
+    }
+
+
+# --------------------------
+# EXECUÇÃO
+# --------------------------
+def commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(atual, anterior):
+    print(f"\n{'caso':30s} {'p50 antes':>10s} {'p50 agora':>10s} {'Δ%':>7s} {'p95 Δ%':>7s} {'SQL Δ':>6s}")
+    for nome, r in atual["casos"].items():
+        a = anterior["casos"].get(nome)
+        if not a:
+            continue
+
+        def delta(campo):
+            return (r[campo] - a[campo]) / a[campo] * 100 if a[campo] else 0.0
+        print(f"{nome:30s} {a['p50_ms']:10.2f} {r['p50_ms']:10.2f} {delta('p50_ms'):+7.1f} "
+              f"{delta('p95_ms'):+7.1f} {r['consultas_por_chamada'] - a['consultas_por_chamada']:+6.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--banco", required=True, help="banco de gerar_dados.py (será copiado)")
+    parser.add_argument("--repeticoes", type=int, default=50)
+    parser.add_argument("--casos", help="nomes separados por vírgula (padrão: todos)")
+    parser.add_argument("--saida", help="arquivo JSON com os resultados")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    args = parser.parse_args()
+
+    copia = os.path.join(tempfile.mkdtemp(), "suite.db")
+    shutil.copy(args.banco, copia)
+    os.environ["DATABASE_URL"] = f"sqlite:///{copia}"
+    sys.path.insert(0, RAIZ)
+
+    from sqlalchemy import event
+    from app import app, preparar_processo
+    from models import db
+
+    preparar_processo()
+
+    contador = [0]
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        contador[0] += 1
+
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", contar)
+        total = db.session.execute(db.text("SELECT count(*) FROM agendamentos")).scalar()
+
+    casos = montar_casos(app, db)
+    escolhidos = args.casos.split(",") if args.casos else list(casos)
+
+    resultado = {
+        "meta": {
+            "quando": datetime.now().isoformat(timespec="seconds"),
+            "commit": commit_atual(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "plataforma": platform.platform(),
+            "banco": os.path.abspath(args.banco),
+            "agendamentos": total,
+            "repeticoes": args.repeticoes,
+        },
+        "casos": {},
+    }
+
+    print(f"{total} agendamentos; {args.repeticoes} repetições por caso\n")
+    print(f"{'caso':30s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'req/s':>8s} {'SQL':>5s} {'mem KB':>8s}")
+    for nome in escolhidos:
+        funcao, peso = casos[nome]
+        r = medir(funcao, max(3, int(args.repeticoes * peso)), contador)
+        resultado["casos"][nome] = r
+        print(f"{nome:30s} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} {r['p99_ms']:8.2f} "
+              f"{r['vazao_por_s']:8.1f} {r['consultas_por_chamada']:5.1f} {r['pico_memoria_kb']:8.1f}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"\nresultados em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(resultado, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
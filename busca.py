@@ -0,0 +1,312 @@
+"""Busca textual nos agendamentos com SQLite FTS5.
+
+A tabela virtual `agendamentos_busca` guarda, com rowid = id do
+agendamento, o texto de motivo, motivo_recusa e os nomes do usuário,
+espaço e setor. Triggers no banco a mantêm em dia em qualquer caminho de
+escrita (services, importação, edições de cadastro).
+
+Agendamentos arquivados continuam no índice: o arquivamento copia a linha
+para `agendamentos_arquivo` antes de apagá-la da tabela quente, e o
+trigger de DELETE não remove do índice um id que já está no arquivo (os
+ids nunca se repetem entre as duas tabelas).
+
+Fora do SQLite, ou sem FTS5 compilado, a busca cai para LIKE.
+"""
+import re
+
+from sqlalchemy import or_, text
+
+from models import db, Agendamento, Espaco, Setor, Usuario
+import arquivo
+import serializacao
+
+
+TABELA = "agendamentos_busca"
+LIMITE_PADRAO = 20
+LIMITE_MAXIMO = 100
+# pesos do bm25 por coluna: motivo, motivo_recusa, usuario, espaco, setor
+PESOS = (10.0, 2.0, 4.0, 4.0, 2.0)
+# o bm25 ordena só os N casamentos mais recentes; termos muito comuns
+# casam dezenas de milhares de linhas e ranquear todas custa centenas de ms.
+# Os casamentos mais antigos vêm depois deles, do mais recente ao mais antigo.
+MAX_CANDIDATOS = 200
+
+_disponivel = {"fts5": False}
+
+
+# --------------------------
+# ESQUEMA
+# --------------------------
+_TEXTO_NOVO = """
+    new.motivo, new.motivo_recusa,
+    (SELECT nome FROM usuarios WHERE id = new.usuario_id),
+    (SELECT nome FROM espacos WHERE id = new.espaco_id),
+    (SELECT s.nome FROM setores s JOIN espacos e ON e.setor_id = s.id WHERE e.id = new.espaco_id)
+"""
+
+TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA}_ai AFTER INSERT ON agendamentos BEGIN
+        INSERT INTO {TABELA} (rowid, motivo, motivo_recusa, usuario, espaco, setor)
+        VALUES (new.id, {_TEXTO_NOVO});
+    END
+    """,
+    # arquivar copia para o arquivo antes de apagar: a linha fica no índice
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA}_ad AFTER DELETE ON agendamentos
+    WHEN NOT EXISTS (SELECT 1 FROM agendamentos_arquivo WHERE id = old.id) BEGIN
+        DELETE FROM {TABELA} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA}_arquivo_ad AFTER DELETE ON agendamentos_arquivo BEGIN
+        DELETE FROM {TABELA} WHERE rowid = old.id;
+    END
+    """,
+    # mudança de status não toca no índice
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA}_au
+    AFTER UPDATE OF motivo, motivo_recusa, usuario_id, espaco_id ON agendamentos BEGIN
+        DELETE FROM {TABELA} WHERE rowid = old.id;
+        INSERT INTO {TABELA} (rowid, motivo, motivo_recusa, usuario, espaco, setor)
+        VALUES (new.id, {_TEXTO_NOVO});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA}_usuario AFTER UPDATE OF nome ON usuarios BEGIN
+        UPDATE {TABELA} SET usuario = new.nome
+        WHERE rowid IN (
+            SELECT id FROM agendamentos WHERE usuario_id = new.id
+            UNION ALL SELECT id FROM agendamentos_arquivo WHERE usuario_id = new.id
+        );
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA}_espaco AFTER UPDATE OF nome, setor_id ON espacos BEGIN
+        UPDATE {TABELA}
+        SET espaco = new.nome,
+            setor = (SELECT nome FROM setores WHERE id = new.setor_id)
+        WHERE rowid IN (
+            SELECT id FROM agendamentos WHERE espaco_id = new.id
+            UNION ALL SELECT id FROM agendamentos_arquivo WHERE espaco_id = new.id
+        );
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA}_setor AFTER UPDATE OF nome ON setores BEGIN
+        UPDATE {TABELA} SET setor = new.nome
+        WHERE rowid IN (
+            SELECT a.id FROM agendamentos a JOIN espacos e ON e.id = a.espaco_id
+            WHERE e.setor_id = new.id
+            UNION ALL
+            SELECT a.id FROM agendamentos_arquivo a JOIN espacos e ON e.id = a.espaco_id
+            WHERE e.setor_id = new.id
+        );
+    END
+    """,
+]
+
+
+def criar_indice_busca(db):
+    """Cria a tabela FTS5 e os triggers; na primeira vez, indexa o que já existe.
+
+    Os triggers são sempre refeitos (CREATE IF NOT EXISTS não troca um
+    trigger de versão anterior) e arquivados que faltam no índice entram.
+    """
+    _disponivel["fts5"] = False
+    if db.engine.dialect.name != "sqlite":
+        return
+
+    with db.engine.begin() as conn:
+        existe = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"),
+            {"n": TABELA},
+        ).first()
+        try:
+            conn.execute(text(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA} USING fts5(
+                    motivo, motivo_recusa, usuario, espaco, setor,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '2 3'
+                )
+            """))
+        except Exception:  # noqa: BLE001 - SQLite sem FTS5: fica no LIKE
+            return
+        for nome in _nomes_triggers():
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {nome}"))
+        for trigger in TRIGGERS:
+            conn.execute(text(trigger))
+        if not existe:
+            _preencher(conn)
+        else:
+            # versões anteriores tiravam do índice o que era arquivado
+            _preencher(conn, "agendamentos_arquivo",
+                       f"WHERE NOT EXISTS (SELECT 1 FROM {TABELA} WHERE rowid = a.id)")
+
+    _disponivel["fts5"] = True
+
+
+def detectar(db):
+    """Liga a busca FTS5 se a tabela já existe (processos que não criaram o índice)."""
+    _disponivel["fts5"] = False
+    if db.engine.dialect.name != "sqlite":
+        return
+    with db.engine.connect() as conn:
+        _disponivel["fts5"] = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"),
+            {"n": TABELA},
+        ).first() is not None
+
+
+def _nomes_triggers():
+    return [re.search(r"EXISTS (\w+)", t).group(1) for t in TRIGGERS]
+
+
+def _preencher(conn, tabela=None, condicao=""):
+    """Indexa as linhas da tabela quente e do arquivo (ou só de `tabela`)."""
+    for nome in [tabela] if tabela else ["agendamentos", "agendamentos_arquivo"]:
+        conn.execute(text(f"""
+            INSERT INTO {TABELA} (rowid, motivo, motivo_recusa, usuario, espaco, setor)
+            SELECT a.id, a.motivo, a.motivo_recusa, u.nome, e.nome, s.nome
+            FROM {nome} a
+            LEFT JOIN usuarios u ON u.id = a.usuario_id
+            LEFT JOIN espacos e ON e.id = a.espaco_id
+            LEFT JOIN setores s ON s.id = e.setor_id
+            {condicao}
+        """))
+
+
+def reconstruir(db):
+    """Apaga e refaz o conteúdo do índice (após restaurar um backup, por exemplo)."""
+    if not _disponivel["fts5"]:
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {TABELA}"))
+        _preencher(conn)
+        conn.execute(text(f"INSERT INTO {TABELA} ({TABELA}) VALUES ('optimize')"))
+
+
+# --------------------------
+# CONSULTA
+# --------------------------
+def termos(consulta):
+    return re.findall(r"\w+", consulta or "")
+
+
+def expressao_fts(consulta):
+    """'defesa tes' -> '"defesa" "tes"*': todos os termos, o último por prefixo.
+
+    Só o último termo é prefixo (quem digita ainda não terminou a palavra);
+    prefixos longos em todos os termos deixam a interseção bem mais lenta.
+    """
+    lista = termos(consulta)
+    if not lista:
+        return ""
+    return " ".join([f'"{t}"' for t in lista[:-1]] + [f'"{lista[-1]}"*'])
+
+
+def buscar(consulta, pagina=1, limite=LIMITE_PADRAO):
+    """Agendamentos que casam com todos os termos, do mais relevante ao menos.
+
+    A relevância ordena os MAX_CANDIDATOS casamentos mais recentes; o resto
+    segue por data de criação. A ordem é a mesma em todas as páginas.
+    Devolve (resultados, tem_mais); cada resultado é o detalhe do
+    agendamento com um "trecho" destacando o que casou.
+    """
+    limite = max(1, min(int(limite), LIMITE_MAXIMO))
+    deslocamento = (max(1, int(pagina)) - 1) * limite
+    if not termos(consulta):
+        return [], False
+
+    if _disponivel["fts5"]:
+        encontrados = _buscar_fts(expressao_fts(consulta), limite + 1, deslocamento)
+    else:
+        encontrados = _buscar_like(consulta, limite + 1, deslocamento)
+
+    tem_mais = len(encontrados) > limite
+    encontrados = encontrados[:limite]
+
+    linhas = {l.id: l for l in serializacao.linhas_por_ids([i for i, _ in encontrados])}
+    resultados = []
+    for ag_id, trecho in encontrados:
+        linha = linhas.get(ag_id)
+        if linha is None:
+            continue
+        item = serializacao.detalhe_agendamento(linha)
+        item["trecho"] = trecho
+        resultados.append(item)
+    return resultados, tem_mais
+
+
+def _buscar_fts(expr, limite, deslocamento):
+    # 1) janela fixa de candidatos: os mais recentes, lidos do índice em ordem
+    #    de rowid (para cedo, sem visitar todos os casamentos). Não depende da
+    #    página: uma janela que crescesse com o deslocamento mudaria o ranking
+    #    e as páginas repetiriam ou pulariam linhas.
+    menor = db.session.execute(
+        text(f"""
+            SELECT min(rowid) FROM (
+                SELECT rowid FROM {TABELA} WHERE {TABELA} MATCH :expr
+                ORDER BY rowid DESC LIMIT :janela
+            )
+        """),
+        {"expr": expr, "janela": MAX_CANDIDATOS},
+    ).scalar()
+    if menor is None:
+        return []
+
+    # 2) bm25 só dentro da janela (com menos casamentos que ela, o ranking é exato)
+    encontrados = []
+    if deslocamento < MAX_CANDIDATOS:
+        pesos = ", ".join(str(p) for p in PESOS)
+        encontrados = db.session.execute(
+            text(f"""
+                SELECT rowid, snippet({TABELA}, -1, '[', ']', '…', 12)
+                FROM {TABELA}
+                WHERE {TABELA} MATCH :expr AND rowid >= :menor
+                ORDER BY bm25({TABELA}, {pesos}), rowid DESC
+                LIMIT :limite OFFSET :deslocamento
+            """),
+            {"expr": expr, "menor": menor, "limite": limite, "deslocamento": deslocamento},
+        ).all()
+
+    # 3) depois da janela, os casamentos mais antigos em ordem de rowid
+    falta = limite - len(encontrados)
+    if falta > 0:
+        encontrados += db.session.execute(
+            text(f"""
+                SELECT rowid, snippet({TABELA}, -1, '[', ']', '…', 12)
+                FROM {TABELA}
+                WHERE {TABELA} MATCH :expr AND rowid < :menor
+                ORDER BY rowid DESC
+                LIMIT :limite OFFSET :deslocamento
+            """),
+            {"expr": expr, "menor": menor, "limite": falta,
+             "deslocamento": max(0, deslocamento - MAX_CANDIDATOS)},
+        ).all()
+    return encontrados
+
+
+def _buscar_like(consulta, limite, deslocamento):
+    def montar(modelo):
+        q = (
+            db.session.query(modelo.id.label("id"), modelo.motivo.label("motivo"))
+            .select_from(modelo)
+            .join(modelo.espaco)
+            .join(Espaco.setor)
+            .join(modelo.usuario)
+        )
+        for termo in termos(consulta):
+            padrao = f"%{termo}%"
+            q = q.filter(or_(
+                modelo.motivo.ilike(padrao),
+                modelo.motivo_recusa.ilike(padrao),
+                Usuario.nome.ilike(padrao),
+                Espaco.nome.ilike(padrao),
+                Setor.nome.ilike(padrao),
+            ))
+        return q
+
+    # arquivados também aparecem (mesmos ids, mesmas colunas)
+    q = arquivo.incluir_arquivo(montar, None)
+    return q.order_by(Agendamento.id.desc()).limit(limite).offset(deslocamento).all()
@@ -0,0 +1,85 @@
+import threading
+from collections import OrderedDict
+
+from flask import g, has_app_context
+from sqlalchemy.dialects.sqlite import insert
+
+from models import db, VersaoDados
+
+
+# --------------------------
+# VERSÃO DE ESCRITA
+# --------------------------
+class Versao:
+    """Versão de um conjunto de dados; invalida caches que a usam na chave.
+
+    Junta o contador deste processo, incrementado depois do commit, com a
+    linha `chave` de versoes_dados, que `registrar()` incrementa dentro da
+    transação da escrita: escritas de outros processos também mudam
+    atual(). A tabela é lida uma vez por contexto de app (requisição).
+    """
+
+    def __init__(self, chave):
+        self.chave = chave
+        self._valor = 0
+        self._lock = threading.Lock()
+
+    def atual(self):
+        return (self._valor, self.compartilhada())
+
+    def incrementar(self):
+        with self._lock:
+            self._valor += 1
+            return self._valor
+
+    def registrar(self):
+        """Incrementa a versão no banco, na transação atual; o chamador faz o commit."""
+        comando = insert(VersaoDados).values(chave=self.chave, versao=1)
+        db.session.execute(comando.on_conflict_do_update(
+            index_elements=["chave"], set_={"versao": VersaoDados.versao + 1},
+        ))
+        if has_app_context():
+            g.pop("versoes_dados", None)
+
+    def compartilhada(self):
+        """Valor em versoes_dados (0 se nunca escrita; None fora de um contexto de app)."""
+        if not has_app_context():
+            return None
+        versoes = g.get("versoes_dados")
+        if versoes is None:
+            versoes = g.versoes_dados = dict(db.session.query(VersaoDados.chave, VersaoDados.versao))
+        return versoes.get(self.chave, 0)
+
+
+# --------------------------
+# CACHE LRU
+# --------------------------
+class CacheLRU:
+    def __init__(self, capacidade=256):
+        self.capacidade = capacidade
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            if chave not in self._itens:
+                return None
+            self._itens.move_to_end(chave)
+            return self._itens[chave]
+
+    def put(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+versao_agendamentos = Versao("agendamentos")
+versao_referencias = Versao("referencias")
+versao_arquivo = Versao("arquivo")
+cache_dashboard = CacheLRU(capacidade=256)
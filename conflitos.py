@@ -0,0 +1,211 @@
+import threading
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from sqlalchemy import func
+
+from models import db, Agendamento, AlteracaoAgendamento
+from cache import versao_agendamentos
+import arquivo
+
+
+# --------------------------
+# AGENDA DE UM ESPAÇO
+# --------------------------
+class AgendaEspaco:
+    """Períodos ocupados de um espaço, ordenados por início.
+
+    A busca de sobreposição usa bisect sobre os inícios, limitada pela maior
+    duração já vista: só podem conflitar com [inicio, fim) os períodos que
+    começam em [inicio - duracao_max, fim). Custo O(log n + k).
+    """
+
+    def __init__(self, linhas=()):
+        self.inicios = []      # [(inicio, id)] ordenado
+        self.periodos = {}     # id -> (inicio, fim)
+        self.duracao_max = timedelta(0)
+
+        for ag_id, inicio, fim in sorted(linhas, key=lambda l: (l[1], l[0])):
+            self.inicios.append((inicio, ag_id))
+            self.periodos[ag_id] = (inicio, fim)
+            self.duracao_max = max(self.duracao_max, fim - inicio)
+
+    def __len__(self):
+        return len(self.periodos)
+
+    def adicionar(self, ag_id, inicio, fim):
+        if ag_id in self.periodos:
+            self.remover(ag_id)
+        insort(self.inicios, (inicio, ag_id))
+        self.periodos[ag_id] = (inicio, fim)
+        self.duracao_max = max(self.duracao_max, fim - inicio)
+
+    def remover(self, ag_id):
+        periodo = self.periodos.pop(ag_id, None)
+        if periodo is None:
+            return
+        pos = bisect_left(self.inicios, (periodo[0], ag_id))
+        if pos < len(self.inicios) and self.inicios[pos][1] == ag_id:
+            del self.inicios[pos]
+
+    def sobrepostos(self, inicio, fim, ignorar_id=None):
+        # ids que se sobrepõem a [inicio, fim), em ordem de início
+        pos = bisect_left(self.inicios, (inicio - self.duracao_max,))
+        resultado = []
+        while pos < len(self.inicios):
+            ini, ag_id = self.inicios[pos]
+            if ini >= fim:
+                break
+            if ag_id != ignorar_id and self.periodos[ag_id][1] > inicio:
+                resultado.append(ag_id)
+            pos += 1
+        return resultado
+
+
+# --------------------------
+# ÍNDICE DE CONFLITOS (por espaço)
+# --------------------------
+# acima disso, alterações de outros processos não são reaplicadas uma a
+# uma: o índice é esvaziado e os espaços recarregam sob demanda
+LIMITE_SINCRONIA = 500
+
+
+class IndiceConflitos:
+    """Cache em memória das agendas por espaço.
+
+    Cada espaço é carregado do banco na primeira consulta e, a partir daí,
+    mantido incrementalmente pelas funções de escrita de services.py.
+    Escritas de outros processos chegam pelo log de alterações: quando a
+    versão compartilhada dos agendamentos muda, os ids gravados depois do
+    último cursor visto são relidos do banco. Agendamentos CANCELADOS não
+    ocupam o espaço.
+    """
+
+    def __init__(self):
+        self._agendas = {}
+        self._lock = threading.RLock()
+        self._versao = None    # versão compartilhada já aplicada
+        self._cursor = None    # último id do log de alterações já aplicado
+
+    def _sincronizar(self):
+        versao = versao_agendamentos.compartilhada()
+        if versao is None or versao == self._versao:
+            return
+        novas = self._alteracoes_desde(self._cursor)
+        if novas is None:
+            # primeira vez, log podado além do cursor, banco trocado ou atraso grande
+            self._agendas.clear()
+            self._cursor = db.session.query(func.max(AlteracaoAgendamento.id)).scalar() or 0
+        else:
+            for agenda in self._agendas.values():
+                for _, ag_id, *_ in novas:
+                    agenda.remover(ag_id)
+            for log_id, ag_id, espaco_id, inicio, fim, status in novas:
+                agenda = self._agendas.get(espaco_id)
+                if agenda is not None and status != "CANCELADO":
+                    agenda.adicionar(ag_id, inicio, fim)
+                self._cursor = log_id
+        self._versao = versao
+
+    def _alteracoes_desde(self, cursor):
+        # o log a partir do cursor (inclusive) com o estado atual de cada id, numa
+        # consulta; None quando não dá para reaplicar uma a uma
+        if cursor is None:
+            return None
+        linhas = (
+            db.session.query(AlteracaoAgendamento.id, AlteracaoAgendamento.agendamento_id,
+                             Agendamento.espaco_id, Agendamento.inicio, Agendamento.fim, Agendamento.status)
+            .outerjoin(Agendamento, Agendamento.id == AlteracaoAgendamento.agendamento_id)
+            .filter(AlteracaoAgendamento.id >= cursor)
+            .order_by(AlteracaoAgendamento.id)
+            .limit(LIMITE_SINCRONIA + 2)
+            .all()
+        )
+        # a linha do cursor some quando a poda passa dele
+        if cursor and (not linhas or linhas[0][0] != cursor):
+            return None
+        novas = [l for l in linhas if l[0] > cursor]
+        return None if len(novas) > LIMITE_SINCRONIA else novas
+
+    def _agenda(self, espaco_id):
+        agenda = self._agendas.get(espaco_id)
+        if agenda is None:
+            linhas = (
+                Agendamento.query
+                .with_entities(Agendamento.id, Agendamento.inicio, Agendamento.fim)
+                .filter(Agendamento.espaco_id == espaco_id)
+                .filter(Agendamento.status != "CANCELADO")
+                .all()
+            )
+            agenda = AgendaEspaco(linhas)
+            self._agendas[espaco_id] = agenda
+        return agenda
+
+    def conflitos(self, espaco_id, inicio, fim, ignorar_id=None):
+        espaco_id = int(espaco_id)
+        with self._lock:
+            self._sincronizar()
+            ids = self._agenda(espaco_id).sobrepostos(inicio, fim, ignorar_id)
+        return self._com_arquivo([ids], espaco_id, [(inicio, fim)], ignorar_id)[0]
+
+    def conflitos_lote(self, espaco_id, periodos):
+        # uma lista de ids conflitantes para cada (inicio, fim), sob um único lock
+        espaco_id = int(espaco_id)
+        with self._lock:
+            self._sincronizar()
+            agenda = self._agenda(espaco_id)
+            resultado = [agenda.sobrepostos(inicio, fim) for inicio, fim in periodos]
+        return self._com_arquivo(resultado, espaco_id, periodos)
+
+    def _com_arquivo(self, resultado, espaco_id, periodos, ignorar_id=None):
+        # o índice só carrega a tabela quente; períodos antigos olham o
+        # arquivo, com uma consulta só para todos eles
+        antigos = [n for n, (inicio, _) in enumerate(periodos) if arquivo.alcanca(inicio)]
+        if not antigos:
+            return resultado
+        agenda = AgendaEspaco(arquivo.ocupados(
+            espaco_id, min(periodos[n][0] for n in antigos), max(periodos[n][1] for n in antigos),
+        ))
+        for n in antigos:
+            vistos = set(resultado[n])
+            resultado[n] = resultado[n] + [
+                i for i in agenda.sobrepostos(*periodos[n], ignorar_id) if i not in vistos
+            ]
+        return resultado
+
+    def registrar_lote(self, espaco_id, linhas):
+        # linhas: [(id, inicio, fim)] recém-inseridas (não canceladas)
+        with self._lock:
+            agenda = self._agendas.get(int(espaco_id))
+            if agenda is None:
+                return
+            for ag_id, inicio, fim in linhas:
+                agenda.adicionar(ag_id, inicio, fim)
+
+    def registrar(self, ag):
+        # chamado após o commit; ag já tem id, espaço e status definitivos
+        espaco_id = int(ag.espaco_id)
+        with self._lock:
+            agenda = self._agendas.get(espaco_id)
+            if agenda is None:
+                return  # será carregado do banco na primeira consulta
+            if ag.status == "CANCELADO":
+                agenda.remover(ag.id)
+            else:
+                agenda.adicionar(ag.id, ag.inicio, ag.fim)
+
+    def remover(self, ag_id, espaco_id):
+        with self._lock:
+            agenda = self._agendas.get(int(espaco_id))
+            if agenda is not None:
+                agenda.remover(ag_id)
+
+    def invalidar(self, espaco_id=None):
+        with self._lock:
+            if espaco_id is None:
+                self._agendas.clear()
+            else:
+                self._agendas.pop(int(espaco_id), None)
+
+
+indice = IndiceConflitos()
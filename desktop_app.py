@@ -1,68 +1,267 @@
+"""Painel de agenda do dia para telas na porta das salas (Tkinter).
+
+Lê o mesmo banco do sistema, só para leitura, numa thread de fundo com
+uma conexão reaproveitada; a interface nunca espera pelo banco. A agenda
+de hoje de todos os espaços fica em memória e a cada INTERVALO segundos
+o `PRAGMA data_version` diz se alguém gravou no banco: sem escrita, não
+há consulta; com escrita, só os espaços que mudaram são redesenhados.
+
+    python desktop_app.py                          # escolhe o espaço na tela
+    python desktop_app.py --espaco 3 --kiosk       # tela cheia, fixo no espaço 3
+    python desktop_app.py --banco /srv/reserveja/instance/sala_agenda.db
+"""
+import argparse
+import os
+import queue
+import sqlite3
+import threading
 import tkinter as tk
+from datetime import date, datetime, timedelta
 from tkinter import ttk
-import sqlite3
-from datetime import datetime
 
-DB = "sala_agenda.db"
 
-def carregar_ambientes():
-    conn = sqlite3.connect(DB)
-    cur = conn.cursor()
-    cur.execute("SELECT id, nome FROM ambientes")
-    dados = cur.fetchall()
-    conn.close()
-    return dados
+BANCO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "sala_agenda.db")
+INTERVALO = 15             # s entre verificações de escrita no banco
+INTERVALO_TELA = 200       # ms entre leituras da fila de resultados pela interface
+STATUS_VISIVEIS = ("APROVADO", "PENDENTE")
+
+
+def caminho_banco(argumento=None):
+    if argumento:
+        return argumento
+    url = os.environ.get("DATABASE_URL", "")
+    if url.startswith("sqlite:///"):
+        caminho = url[len("sqlite:///"):]
+        # relativo, como o Flask-SQLAlchemy: dentro de instance/
+        return caminho if os.path.isabs(caminho) else os.path.join(os.path.dirname(BANCO_PADRAO), caminho)
+    return BANCO_PADRAO
+
+
+def _texto(dt):
+    # mesmo formato que o SQLAlchemy grava (as comparações são de texto)
+    return dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+# --------------------------
+# LEITURA (thread de fundo)
+# --------------------------
+class Leitor(threading.Thread):
+    """Mantém a agenda de hoje em cache e manda à interface só o que mudou.
+
+    Mensagens na fila `saida`: ("espacos", [(id, nome, setor)]),
+    ("agenda", espaco_id, [linhas]) e ("erro", texto).
+    """
+
+    def __init__(self, caminho, saida):
+        super().__init__(name="leitor-agenda", daemon=True)
+        self.caminho = caminho
+        self.saida = saida
+        self.acordar = threading.Event()
+        self.parar = threading.Event()
+        self.conn = None
+        self.versao = None
+        self.dia = None
+        self.agenda = {}       # espaco_id -> tupla de linhas de hoje
+
+    def conectar(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(f"file:{self.caminho}?mode=ro", uri=True)
+            self.conn.execute("PRAGMA query_only = 1")
+        return self.conn
+
+    def run(self):
+        while not self.parar.is_set():
+            try:
+                self.atualizar()
+            except sqlite3.Error as e:
+                # banco ausente ou ocupado: tenta de novo com uma conexão nova
+                if self.conn is not None:
+                    self.conn.close()
+                self.conn = None
+                self.versao = None
+                self.saida.put(("erro", str(e)))
+            self.acordar.wait(INTERVALO)
+            self.acordar.clear()
+
+    def atualizar(self):
+        conn = self.conectar()
+        versao = conn.execute("PRAGMA data_version").fetchone()[0]
+        hoje = date.today()
+        if versao == self.versao and hoje == self.dia:
+            return
+        primeira = self.versao is None or hoje != self.dia
+        self.versao, self.dia = versao, hoje
+
+        espacos = conn.execute("""
+            SELECT e.id, e.nome, s.nome
+            FROM espacos e LEFT JOIN setores s ON s.id = e.setor_id
+            ORDER BY s.nome, e.nome
+        """).fetchall()
+        self.saida.put(("espacos", espacos))
+
+        inicio = datetime.combine(hoje, datetime.min.time())
+        linhas = conn.execute(f"""
+            SELECT a.espaco_id, a.id, a.inicio, a.fim, a.status, a.motivo, u.nome
+            FROM agendamentos a
+            LEFT JOIN usuarios u ON u.id = a.usuario_id
+            WHERE a.inicio < ? AND a.fim > ?
+              AND a.status IN ({", ".join("?" for _ in STATUS_VISIVEIS)})
+            ORDER BY a.espaco_id, a.inicio
+        """, (_texto(inicio + timedelta(days=1)), _texto(inicio), *STATUS_VISIVEIS)).fetchall()
+
+        nova = {e[0]: [] for e in espacos}
+        for espaco_id, ag_id, ini, fim, status, motivo, usuario in linhas:
+            nova.setdefault(espaco_id, []).append((
+                ag_id, datetime.fromisoformat(ini), datetime.fromisoformat(fim),
+                status, motivo or "", usuario or "",
+            ))
+
+        for espaco_id, agenda in nova.items():
+            agenda = tuple(agenda)
+            if primeira or self.agenda.get(espaco_id) != agenda:
+                self.saida.put(("agenda", espaco_id, agenda))
+        self.agenda = {e: tuple(a) for e, a in nova.items()}
+
+
+# --------------------------
+# INTERFACE
+# --------------------------
+class Painel:
+    def __init__(self, root, leitor, espaco_id=None, kiosk=False):
+        self.root = root
+        self.leitor = leitor
+        self.espaco_id = espaco_id
+        self.kiosk = kiosk
+        self.espacos = {}
+        self.agenda = {}
+
+        root.title("ReserveJá – Agenda do Espaço")
+        tamanho = 28 if kiosk else 12
+        if kiosk:
+            root.attributes("-fullscreen", True)
+            root.bind("<Escape>", lambda _: root.attributes("-fullscreen", False))
+
+        quadro = ttk.Frame(root, padding=10)
+        quadro.pack(fill=tk.BOTH, expand=True)
+
+        topo = ttk.Frame(quadro)
+        topo.pack(fill=tk.X)
+        self.var_espaco = tk.StringVar()
+        self.combo = ttk.Combobox(topo, textvariable=self.var_espaco, state="readonly", width=40)
+        self.combo.bind("<<ComboboxSelected>>", self.escolher)
+        if not kiosk:
+            ttk.Label(topo, text="Espaço:").pack(side=tk.LEFT)
+            self.combo.pack(side=tk.LEFT, padx=5)
+        self.relogio = ttk.Label(topo, font=("Helvetica", tamanho))
+        self.relogio.pack(side=tk.RIGHT)
 
-def buscar_agenda():
-    amb_id = var_ambiente.get()
-    if not amb_id:
-        return
+        self.titulo = ttk.Label(quadro, font=("Helvetica", tamanho + 8, "bold"))
+        self.titulo.pack(anchor=tk.W, pady=(10, 0))
+        self.agora = ttk.Label(quadro, font=("Helvetica", tamanho + 4))
+        self.agora.pack(anchor=tk.W, pady=(0, 10))
 
-    conn = sqlite3.connect(DB)
-    cur = conn.cursor()
+        self.lista = tk.Text(quadro, font=("Helvetica", tamanho), height=15, width=60,
+                             state=tk.DISABLED, relief=tk.FLAT)
+        self.lista.pack(fill=tk.BOTH, expand=True)
+        self.rodape = ttk.Label(quadro, foreground="gray")
+        self.rodape.pack(anchor=tk.W)
 
-    hoje = datetime.now().strftime("%Y-%m-%d")
-    inicio = f"{hoje} 00:00:00"
-    fim = f"{hoje} 23:59:59"
+        self.ler_fila()
+        self.tique()
 
-    cur.execute("""
-        SELECT a.inicio, a.fim, u.nome
-        FROM agendamentos a
-        JOIN usuarios u ON u.id = a.usuario_id
-        WHERE a.ambiente_id = ?
-        AND a.inicio BETWEEN ? AND ?
-        ORDER BY a.inicio
-    """, (amb_id, inicio, fim))
+    def escolher(self, _evento=None):
+        rotulo = self.var_espaco.get()
+        for espaco_id, (nome, setor) in self.espacos.items():
+            if f"{nome} – {setor}" == rotulo:
+                self.espaco_id = espaco_id
+        self.desenhar()
 
-    linhas = cur.fetchall()
-    conn.close()
+    def ler_fila(self):
+        # resultados do leitor; nunca bloqueia
+        mudou = False
+        try:
+            while True:
+                msg = self.leitor.saida.get_nowait()
+                if msg[0] == "espacos":
+                    self.espacos = {i: (nome, setor or "") for i, nome, setor in msg[1]}
+                    self.combo["values"] = [f"{n} – {s}" for n, s in self.espacos.values()]
+                    if self.espaco_id is None and self.espacos:
+                        self.espaco_id = next(iter(self.espacos))
+                    if self.espaco_id in self.espacos:
+                        self.var_espaco.set("{} – {}".format(*self.espacos[self.espaco_id]))
+                    mudou = True
+                elif msg[0] == "agenda":
+                    self.agenda[msg[1]] = msg[2]
+                    mudou = mudou or msg[1] == self.espaco_id
+                    self.rodape.config(text=f"Atualizado às {datetime.now():%H:%M:%S}")
+                elif msg[0] == "erro":
+                    self.rodape.config(text=f"Sem acesso ao banco: {msg[1]}")
+        except queue.Empty:
+            pass
+        if mudou:
+            self.desenhar()
+        self.root.after(INTERVALO_TELA, self.ler_fila)
 
-    texto.delete("1.0", tk.END)
-    if not linhas:
-        texto.insert(tk.END, "Nenhum agendamento hoje.\n")
-        return
+    def tique(self):
+        # relógio e "agora/próximo" andam sozinhos, sem consultar o banco
+        self.relogio.config(text=datetime.now().strftime("%d/%m/%Y %H:%M"))
+        self.desenhar_situacao()
+        self.root.after(1000 * (60 - datetime.now().second), self.tique)
 
-    for ini, fim, nome in linhas:
-        texto.insert(tk.END, f"{ini} - {fim} | {nome}\n")
+    def desenhar_situacao(self):
+        if self.espaco_id is None:
+            return
+        agora = datetime.now()
+        atual = proximo = None
+        for linha in self.agenda.get(self.espaco_id, ()):
+            if linha[3] != "APROVADO":
+                continue
+            if linha[1] <= agora < linha[2]:
+                atual = linha
+            elif linha[1] > agora and proximo is None:
+                proximo = linha
+        if atual:
+            texto = f"🔴 Ocupado até {atual[2]:%H:%M} – {atual[4] or 'Reservado'}"
+        elif proximo:
+            texto = f"🟢 Livre até {proximo[1]:%H:%M}"
+        else:
+            texto = "🟢 Livre pelo resto do dia"
+        self.agora.config(text=texto)
 
-root = tk.Tk()
-root.title("Agenda de Ambientes (Desktop)")
+    def desenhar(self):
+        if self.espaco_id not in self.espacos:
+            return
+        nome, setor = self.espacos[self.espaco_id]
+        self.titulo.config(text=f"{nome} ({setor})" if setor else nome)
 
-frame = ttk.Frame(root, padding=10)
-frame.pack()
+        self.lista.config(state=tk.NORMAL)
+        self.lista.delete("1.0", tk.END)
+        agenda = self.agenda.get(self.espaco_id, ())
+        if not agenda:
+            self.lista.insert(tk.END, "Nenhum agendamento hoje.\n")
+        for _, ini, fim, status, motivo, usuario in agenda:
+            pendente = " (aguardando aprovação)" if status == "PENDENTE" else ""
+            self.lista.insert(tk.END, f"{ini:%H:%M}–{fim:%H:%M}  {motivo or 'Reservado'} | {usuario}{pendente}\n")
+        self.lista.config(state=tk.DISABLED)
+        self.desenhar_situacao()
 
-ttk.Label(frame, text="Ambiente:").pack()
 
-var_ambiente = tk.StringVar()
-cb = ttk.Combobox(frame, textvariable=var_ambiente)
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--banco", help="arquivo SQLite (padrão: DATABASE_URL ou instance/sala_agenda.db)")
+    parser.add_argument("--espaco", type=int, help="id do espaço exibido")
+    parser.add_argument("--kiosk", action="store_true", help="tela cheia, fonte grande, sem seletor")
+    args = parser.parse_args()
 
-ambs = carregar_ambientes()
-cb["values"] = [str(a[0]) + " - " + a[1] for a in ambs]
-cb.pack()
+    leitor = Leitor(caminho_banco(args.banco), queue.Queue())
+    leitor.start()
 
-ttk.Button(frame, text="Ver Agenda de Hoje", command=buscar_agenda).pack(pady=10)
+    root = tk.Tk()
+    Painel(root, leitor, espaco_id=args.espaco, kiosk=args.kiosk)
+    root.mainloop()
+    leitor.parar.set()
+    leitor.acordar.set()
 
-texto = tk.Text(root, width=60, height=15)
-texto.pack()
 
-root.mainloop()
+if __name__ == "__main__":
+    main()
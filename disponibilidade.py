@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from sqlalchemy import and_
+
+from models import db, Agendamento, Espaco, Setor
+
+
+def lacunas_livres(ocupados, inicio, fim, duracao_min):
+    """Varredura sobre intervalos ordenados por início.
+
+    Junta os intervalos sobrepostos e devolve os buracos dentro de
+    [inicio, fim) com pelo menos `duracao_min`.
+    """
+    lacunas = []
+    cursor = inicio
+    for ini, f in ocupados:
+        if ini > cursor and ini - cursor >= duracao_min:
+            lacunas.append((cursor, min(ini, fim)))
+        if f > cursor:
+            cursor = f
+        if cursor >= fim:
+            break
+    if fim > cursor and fim - cursor >= duracao_min:
+        lacunas.append((cursor, fim))
+    return lacunas
+
+
+def consultar_disponibilidade(inicio, fim, duracao_min=timedelta(0), setor_id=None):
+    """Espaços não bloqueados com horários livres em [inicio, fim).
+
+    Uma única consulta traz os espaços e os agendamentos que tocam a janela
+    (LEFT JOIN), já ordenados por espaço e início; a varredura é feita em
+    Python por espaço.
+    """
+    q = (
+        db.session.query(
+            Espaco.id, Espaco.nome, Espaco.setor_id, Setor.nome,
+            Agendamento.inicio, Agendamento.fim,
+        )
+        .select_from(Espaco)
+        .join(Espaco.setor)
+        .outerjoin(Agendamento, and_(
+            Agendamento.espaco_id == Espaco.id,
+            Agendamento.status != "CANCELADO",
+            Agendamento.inicio < fim,
+            Agendamento.fim > inicio,
+        ))
+        .filter(Espaco.status != "BLOQUEADO")
+        .order_by(Espaco.id, Agendamento.inicio)
+    )
+    if setor_id:
+        q = q.filter(Espaco.setor_id == setor_id)
+
+    espacos = []
+    atual = None
+    ocupados = []
+
+    def fechar():
+        lacunas = lacunas_livres(ocupados, inicio, fim, duracao_min)
+        if lacunas:
+            atual["livre"] = lacunas == [(inicio, fim)]
+            atual["lacunas"] = [
+                {"inicio": a.isoformat(), "fim": b.isoformat()} for a, b in lacunas
+            ]
+            espacos.append(atual)
+
+    for espaco_id, nome, s_id, setor, ini, f in q:
+        if atual is None or atual["id"] != espaco_id:
+            if atual is not None:
+                fechar()
+            atual = {"id": espaco_id, "nome": nome, "setor_id": s_id, "setor": setor}
+            ocupados = []
+        if ini is not None:
+            ocupados.append((ini, f))
+
+    if atual is not None:
+        fechar()
+
+    return espacos
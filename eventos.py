@@ -0,0 +1,80 @@
+import json
+import queue
+import threading
+
+
+def formatar_sse(evento, dados):
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+
+# --------------------------
+# BROKER EM PROCESSO (Server-Sent Events)
+# --------------------------
+class Broker:
+    """Distribui mensagens SSE para as filas dos clientes conectados.
+
+    Cada assinante tem uma fila limitada; se ela encher (cliente lento),
+    a fila é esvaziada e recebe None, e o stream é encerrado para que o
+    EventSource do navegador reconecte.
+
+    Cada stream prende uma thread do servidor enquanto dura: com
+    `max_assinantes`, assinar() recusa (devolve None) além do limite.
+    encerrar() manda None a todos e recusa novas assinaturas, para que o
+    processo possa sair com streams abertos.
+    """
+
+    def __init__(self, tamanho_fila=100, max_assinantes=None):
+        self.tamanho_fila = tamanho_fila
+        self.max_assinantes = max_assinantes
+        self._assinantes = set()
+        self._encerrado = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._assinantes)
+
+    def assinar(self):
+        fila = queue.Queue(maxsize=self.tamanho_fila)
+        with self._lock:
+            if self._encerrado:
+                return None
+            if self.max_assinantes is not None and len(self._assinantes) >= self.max_assinantes:
+                return None
+            self._assinantes.add(fila)
+        return fila
+
+    def cancelar(self, fila):
+        with self._lock:
+            self._assinantes.discard(fila)
+
+    def publicar(self, evento, dados):
+        mensagem = formatar_sse(evento, dados)
+        with self._lock:
+            assinantes = list(self._assinantes)
+
+        for fila in assinantes:
+            try:
+                fila.put_nowait(mensagem)
+            except queue.Full:
+                self.cancelar(fila)
+                self._desconectar(fila)
+
+    def encerrar(self):
+        with self._lock:
+            self._encerrado = True
+            assinantes = list(self._assinantes)
+            self._assinantes.clear()
+        for fila in assinantes:
+            self._desconectar(fila)
+
+    @staticmethod
+    def _desconectar(fila):
+        while True:
+            try:
+                fila.get_nowait()
+            except queue.Empty:
+                break
+        fila.put_nowait(None)
+
+
+broker = Broker()
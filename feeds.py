@@ -0,0 +1,204 @@
+"""Feeds iCalendar (ICS) de agendamentos aprovados por espaço, setor e usuário.
+
+Cada escrita incrementa, na mesma transação, a versão dos espaços e
+usuários afetados (tabela versoes_feed). O ETag e o Last-Modified de um
+feed vêm só dessas versões, então um cliente que consulta a cada poucos
+minutos recebe 304 sem que a tabela de agendamentos seja lida.
+
+O corpo é montado por espaço e guardado em cache pela versão: o feed de
+um setor só regera os espaços que mudaram.
+"""
+import hashlib
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy.dialects.sqlite import insert
+
+from models import db, Agendamento, Espaco, Setor, Usuario, VersaoFeed
+from cache import CacheLRU
+
+
+DIAS_PASSADOS = 30
+DIAS_FUTUROS = 180
+PRODID = "-//ReserveJá//Agenda de Espaços//PT"
+
+cache_feeds = CacheLRU(capacidade=2048)
+
+
+# --------------------------
+# VERSÕES
+# --------------------------
+def registrar_alteracao(espaco_ids=(), usuario_ids=()):
+    """Incrementa as versões na sessão atual; o chamador faz o commit."""
+    chaves = {f"espaco:{int(i)}" for i in espaco_ids if i} | {f"usuario:{int(i)}" for i in usuario_ids if i}
+    if not chaves:
+        return
+    agora = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    comando = insert(VersaoFeed).values(
+        [{"chave": c, "versao": 1, "alterado_em": agora} for c in sorted(chaves)]
+    )
+    db.session.execute(comando.on_conflict_do_update(
+        index_elements=["chave"],
+        set_={"versao": VersaoFeed.versao + 1, "alterado_em": comando.excluded.alterado_em},
+    ))
+
+
+def versoes(chaves):
+    """{chave: (versao, alterado_em_utc)}; chaves nunca alteradas ficam (0, None)."""
+    encontradas = {
+        chave: (versao, alterado_em)
+        for chave, versao, alterado_em in db.session.query(
+            VersaoFeed.chave, VersaoFeed.versao, VersaoFeed.alterado_em
+        ).filter(VersaoFeed.chave.in_(chaves))
+    }
+    return {c: encontradas.get(c, (0, None)) for c in chaves}
+
+
+def janela(hoje=None):
+    hoje = hoje or date.today()
+    inicio = datetime.combine(hoje - timedelta(days=DIAS_PASSADOS), datetime.min.time())
+    return inicio, inicio + timedelta(days=DIAS_PASSADOS + DIAS_FUTUROS)
+
+
+def validadores(tipo, ident, vers, hoje=None):
+    """(etag, last_modified) do feed a partir das versões das chaves envolvidas."""
+    hoje = hoje or date.today()
+    base = repr((tipo, ident, hoje.isoformat(), sorted((c, v) for c, (v, _) in vers.items())))
+    etag = hashlib.sha1(base.encode()).hexdigest()
+    instantes = [m for _, m in vers.values() if m]
+    ultimo = max(instantes).replace(tzinfo=timezone.utc) if instantes else None
+    # a janela desliza à meia-noite: o feed muda mesmo sem escrita
+    meia_noite = datetime.combine(hoje, datetime.min.time()).astimezone(timezone.utc)
+    return etag, max(filter(None, [ultimo, meia_noite]))
+
+
+# --------------------------
+# FORMATO ICS (RFC 5545)
+# --------------------------
+def escapar(texto):
+    return (texto or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def dobrar(linha):
+    # linhas de no máximo 75 octetos; continuação começa com espaço
+    dados = linha.encode("utf-8")
+    if len(dados) <= 75:
+        return linha
+    partes = []
+    atual = b""
+    for ch in linha:
+        b = ch.encode("utf-8")
+        if len(atual) + len(b) > (75 if not partes else 74):
+            partes.append(atual.decode("utf-8"))
+            atual = b""
+        atual += b
+    partes.append(atual.decode("utf-8"))
+    return "\r\n ".join(partes)
+
+
+def _data(dt):
+    return dt.strftime("%Y%m%dT%H%M%S")
+
+
+def vevent(l, gerado_em=None):
+    # DTSTAMP é UTC: criado_em é hora local sem fuso; sem ele, vale a geração do feed
+    if l.criado_em:
+        carimbo = l.criado_em.astimezone(timezone.utc)
+    else:
+        carimbo = gerado_em or datetime.now(timezone.utc)
+    linhas = [
+        "BEGIN:VEVENT",
+        f"UID:agendamento-{l.id}@reserveja",
+        f"DTSTAMP:{_data(carimbo)}Z",
+        f"DTSTART:{_data(l.inicio)}",
+        f"DTEND:{_data(l.fim)}",
+        f"SUMMARY:{escapar(l.motivo or 'Reservado')}",
+        f"LOCATION:{escapar(f'{l.espaco} - {l.setor}')}",
+        f"DESCRIPTION:{escapar(f'Solicitante: {l.usuario}')}",
+        "END:VEVENT",
+    ]
+    return "\r\n".join(dobrar(x) for x in linhas) + "\r\n"
+
+
+def documento(nome, blocos):
+    cabecalho = "\r\n".join(dobrar(x) for x in [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{escapar(nome)}",
+        "X-PUBLISHED-TTL:PT15M",
+    ]) + "\r\n"
+    return cabecalho + "".join(blocos) + "END:VCALENDAR\r\n"
+
+
+# --------------------------
+# GERAÇÃO (com cache por versão)
+# --------------------------
+def _aprovados():
+    inicio, fim = janela()
+    return (
+        db.session.query(
+            Agendamento.id, Agendamento.inicio, Agendamento.fim, Agendamento.motivo,
+            Agendamento.criado_em, Agendamento.espaco_id,
+            Espaco.nome.label("espaco"), Setor.nome.label("setor"), Usuario.nome.label("usuario"),
+        )
+        .select_from(Agendamento)
+        .join(Agendamento.espaco)
+        .join(Espaco.setor)
+        .join(Agendamento.usuario)
+        .filter(
+            Agendamento.status == "APROVADO",
+            Agendamento.inicio < fim,
+            Agendamento.fim > inicio,
+        )
+    )
+
+
+def blocos_espacos(vers_espacos):
+    """Texto dos VEVENTs de cada espaço; só consulta os que não estão em cache."""
+    hoje = date.today().isoformat()
+    blocos = {}
+    faltando = []
+    for chave, (versao, _) in vers_espacos.items():
+        espaco_id = int(chave.split(":")[1])
+        bloco = cache_feeds.get(("espaco", espaco_id, versao, hoje))
+        if bloco is None:
+            faltando.append(espaco_id)
+        else:
+            blocos[espaco_id] = bloco
+
+    if faltando:
+        novos = {e: [] for e in faltando}
+        linhas = (
+            _aprovados()
+            .filter(Agendamento.espaco_id.in_(faltando))
+            .order_by(Agendamento.espaco_id, Agendamento.inicio)
+        )
+        gerado_em = datetime.now(timezone.utc)
+        for l in linhas:
+            novos[l.espaco_id].append(vevent(l, gerado_em))
+        for espaco_id, eventos in novos.items():
+            bloco = "".join(eventos)
+            versao = vers_espacos[f"espaco:{espaco_id}"][0]
+            cache_feeds.put(("espaco", espaco_id, versao, hoje), bloco)
+            blocos[espaco_id] = bloco
+
+    return [blocos[e] for e in sorted(blocos)]
+
+
+def bloco_usuario(usuario_id, versao):
+    hoje = date.today().isoformat()
+    chave = ("usuario", usuario_id, versao, hoje)
+    bloco = cache_feeds.get(chave)
+    if bloco is None:
+        linhas = _aprovados().filter(Agendamento.usuario_id == usuario_id).order_by(Agendamento.inicio)
+        gerado_em = datetime.now(timezone.utc)
+        bloco = "".join(vevent(l, gerado_em) for l in linhas)
+        cache_feeds.put(chave, bloco)
+    return bloco
+
+
+def chaves_setor(setor_id):
+    return [f"espaco:{i}" for (i,) in db.session.query(Espaco.id).filter(Espaco.setor_id == setor_id)]
+
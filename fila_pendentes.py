@@ -0,0 +1,129 @@
+"""Fila de solicitações pendentes: filtros no servidor e paginação por cursor.
+
+A página é ordenada por (inicio, id) e o cursor é o par da última (ou
+primeira) linha exibida, então cada página custa uma busca no índice
+ix_agendamentos_status_inicio, não um OFFSET que relê as anteriores.
+"""
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from models import db, Agendamento, Espaco
+from conflitos import indice
+import serializacao
+
+
+TAMANHO_PAGINA = 50
+
+
+# --------------------------
+# CURSOR
+# --------------------------
+def codificar_cursor(inicio, ag_id):
+    return f"{inicio.isoformat()}_{ag_id}"
+
+
+def decodificar_cursor(texto):
+    """'2025-03-10T08:00:00_123' -> (datetime, 123); None se inválido."""
+    if not texto:
+        return None
+    try:
+        inicio, ag_id = texto.rsplit("_", 1)
+        return datetime.fromisoformat(inicio), int(ag_id)
+    except ValueError:
+        return None
+
+
+# --------------------------
+# CONSULTA
+# --------------------------
+def filtrar(q, setor_id=None, espaco_id=None, usuario_id=None,
+            data_inicio=None, data_fim=None, busca=None):
+    if setor_id:
+        q = q.filter(Espaco.setor_id == setor_id)
+    if espaco_id:
+        q = q.filter(Agendamento.espaco_id == espaco_id)
+    if usuario_id:
+        q = q.filter(Agendamento.usuario_id == usuario_id)
+    if data_inicio:
+        q = q.filter(Agendamento.fim > data_inicio)
+    if data_fim:
+        q = q.filter(Agendamento.inicio < data_fim)
+    if busca:
+        # LIKE do SQLite já ignora maiúsculas/minúsculas em ASCII
+        termo = busca.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        q = q.filter(Agendamento.motivo.like(f"%{termo}%", escape="\\"))
+    return q
+
+
+def pagina(apos=None, antes=None, limite=TAMANHO_PAGINA, **filtros):
+    """Uma página da fila e os cursores de navegação.
+
+    `apos` avança a partir de um cursor; `antes` volta (lê em ordem
+    inversa e desvira). Devolve (linhas, cursor_anterior, cursor_proximo).
+    """
+    q = filtrar(
+        serializacao.consulta_agendamentos().filter(Agendamento.status == "PENDENTE"),
+        **filtros,
+    )
+    chave = tuple_(Agendamento.inicio, Agendamento.id)
+
+    voltando = antes is not None
+    if voltando:
+        q = q.filter(chave < antes).order_by(Agendamento.inicio.desc(), Agendamento.id.desc())
+    else:
+        if apos is not None:
+            q = q.filter(chave > apos)
+        q = q.order_by(Agendamento.inicio, Agendamento.id)
+
+    # uma linha a mais só para saber se existe página seguinte
+    linhas = q.limit(limite + 1).all()
+    tem_mais = len(linhas) > limite
+    linhas = linhas[:limite]
+    if voltando:
+        linhas.reverse()
+
+    if not linhas:
+        return [], None, None
+
+    primeiro = codificar_cursor(linhas[0].inicio, linhas[0].id)
+    ultimo = codificar_cursor(linhas[-1].inicio, linhas[-1].id)
+    if voltando:
+        return linhas, primeiro if tem_mais else None, ultimo
+    return linhas, primeiro if apos is not None else None, ultimo if tem_mais else None
+
+
+def marcar_conflitos(linhas):
+    """Conflitos de todas as linhas da página de uma vez.
+
+    Os sobrepostos saem do índice em memória (uma chamada em lote por
+    espaço) e o status de todos eles vem numa única consulta; devolve
+    {id: {"aprovados": n, "pendentes": n}} só para quem tem conflito.
+    """
+    por_espaco = {}
+    for l in linhas:
+        por_espaco.setdefault(l.espaco_id, []).append(l)
+
+    sobrepostos = {}
+    for espaco_id, grupo in por_espaco.items():
+        resultados = indice.conflitos_lote(espaco_id, [(l.inicio, l.fim) for l in grupo])
+        for l, ids in zip(grupo, resultados):
+            ids = [i for i in ids if i != l.id]
+            if ids:
+                sobrepostos[l.id] = ids
+
+    todos = {i for ids in sobrepostos.values() for i in ids}
+    if not todos:
+        return {}
+    status = dict(
+        db.session.query(Agendamento.id, Agendamento.status)
+        .filter(Agendamento.id.in_(todos))
+    )
+
+    marcas = {}
+    for ag_id, ids in sobrepostos.items():
+        aprovados = sum(1 for i in ids if status.get(i) == "APROVADO")
+        pendentes = sum(1 for i in ids if status.get(i) == "PENDENTE")
+        if aprovados or pendentes:
+            marcas[ag_id] = {"aprovados": aprovados, "pendentes": pendentes}
+    return marcas
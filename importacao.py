@@ -0,0 +1,333 @@
+"""Importação em massa de setores, espaços, usuários e agendamentos via CSV.
+
+O arquivo é lido em streaming e processado em lotes: cada lote é validado,
+inserido com um único executemany e comitado. Linhas inválidas não
+interrompem a importação; entram no relatório com o número da linha.
+
+Aceita CSV separado por vírgula ou ponto e vírgula (padrão do Excel em
+pt-BR), com ou sem BOM.
+"""
+import csv
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from models import db, Setor, Espaco, Usuario, Agendamento
+from conflitos import indice
+from cache import versao_agendamentos, versao_referencias
+from banco import iniciar_escrita, repetir_se_ocupado
+from services import travas_espacos, ocupados_no_banco
+import feeds
+import alteracoes
+
+
+TAMANHO_LOTE = 5000
+MAX_ERROS_RELATADOS = 1000
+
+STATUS_VALIDOS = {"PENDENTE", "APROVADO", "RECUSADO", "CANCELADO"}
+PAPEIS_VALIDOS = {"ADMIN", "AGENDADOR", "SOLICITANTE"}
+FORMATOS_DATA = ("%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S")
+
+
+class LinhaInvalida(ValueError):
+    pass
+
+
+# --------------------------
+# RELATÓRIO
+# --------------------------
+class RelatorioImportacao:
+    def __init__(self, tipo):
+        self.tipo = tipo
+        self.importadas = 0
+        self.total_erros = 0
+        self.erros = []
+
+    def erro(self, linha, mensagem):
+        self.total_erros += 1
+        if len(self.erros) < MAX_ERROS_RELATADOS:
+            self.erros.append({"linha": linha, "erro": mensagem})
+
+    def como_dict(self):
+        return {
+            "tipo": self.tipo,
+            "importadas": self.importadas,
+            "total_erros": self.total_erros,
+            "erros": self.erros,
+        }
+
+
+# --------------------------
+# LEITURA
+# --------------------------
+def ler_csv(arquivo):
+    """Gera (numero_da_linha, dict) a partir de um arquivo texto.
+
+    Cabeçalhos são normalizados para minúsculas sem espaços nas pontas.
+    """
+    primeira = arquivo.readline().lstrip("\ufeff")
+    delimitador = ";" if primeira.count(";") > primeira.count(",") else ","
+    cabecalho = [c.strip().lower() for c in next(csv.reader([primeira], delimiter=delimitador))]
+
+    leitor = csv.reader(arquivo, delimiter=delimitador)
+    for numero, valores in enumerate(leitor, start=2):
+        if not any(v.strip() for v in valores):
+            continue
+        yield numero, {c: v.strip() for c, v in zip(cabecalho, valores)}
+
+
+def em_lotes(iteravel, tamanho=TAMANHO_LOTE):
+    iterador = iter(iteravel)
+    while True:
+        lote = list(islice(iterador, tamanho))
+        if not lote:
+            return
+        yield lote
+
+
+def campo(dados, nome, obrigatorio=True):
+    valor = dados.get(nome, "")
+    if obrigatorio and not valor:
+        raise LinhaInvalida(f"campo '{nome}' vazio")
+    return valor
+
+
+def parse_data(valor):
+    # ISO (AAAA-MM-DD HH:MM) é o caso comum e fromisoformat é bem mais rápido que strptime
+    try:
+        return datetime.fromisoformat(valor)
+    except ValueError:
+        pass
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(valor, formato)
+        except ValueError:
+            continue
+    raise LinhaInvalida(f"data inválida: {valor}")
+
+
+def inserir(modelo, mapeamentos, retornar_ids=False):
+    # insert no nível da tabela (Core): evita o custo do bulk insert do ORM
+    comando = insert(modelo.__table__)
+    if retornar_ids:
+        comando = comando.returning(modelo.__table__.c.id, sort_by_parameter_order=True)
+        return list(db.session.execute(comando, mapeamentos).scalars())
+    db.session.execute(comando, mapeamentos)
+    return []
+
+
+# --------------------------
+# IMPORTADORES
+# --------------------------
+def importar_setores(linhas, relatorio):
+    existentes = {nome.lower() for (nome,) in db.session.query(Setor.nome)}
+
+    for lote in em_lotes(linhas):
+        novos = []
+        for numero, dados in lote:
+            try:
+                nome = campo(dados, "nome")
+                if nome.lower() in existentes:
+                    raise LinhaInvalida(f"setor '{nome}' já cadastrado")
+            except LinhaInvalida as e:
+                relatorio.erro(numero, str(e))
+                continue
+            existentes.add(nome.lower())
+            novos.append({"nome": nome})
+
+        if novos:
+            inserir(Setor, novos)
+            versao_referencias.registrar()
+            db.session.commit()
+            versao_referencias.incrementar()
+            relatorio.importadas += len(novos)
+
+
+def importar_espacos(linhas, relatorio):
+    setores = {nome.lower(): id for id, nome in db.session.query(Setor.id, Setor.nome)}
+    existentes = {
+        (setor_id, nome.lower())
+        for setor_id, nome in db.session.query(Espaco.setor_id, Espaco.nome)
+    }
+
+    for lote in em_lotes(linhas):
+        novos = []
+        for numero, dados in lote:
+            try:
+                nome = campo(dados, "nome")
+                setor = campo(dados, "setor")
+                setor_id = setores.get(setor.lower())
+                if setor_id is None:
+                    raise LinhaInvalida(f"setor '{setor}' não encontrado")
+                status = (dados.get("status") or "LIVRE").upper()
+                if status not in ("LIVRE", "BLOQUEADO"):
+                    raise LinhaInvalida(f"status inválido: {status}")
+                if (setor_id, nome.lower()) in existentes:
+                    raise LinhaInvalida(f"espaço '{nome}' já cadastrado em '{setor}'")
+            except LinhaInvalida as e:
+                relatorio.erro(numero, str(e))
+                continue
+            existentes.add((setor_id, nome.lower()))
+            novos.append({"nome": nome, "setor_id": setor_id, "status": status})
+
+        if novos:
+            inserir(Espaco, novos)
+            versao_referencias.registrar()
+            db.session.commit()
+            versao_referencias.incrementar()
+            relatorio.importadas += len(novos)
+
+
+def importar_usuarios(linhas, relatorio):
+    existentes = {email.lower() for (email,) in db.session.query(Usuario.email)}
+
+    for lote in em_lotes(linhas):
+        novos = []
+        for numero, dados in lote:
+            try:
+                nome = campo(dados, "nome")
+                email = campo(dados, "email").lower()
+                senha = campo(dados, "senha")
+                papel = (dados.get("papel") or "SOLICITANTE").upper()
+                if papel not in PAPEIS_VALIDOS:
+                    raise LinhaInvalida(f"papel inválido: {papel}")
+                if email in existentes:
+                    raise LinhaInvalida(f"email '{email}' já cadastrado")
+            except LinhaInvalida as e:
+                relatorio.erro(numero, str(e))
+                continue
+            existentes.add(email)
+            novos.append({
+                "nome": nome,
+                "email": email,
+                "senha_hash": generate_password_hash(senha),
+                "papel": papel,
+            })
+
+        if novos:
+            inserir(Usuario, novos)
+            db.session.commit()
+            relatorio.importadas += len(novos)
+
+
+def importar_agendamentos(linhas, relatorio):
+    """Agendamentos com checagem de conflito contra o banco e o próprio arquivo.
+
+    Cada lote é ordenado por (espaço, início) e verificado no banco depois
+    do BEGIN IMMEDIATE, sob as travas dos espaços do lote, como na criação
+    avulsa: o que outro processo gravou também conflita. Os lotes seguintes
+    conflitam com as linhas já aceitas. Só PENDENTE e APROVADO são
+    bloqueados por conflito (recusados e cancelados são histórico).
+    """
+    espacos = {
+        (setor.lower(), nome.lower()): id
+        for id, nome, setor in db.session.query(Espaco.id, Espaco.nome, Setor.nome).join(Espaco.setor)
+    }
+    usuarios = {email.lower(): id for id, email in db.session.query(Usuario.id, Usuario.email)}
+
+    for lote in em_lotes(linhas):
+        validas = []
+        for numero, dados in lote:
+            try:
+                chave = (campo(dados, "setor").lower(), campo(dados, "espaco").lower())
+                espaco_id = espacos.get(chave)
+                if espaco_id is None:
+                    raise LinhaInvalida(f"espaço '{dados['espaco']}' não encontrado em '{dados['setor']}'")
+                usuario_id = usuarios.get(campo(dados, "usuario_email").lower())
+                if usuario_id is None:
+                    raise LinhaInvalida(f"usuário '{dados['usuario_email']}' não encontrado")
+                inicio = parse_data(campo(dados, "inicio"))
+                fim = parse_data(campo(dados, "fim"))
+                if fim <= inicio:
+                    raise LinhaInvalida("fim anterior ou igual ao início")
+                status = (dados.get("status") or "PENDENTE").upper()
+                if status not in STATUS_VALIDOS:
+                    raise LinhaInvalida(f"status inválido: {status}")
+            except LinhaInvalida as e:
+                relatorio.erro(numero, str(e))
+                continue
+
+            validas.append((numero, {
+                "espaco_id": espaco_id,
+                "usuario_id": usuario_id,
+                "inicio": inicio,
+                "fim": fim,
+                "status": status,
+                "motivo": dados.get("motivo") or None,
+                "motivo_recusa": dados.get("motivo_recusa") or None,
+            }))
+
+        if not validas:
+            continue
+        validas.sort(key=lambda v: (v[1]["espaco_id"], v[1]["inicio"]))
+        with travas_espacos({ag["espaco_id"] for _, ag in validas}):
+            ids, aceitas, conflitos = repetir_se_ocupado(lambda: _gravar_lote(validas), db.session)
+        for numero in conflitos:
+            relatorio.erro(numero, "conflito de horário com outro agendamento")
+        relatorio.importadas += len(aceitas)
+
+        por_espaco = {}
+        for ag_id, ag in zip(ids, aceitas):
+            if ag["status"] != "CANCELADO":
+                por_espaco.setdefault(ag["espaco_id"], []).append((ag_id, ag["inicio"], ag["fim"]))
+        for espaco_id, linhas_espaco in por_espaco.items():
+            indice.registrar_lote(espaco_id, linhas_espaco)
+
+    versao_agendamentos.incrementar()
+
+
+def _gravar_lote(validas):
+    """Verifica e insere um lote já ordenado; devolve (ids, aceitas, linhas_em_conflito)."""
+    iniciar_escrita(db.session)
+    periodos = {}
+    for _, ag in validas:
+        if ag["status"] in ("PENDENTE", "APROVADO"):
+            periodos.setdefault(ag["espaco_id"], []).append((ag["inicio"], ag["fim"]))
+    # uma consulta por espaço; os resultados saem na ordem do lote
+    no_banco = {espaco_id: iter(ocupados_no_banco(espaco_id, lista)) for espaco_id, lista in periodos.items()}
+
+    aceitas = []
+    conflitos = []
+    fim_por_espaco = {}
+    for numero, ag in validas:
+        espaco_id = ag["espaco_id"]
+        if ag["status"] in ("PENDENTE", "APROVADO"):
+            anterior = fim_por_espaco.get(espaco_id)
+            ocupado = next(no_banco[espaco_id])
+            if ocupado or (anterior and ag["inicio"] < anterior):
+                conflitos.append(numero)
+                continue
+        if ag["status"] != "CANCELADO":
+            fim_por_espaco[espaco_id] = max(fim_por_espaco.get(espaco_id, ag["fim"]), ag["fim"])
+        aceitas.append(ag)
+
+    if not aceitas:
+        db.session.rollback()
+        return [], [], conflitos
+    ids = inserir(Agendamento, aceitas, retornar_ids=True)
+    alteracoes.registrar(ids)
+    aprovadas = [ag for ag in aceitas if ag["status"] == "APROVADO"]
+    feeds.registrar_alteracao({ag["espaco_id"] for ag in aprovadas},
+                              {ag["usuario_id"] for ag in aprovadas})
+    db.session.commit()
+    return ids, aceitas, conflitos
+
+
+IMPORTADORES = {
+    "setores": importar_setores,
+    "espacos": importar_espacos,
+    "usuarios": importar_usuarios,
+    "agendamentos": importar_agendamentos,
+}
+
+
+def importar(tipo, arquivo):
+    """Importa um CSV (arquivo texto já aberto) e devolve o relatório."""
+    if tipo not in IMPORTADORES:
+        raise ValueError(f"Tipo de importação desconhecido: {tipo}")
+
+    relatorio = RelatorioImportacao(tipo)
+    IMPORTADORES[tipo](ler_csv(arquivo), relatorio)
+    return relatorio
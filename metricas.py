@@ -0,0 +1,239 @@
+"""Instrumentação opcional por requisição, exposta no formato do Prometheus.
+
+Ligada com METRICAS=1. Para cada endpoint registra histogramas de tempo
+total, nº de comandos SQL, tempo em SQL, tempo de renderização de
+templates e tamanho da resposta. Os histogramas são acumulados desde o
+início do processo (o Prometheus calcula as janelas com rate()); cada
+processo tem os seus.
+
+METRICAS_PERFIL=0.05 roda o cProfile em 5% das requisições e guarda as
+METRICAS_PERFIL_TOP (padrão 10) mais lentas.
+"""
+import cProfile
+import heapq
+import io
+import os
+import pstats
+import random
+import threading
+import time
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+BALDES_TEMPO = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BALDES_CONTAGEM = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BALDES_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+SERIES = {
+    # nome: (descrição, baldes)
+    "reserveja_requisicao_segundos": ("Tempo total da requisição", BALDES_TEMPO),
+    "reserveja_sql_comandos": ("Comandos SQL por requisição", BALDES_CONTAGEM),
+    "reserveja_sql_segundos": ("Tempo em SQL por requisição", BALDES_TEMPO),
+    "reserveja_template_segundos": ("Tempo renderizando templates por requisição", BALDES_TEMPO),
+    "reserveja_resposta_bytes": ("Tamanho da resposta (sem streaming)", BALDES_BYTES),
+}
+
+
+# --------------------------
+# HISTOGRAMAS
+# --------------------------
+class Histograma:
+    def __init__(self, baldes):
+        self.baldes = baldes
+        self.contagens = [0] * len(baldes)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.soma += valor
+        self.total += 1
+        for i, limite in enumerate(self.baldes):
+            if valor <= limite:
+                self.contagens[i] += 1
+                break
+
+
+class Registro:
+    """Histogramas por (série, endpoint) e contador de respostas por status."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histogramas = {}
+        self._respostas = {}
+
+    def observar(self, serie, endpoint, valor):
+        with self._lock:
+            h = self._histogramas.get((serie, endpoint))
+            if h is None:
+                h = self._histogramas[(serie, endpoint)] = Histograma(SERIES[serie][1])
+            h.observar(valor)
+
+    def contar_resposta(self, endpoint, status):
+        with self._lock:
+            chave = (endpoint, status)
+            self._respostas[chave] = self._respostas.get(chave, 0) + 1
+
+    def prometheus(self):
+        linhas = []
+        with self._lock:
+            linhas.append("# HELP reserveja_requisicoes_total Requisições atendidas")
+            linhas.append("# TYPE reserveja_requisicoes_total counter")
+            for (endpoint, status), n in sorted(self._respostas.items()):
+                linhas.append(f'reserveja_requisicoes_total{{endpoint="{endpoint}",status="{status}"}} {n}')
+
+            for serie, (descricao, _) in SERIES.items():
+                linhas.append(f"# HELP {serie} {descricao}")
+                linhas.append(f"# TYPE {serie} histogram")
+                for (s, endpoint), h in sorted(self._histogramas.items()):
+                    if s != serie:
+                        continue
+                    acumulado = 0
+                    for limite, n in zip(h.baldes, h.contagens):
+                        acumulado += n
+                        linhas.append(f'{serie}_bucket{{endpoint="{endpoint}",le="{limite}"}} {acumulado}')
+                    linhas.append(f'{serie}_bucket{{endpoint="{endpoint}",le="+Inf"}} {h.total}')
+                    linhas.append(f'{serie}_sum{{endpoint="{endpoint}"}} {h.soma}')
+                    linhas.append(f'{serie}_count{{endpoint="{endpoint}"}} {h.total}')
+        return "\n".join(linhas) + "\n"
+
+
+class PerfisLentos:
+    """As N requisições amostradas mais lentas, com o relatório do cProfile."""
+
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self._lock = threading.Lock()
+        self._heap = []     # (duração, seq, descrição, texto)
+        self._seq = 0
+
+    def registrar(self, duracao, descricao, perfil):
+        with self._lock:
+            self._seq += 1
+            if len(self._heap) >= self.maximo and duracao <= self._heap[0][0]:
+                return
+        saida = io.StringIO()
+        pstats.Stats(perfil, stream=saida).sort_stats("cumulative").print_stats(30)
+        item = (duracao, self._seq, descricao, saida.getvalue())
+        with self._lock:
+            if len(self._heap) < self.maximo:
+                heapq.heappush(self._heap, item)
+            else:
+                heapq.heappushpop(self._heap, item)
+
+    def texto(self):
+        with self._lock:
+            itens = sorted(self._heap, reverse=True)
+        partes = []
+        for duracao, _, descricao, relatorio in itens:
+            partes.append(f"==== {duracao * 1000:.1f} ms  {descricao}\n{relatorio}")
+        return "\n".join(partes) or "Nenhuma requisição perfilada ainda.\n"
+
+
+registro = Registro()
+perfis = PerfisLentos(int(os.environ.get("METRICAS_PERFIL_TOP", 10)))
+_estado = {"ativo": False, "amostra_perfil": 0.0}
+
+
+def ativo():
+    return _estado["ativo"]
+
+
+# --------------------------
+# SQL (eventos do SQLAlchemy)
+# --------------------------
+@event.listens_for(Engine, "before_cursor_execute")
+def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+    if _estado["ativo"]:
+        conn.info.setdefault("metricas_inicio", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _depois_sql(conn, cursor, statement, parameters, context, executemany):
+    if not _estado["ativo"]:
+        return
+    pilha = conn.info.get("metricas_inicio")
+    if not pilha:
+        return
+    duracao = time.perf_counter() - pilha.pop()
+    # só conta o SQL feito dentro de uma requisição medida
+    if has_request_context() and "metricas" in g:
+        g.metricas["sql_comandos"] += 1
+        g.metricas["sql_segundos"] += duracao
+
+
+# --------------------------
+# TEMPLATES (sinais do Flask)
+# --------------------------
+def _antes_template(sender, template, context, **extra):
+    if has_request_context() and "metricas" in g:
+        g.metricas["template_inicio"] = time.perf_counter()
+
+
+def _depois_template(sender, template, context, **extra):
+    if has_request_context() and "metricas" in g:
+        inicio = g.metricas.pop("template_inicio", None)
+        if inicio is not None:
+            g.metricas["template_segundos"] += time.perf_counter() - inicio
+
+
+# --------------------------
+# CICLO DA REQUISIÇÃO
+# --------------------------
+def _inicio_requisicao():
+    g.metricas = {
+        "inicio": time.perf_counter(),
+        "sql_comandos": 0,
+        "sql_segundos": 0.0,
+        "template_segundos": 0.0,
+    }
+    if _estado["amostra_perfil"] and random.random() < _estado["amostra_perfil"]:
+        g.metricas_perfil = cProfile.Profile()
+        g.metricas_perfil.enable()
+
+
+def _fim_requisicao(resposta):
+    m = g.pop("metricas", None)
+    if m is None:
+        return resposta
+    duracao = time.perf_counter() - m["inicio"]
+
+    perfil = g.pop("metricas_perfil", None)
+    if perfil is not None:
+        perfil.disable()
+        perfis.registrar(duracao, f"{request.method} {request.full_path}", perfil)
+
+    endpoint = request.endpoint or "sem_rota"
+    registro.contar_resposta(endpoint, resposta.status_code)
+    registro.observar("reserveja_requisicao_segundos", endpoint, duracao)
+    registro.observar("reserveja_sql_comandos", endpoint, m["sql_comandos"])
+    registro.observar("reserveja_sql_segundos", endpoint, m["sql_segundos"])
+    registro.observar("reserveja_template_segundos", endpoint, m["template_segundos"])
+    if not resposta.is_streamed:
+        registro.observar("reserveja_resposta_bytes", endpoint, resposta.calculate_content_length() or 0)
+    return resposta
+
+
+def _encerrar_perfil(erro=None):
+    # exceção na view: after_request não roda, mas o profiler precisa parar
+    perfil = g.pop("metricas_perfil", None)
+    if perfil is not None:
+        perfil.disable()
+
+
+def instalar(app):
+    """Liga a instrumentação se METRICAS=1 (ou app.config["METRICAS"])."""
+    ligado = app.config.get("METRICAS", os.environ.get("METRICAS", "0") == "1")
+    if not ligado:
+        return
+
+    _estado["ativo"] = True
+    _estado["amostra_perfil"] = float(os.environ.get("METRICAS_PERFIL", 0) or 0)
+
+    app.before_request(_inicio_requisicao)
+    app.after_request(_fim_requisicao)
+    app.teardown_request(_encerrar_perfil)
+    before_render_template.connect(_antes_template, app)
+    template_rendered.connect(_depois_template, app)
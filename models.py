@@ -1,3 +1,6 @@
+from datetime import datetime
+from functools import lru_cache
+
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
@@ -16,8 +19,13 @@ class Setor(db.Model):
 
     @property
     def acronimo(self):
-        partes = self.nome.split()
-        return "".join(p[0].upper() for p in partes)
+        return gerar_acronimo(self.nome)
+
+
+@lru_cache(maxsize=4096)
+def gerar_acronimo(nome):
+    partes = nome.split()
+    return "".join(p[0].upper() for p in partes)
 
 
 # --------------------------
@@ -47,6 +55,9 @@ class Usuario(db.Model):
     senha_hash = db.Column(db.String(200), nullable=False)
     papel = db.Column(db.String(20), default="SOLICITANTE")  # ADMIN, AGENDADOR, SOLICITANTE
 
+    # segredo das URLs de assinatura ICS (gerado na primeira vez)
+    token_feed = db.Column(db.String(64), unique=True, index=True)
+
     agendamentos = db.relationship("Agendamento", back_populates="usuario")
 
     def pode_agendar(self):
@@ -72,14 +83,135 @@ class Agendamento(db.Model):
     motivo = db.Column(db.String(300))
     motivo_recusa = db.Column(db.String(300))
 
+    criado_em = db.Column(db.DateTime, default=datetime.now)
+
     espaco_id = db.Column(db.Integer, db.ForeignKey("espacos.id"))
     usuario_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"))
 
     espaco = db.relationship("Espaco", back_populates="agendamentos")
     usuario = db.relationship("Usuario", back_populates="agendamentos")
 
+    # índices para consultas por janela de tempo (calendário, conflitos)
+    # e para a fila de pendentes paginada por (inicio, id)
+    __table_args__ = (
+        db.Index("ix_agendamentos_espaco_periodo", "espaco_id", "inicio", "fim"),
+        db.Index("ix_agendamentos_periodo", "inicio", "fim"),
+        db.Index("ix_agendamentos_status_inicio", "status", "inicio"),
+        db.Index("ix_agendamentos_usuario_inicio", "usuario_id", "inicio"),
+        # ids nunca reaproveitados: o arquivo guarda os mesmos ids (ver arquivo.py)
+        {"sqlite_autoincrement": True},
+    )
+
     def conflita_com(self, outro):
         return (
             self.espaco_id == outro.espaco_id and
             not (self.fim <= outro.inicio or self.inicio >= outro.fim)
         )
+
+
+# --------------------------
+# ARQUIVO (agendamentos antigos)
+# --------------------------
+class AgendamentoArquivo(db.Model):
+    """Agendamentos terminados antes do horizonte de arquivamento.
+
+    Mesmas colunas (e mesmos ids) de Agendamento; só leitura. Ver arquivo.py.
+    """
+    __tablename__ = "agendamentos_arquivo"
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    inicio = db.Column(db.DateTime, nullable=False)
+    fim = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20))
+    motivo = db.Column(db.String(300))
+    motivo_recusa = db.Column(db.String(300))
+    criado_em = db.Column(db.DateTime)
+
+    espaco_id = db.Column(db.Integer, db.ForeignKey("espacos.id"))
+    usuario_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"))
+
+    arquivado_em = db.Column(db.DateTime, default=datetime.now)
+
+    espaco = db.relationship("Espaco")
+    usuario = db.relationship("Usuario")
+
+    __table_args__ = (
+        db.Index("ix_agendamentos_arquivo_espaco_periodo", "espaco_id", "inicio", "fim"),
+        db.Index("ix_agendamentos_arquivo_periodo", "inicio", "fim"),
+    )
+
+
+# --------------------------
+# VERSÕES DOS FEEDS ICS
+# --------------------------
+class VersaoFeed(db.Model):
+    """Contador de alterações por espaço/usuário ("espaco:3", "usuario:7").
+
+    Incrementado na mesma transação das escritas; os feeds ICS derivam o
+    ETag daqui sem ler a tabela de agendamentos.
+    """
+    __tablename__ = "versoes_feed"
+    chave = db.Column(db.String(40), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+    alterado_em = db.Column(db.DateTime)
+
+
+class VersaoDados(db.Model):
+    """Versão de um conjunto de dados ("agendamentos", "referencias", ...).
+
+    Incrementada na transação das escritas; cada processo compara com a
+    versão com que montou seus caches (cache.Versao).
+    """
+    __tablename__ = "versoes_dados"
+    chave = db.Column(db.String(40), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+
+
+# --------------------------
+# TAREFAS EM SEGUNDO PLANO
+# --------------------------
+class Tarefa(db.Model):
+    """Trabalho da fila persistente (notificações, exportações).
+
+    Sobrevive a reinícios: o que ficou EXECUTANDO além do prazo volta
+    para PENDENTE.
+    """
+    __tablename__ = "tarefas"
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(40), nullable=False)
+    parametros = db.Column(db.Text, nullable=False, default="{}")
+
+    status = db.Column(db.String(20), nullable=False, default="PENDENTE")
+    # PENDENTE | EXECUTANDO | CONCLUIDA | ERRO
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    erro = db.Column(db.Text)
+    resultado = db.Column(db.String(300))
+
+    usuario_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"))
+
+    criado_em = db.Column(db.DateTime, default=datetime.now)
+    disponivel_em = db.Column(db.DateTime, default=datetime.now)
+    iniciado_em = db.Column(db.DateTime)
+    concluido_em = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index("ix_tarefas_status_disponivel", "status", "disponivel_em"),
+    )
+
+
+# --------------------------
+# LOG DE ALTERAÇÕES (sincronização incremental)
+# --------------------------
+class AlteracaoAgendamento(db.Model):
+    """Uma linha por agendamento gravado ou apagado, na transação da escrita.
+
+    Só cresce (AUTOINCREMENT: ids nunca são reaproveitados); o id é o
+    cursor de /api/changes.
+    """
+    __tablename__ = "alteracoes_agendamentos"
+    id = db.Column(db.Integer, primary_key=True)
+    agendamento_id = db.Column(db.Integer, nullable=False)
+    operacao = db.Column(db.String(10), nullable=False)   # UPSERT | DELETE
+    criado_em = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = {"sqlite_autoincrement": True}
@@ -0,0 +1,71 @@
+"""Avisos ao solicitante quando um agendamento é aprovado ou recusado.
+
+Com SMTP_HOST configurado as mensagens saem por e-mail (SMTP_PORT,
+SMTP_USUARIO, SMTP_SENHA, SMTP_REMETENTE, SMTP_TLS=1); sem ele vão para
+o log. Roda dentro da fila de tarefas, nunca na requisição.
+"""
+import logging
+import os
+import smtplib
+from email.message import EmailMessage
+
+from sqlalchemy.orm import joinedload
+
+from models import Agendamento
+
+
+log = logging.getLogger("reserveja.notificacoes")
+
+ASSUNTOS = {
+    "APROVADO": "Agendamento aprovado",
+    "RECUSADO": "Agendamento recusado",
+}
+
+
+def mensagem(ag, decisao):
+    corpo = [
+        f"Olá, {ag.usuario.nome}.",
+        "",
+        f"Seu agendamento de {ag.espaco.nome} em {ag.inicio.strftime('%d/%m/%Y %H:%M')}"
+        f"–{ag.fim.strftime('%H:%M')} foi {decisao.lower()}.",
+    ]
+    if ag.motivo:
+        corpo.append(f"Motivo: {ag.motivo}")
+    if decisao == "RECUSADO" and ag.motivo_recusa:
+        corpo.append(f"Justificativa: {ag.motivo_recusa}")
+
+    msg = EmailMessage()
+    msg["Subject"] = f"{ASSUNTOS[decisao]} – {ag.espaco.nome}"
+    msg["From"] = os.environ.get("SMTP_REMETENTE", "reserveja@localhost")
+    msg["To"] = ag.usuario.email
+    msg.set_content("\n".join(corpo) + "\n")
+    return msg
+
+
+def notificar_decisao(ids, decisao):
+    """Avisa os solicitantes; agendamentos que mudaram de status desde então são pulados."""
+    agendamentos = (
+        Agendamento.query
+        .options(joinedload(Agendamento.usuario), joinedload(Agendamento.espaco))
+        .filter(Agendamento.id.in_(ids), Agendamento.status == decisao)
+        .all()
+    )
+    mensagens = [mensagem(ag, decisao) for ag in agendamentos if ag.usuario and ag.usuario.email]
+    if not mensagens:
+        return 0
+
+    host = os.environ.get("SMTP_HOST")
+    if not host:
+        for msg in mensagens:
+            log.info("notificação para %s: %s", msg["To"], msg["Subject"])
+        return len(mensagens)
+
+    # uma conexão para o lote inteiro
+    with smtplib.SMTP(host, int(os.environ.get("SMTP_PORT", 25)), timeout=30) as smtp:
+        if os.environ.get("SMTP_TLS", "0") == "1":
+            smtp.starttls()
+        if os.environ.get("SMTP_USUARIO"):
+            smtp.login(os.environ["SMTP_USUARIO"], os.environ.get("SMTP_SENHA", ""))
+        for msg in mensagens:
+            smtp.send_message(msg)
+    return len(mensagens)
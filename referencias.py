@@ -0,0 +1,77 @@
+"""Cache em memória dos dados de referência: setores, espaços e acrônimos.
+
+Quase toda página monta selects de setor/espaço e o formulário de
+agendamento busca os espaços do setor a cada troca. O retrato inteiro é
+montado com duas consultas e reaproveitado até `versao_referencias`
+mudar (cadastro de setor/espaço, troca de status, importação). A escrita
+registra a versão na própria transação, então o retrato de outros
+processos também é refeito na requisição seguinte.
+
+Cada lista de espaços por setor já vem serializada, com um ETag derivado
+do conteúdo (igual entre processos e reinícios).
+"""
+import hashlib
+import json
+import threading
+from collections import namedtuple
+
+from models import db, Espaco, Setor, gerar_acronimo
+from cache import versao_referencias
+
+
+SetorRef = namedtuple("SetorRef", "id nome acronimo espacos")
+EspacoRef = namedtuple("EspacoRef", "id nome status setor_id setor")
+
+_retrato = {"versao": None}
+_lock = threading.Lock()
+
+
+def _montar():
+    setores = db.session.query(Setor.id, Setor.nome).order_by(Setor.nome, Setor.id).all()
+    nomes = {i: nome for i, nome in setores}
+    espacos = [
+        EspacoRef(i, nome, status or "LIVRE", setor_id, nomes.get(setor_id, ""))
+        for i, nome, status, setor_id in db.session.query(
+            Espaco.id, Espaco.nome, Espaco.status, Espaco.setor_id
+        ).order_by(Espaco.nome, Espaco.id)
+    ]
+
+    por_setor = {i: [] for i, _ in setores}
+    for e in espacos:
+        por_setor.setdefault(e.setor_id, []).append(e)
+
+    json_por_setor = {}
+    for setor_id, lista in por_setor.items():
+        corpo = json.dumps([{"id": e.id, "nome": e.nome, "status": e.status} for e in lista],
+                           ensure_ascii=False).encode("utf-8")
+        json_por_setor[setor_id] = (corpo, hashlib.sha1(corpo).hexdigest())
+
+    return {
+        "setores": [SetorRef(i, nome, gerar_acronimo(nome), tuple(por_setor[i])) for i, nome in setores],
+        "espacos": espacos,
+        "json_por_setor": json_por_setor,
+    }
+
+
+def retrato():
+    versao = versao_referencias.atual()
+    with _lock:
+        if _retrato["versao"] != versao:
+            _retrato.update(_montar(), versao=versao)
+        return _retrato
+
+
+# --------------------------
+# CONSULTAS
+# --------------------------
+def setores():
+    return retrato()["setores"]
+
+
+def espacos():
+    return retrato()["espacos"]
+
+
+def espacos_do_setor_json(setor_id):
+    """(corpo JSON, etag) da lista de espaços do setor; setor inexistente dá lista vazia."""
+    return retrato()["json_por_setor"].get(setor_id, (b"[]", hashlib.sha1(b"[]").hexdigest()))
@@ -0,0 +1,219 @@
+from datetime import datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import simpleSplit
+from models import db, Agendamento, Espaco, Setor
+import arquivo
+import serializacao
+
+
+DIAS_SEMANA = ["SEG", "TER", "QUA", "QUI", "SEX", "SÁB", "DOM"]
+
+
+# --------------------------
+# PERÍODO DO RELATÓRIO
+# --------------------------
+def periodo_relatorio(periodo, data=None, data_inicio=None, data_fim=None):
+    """Devolve (inicio, fim_exclusivo, descricao) para dia/semana/mes/personalizado.
+
+    `data` é o dia de referência (default: hoje); no modo personalizado
+    `data_inicio` e `data_fim` são dias inclusivos. Levanta ValueError para
+    valores inválidos.
+    """
+    periodo = periodo or "dia"
+    ref = datetime.strptime(data, "%Y-%m-%d").date() if data else datetime.now().date()
+
+    if periodo == "dia":
+        ini = ref
+        fim = ref + timedelta(days=1)
+    elif periodo == "semana":
+        ini = ref - timedelta(days=ref.weekday())
+        fim = ini + timedelta(days=7)
+    elif periodo == "mes":
+        ini = ref.replace(day=1)
+        fim = ini + relativedelta(months=1)
+    elif periodo == "personalizado":
+        if not data_inicio or not data_fim:
+            raise ValueError("Informe início e fim do período.")
+        ini = datetime.strptime(data_inicio, "%Y-%m-%d").date()
+        fim = datetime.strptime(data_fim, "%Y-%m-%d").date() + timedelta(days=1)
+        if fim <= ini:
+            raise ValueError("O fim do período é anterior ao início.")
+    else:
+        raise ValueError(f"Período desconhecido: {periodo}")
+
+    ultimo = fim - timedelta(days=1)
+    if ini == ultimo:
+        descricao = ini.strftime("%d/%m/%Y")
+    else:
+        descricao = f"{ini.strftime('%d/%m/%Y')} a {ultimo.strftime('%d/%m/%Y')}"
+
+    return (
+        datetime(ini.year, ini.month, ini.day),
+        datetime(fim.year, fim.month, fim.day),
+        descricao,
+    )
+
+
+# --------------------------
+# PDF DA AGENDA
+# --------------------------
+def _cabecalho_tabela(c, y, largura):
+    c.setFont("Helvetica-Bold", 11)
+    c.drawString(40, y,  "HORÁRIO")
+    c.drawString(120, y, "ESPAÇO")
+    c.drawString(260, y, "USUÁRIO")
+    c.drawString(380, y, "STATUS")
+    c.drawString(450, y, "MOTIVO / RECUSA")
+    y -= 10
+    c.line(40, y, largura - 40, y)
+    y -= 15
+    c.setFont("Helvetica", 10)
+    return y
+
+
+def escrever_pdf_agenda(destino, agendamentos, filtros_desc, varios_dias=False):
+    """Desenha o relatório em `destino` (caminho ou arquivo binário).
+
+    `agendamentos` são linhas de serializacao.consulta_agendamentos,
+    ordenadas por setor e início; é consumido uma única vez, linha a linha,
+    então pode ser um iterador com yield_per.
+    """
+    c = canvas.Canvas(destino, pagesize=A4)
+    largura, altura = A4
+
+    # TÍTULO PRINCIPAL
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(40, altura - 40, "Agenda – Relatório Filtrado")
+
+    y = altura - 80
+
+    # ----- DESCREVER OS FILTROS USADOS -----
+    c.setFont("Helvetica", 11)
+    for linha in filtros_desc:
+        c.drawString(40, y, linha)
+        y -= 18
+
+    y -= 15
+
+    setor_atual = None
+    dia_atual = None
+
+    # ----- TABELA POR SETOR -----
+    for ag in agendamentos:
+        nome_setor = ag.setor
+
+        if nome_setor != setor_atual:
+            if setor_atual is not None:
+                y -= 30
+            if y < 120:
+                c.showPage()
+                y = altura - 50
+
+            # Nome do setor
+            c.setFont("Helvetica-Bold", 14)
+            c.drawString(40, y, f"SETOR: {nome_setor}")
+            y -= 28
+            y = _cabecalho_tabela(c, y, largura)
+            setor_atual = nome_setor
+            dia_atual = None
+
+        # separador de dia quando o relatório cobre mais de um dia
+        if varios_dias and ag.inicio.date() != dia_atual:
+            dia_atual = ag.inicio.date()
+            c.setFont("Helvetica-Bold", 10)
+            c.drawString(40, y, f"{DIAS_SEMANA[dia_atual.weekday()]} {dia_atual.strftime('%d/%m/%Y')}")
+            c.setFont("Helvetica", 10)
+            y -= 16
+
+        # coluna 1 - horário
+        c.drawString(40, y, f"{ag.inicio.strftime('%H:%M')}–{ag.fim.strftime('%H:%M')}")
+
+        # coluna 2 - espaço
+        c.drawString(120, y, ag.espaco[:18])
+
+        # coluna 3 - usuário
+        c.drawString(260, y, ag.usuario[:18])
+
+        # coluna 4 - status
+        c.drawString(380, y, ag.status)
+
+        # coluna 5 - motivo + recusa (quebra automática)
+        motivo_texto = f"{ag.motivo or ''}"
+        if ag.motivo_recusa:
+            motivo_texto += f"\nRecusa: {ag.motivo_recusa}"
+
+        linhas = simpleSplit(motivo_texto, 'Helvetica', 10, 120)
+
+        # desenhar as linhas do motivo
+        yy = y
+        for l in linhas:
+            c.drawString(450, yy, l)
+            yy -= 12
+
+        y -= max(20, 12 * len(linhas))
+
+        # quebra de página
+        if y < 50:
+            c.showPage()
+            y = altura - 50
+            c.setFont("Helvetica-Bold", 14)
+            c.drawString(40, y, f"SETOR: {nome_setor} (continuação)")
+            y -= 28
+            y = _cabecalho_tabela(c, y, largura)
+
+    # ----- SEM RESULTADOS -----
+    if setor_atual is None:
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(40, y, "Nenhum resultado para os filtros aplicados.")
+
+    c.save()
+
+
+def gerar_pdf_agenda(destino, parametros):
+    """Consulta e desenha o relatório a partir dos parâmetros da exportação.
+
+    `parametros`: periodo, data, data_inicio, data_fim, status (lista),
+    setor_id e espaco_id, como na query string de /exportar_pdf. Usado
+    pela rota síncrona e pela tarefa em segundo plano.
+    """
+    status_filtros = parametros.get("status") or []
+    setor_id = parametros.get("setor_id")
+    espaco_id = parametros.get("espaco_id")
+
+    inicio, fim, periodo_desc = periodo_relatorio(
+        parametros.get("periodo"),
+        data=parametros.get("data"),
+        data_inicio=parametros.get("data_inicio"),
+        data_fim=parametros.get("data_fim"),
+    )
+
+    def montar(modelo):
+        q = serializacao.consulta_agendamentos(modelo).filter(
+            modelo.inicio >= inicio,
+            modelo.inicio < fim,
+            modelo.status != "CANCELADO",
+        )
+        if status_filtros:
+            q = q.filter(modelo.status.in_(status_filtros))
+        if setor_id:
+            q = q.filter(Espaco.setor_id == setor_id)
+        if espaco_id:
+            q = q.filter(modelo.espaco_id == espaco_id)
+        return q
+
+    q = arquivo.incluir_arquivo(montar, inicio).order_by(Espaco.setor_id, Agendamento.inicio)
+
+    setor = db.session.get(Setor, int(setor_id)) if setor_id else None
+    espaco = db.session.get(Espaco, int(espaco_id)) if espaco_id else None
+    filtros_desc = [
+        f"Período: {periodo_desc}",
+        f"Status: {', '.join(status_filtros) if status_filtros else 'Todos'}",
+        f"Setor: {setor.nome if setor else 'Todos'}",
+        f"Espaço: {espaco.nome if espaco else 'Todos'}",
+    ]
+
+    # linhas em lotes: o relatório de um mês inteiro não fica todo na memória
+    escrever_pdf_agenda(destino, q.yield_per(500), filtros_desc, varios_dias=(fim - inicio).days > 1)
@@ -0,0 +1,145 @@
+from models import db, Agendamento, AgendamentoArquivo, Espaco, Setor, Usuario, gerar_acronimo
+import arquivo
+
+
+# --------------------------
+# CONSULTA PROJETADA
+# --------------------------
+# Só as colunas que os JSONs usam, com espaço/setor/usuário no mesmo SELECT.
+# `modelo` é Agendamento ou AgendamentoArquivo (mesmas colunas).
+def colunas(modelo=Agendamento):
+    return (
+        modelo.id,
+        modelo.inicio,
+        modelo.fim,
+        modelo.status,
+        modelo.motivo,
+        modelo.motivo_recusa,
+        modelo.espaco_id,
+        Espaco.nome.label("espaco"),
+        Espaco.setor_id,
+        Setor.nome.label("setor"),
+        Usuario.nome.label("usuario"),
+    )
+
+
+def consulta_agendamentos(modelo=Agendamento):
+    """Query de linhas (não objetos) de agendamentos, já com os joins.
+
+    Aceita filtros sobre o modelo, Espaco e Setor normalmente.
+    """
+    return (
+        db.session.query(*colunas(modelo))
+        .select_from(modelo)
+        .join(Espaco, Espaco.id == modelo.espaco_id)
+        .join(Setor, Setor.id == Espaco.setor_id)
+        .join(Usuario, Usuario.id == modelo.usuario_id)
+    )
+
+
+def linhas_por_ids(ids):
+    """Linhas dos ids pedidos, em ordem de início; os que não estão na tabela quente vêm do arquivo."""
+    if not ids:
+        return []
+    linhas = consulta_agendamentos().filter(Agendamento.id.in_(ids)).all()
+    encontrados = {l.id for l in linhas}
+    faltam = [i for i in ids if i not in encontrados]
+    if faltam and arquivo.alcanca(None):
+        linhas += (
+            consulta_agendamentos(AgendamentoArquivo)
+            .filter(AgendamentoArquivo.id.in_(faltam))
+            .all()
+        )
+    return sorted(linhas, key=lambda l: (l.inicio, l.id))
+
+
+# --------------------------
+# FORMATOS DE SAÍDA
+# --------------------------
+def cor_status(status):
+    return {
+        "APROVADO": "#28a745",   # verde
+        "PENDENTE": "#ffc107",   # amarelo
+        "RECUSADO": "#dc3545",   # vermelho
+        "CANCELADO": "#6c757d",  # cinza
+    }.get(status, "#0d6efd")     # padrão azul
+
+
+def evento_calendario(l):
+    motivo_curto = ""
+    if l.motivo:
+        motivo_curto = l.motivo[:25] + ("..." if len(l.motivo) > 25 else "")
+
+    acronimo = gerar_acronimo(l.setor)
+    return {
+        "id": l.id,
+        "title": f"{acronimo} – {l.espaco}\n{motivo_curto}",
+        "start": l.inicio.isoformat(),
+        "end": l.fim.isoformat(),
+        "color": cor_status(l.status),
+
+        # Enviamos para o tooltip (opcional, mas profissional)
+        "setor": l.setor,
+        "acronimo": acronimo,
+        "espaco": l.espaco,
+        "motivo": l.motivo,
+        "usuario": l.usuario,
+        "status": l.status
+    }
+
+
+def item_dashboard(l):
+    return {
+        "id": l.id,
+        "setor": l.setor,
+        "espaco": l.espaco,
+        "usuario": l.usuario,
+        "inicio": l.inicio.strftime("%H:%M"),
+        "fim": l.fim.strftime("%H:%M"),
+        "status": l.status,
+        "motivo": l.motivo,
+        "motivo_recusa": l.motivo_recusa
+    }
+
+
+def item_conflito(l):
+    return {
+        "id": l.id,
+        "status": l.status,
+        "setor": l.setor,
+        "espaco": l.espaco,
+        "inicio": l.inicio.strftime("%H:%M"),
+        "fim": l.fim.strftime("%H:%M"),
+        "usuario": l.usuario,
+        "motivo": l.motivo
+    }
+
+
+def detalhe_agendamento(l):
+    return {
+        "id": l.id,
+        "espaco": l.espaco,
+        "setor": l.setor,
+        "acronimo": gerar_acronimo(l.setor),
+        "status": l.status,
+        "motivo": l.motivo,
+        "motivo_recusa": l.motivo_recusa,
+        "usuario": l.usuario,
+        "inicio": l.inicio.strftime("%d/%m/%Y %H:%M"),
+        "fim": l.fim.strftime("%d/%m/%Y %H:%M"),
+        "color": cor_status(l.status)
+    }
+
+
+def delta_agendamento(l):
+    # payload dos eventos ao vivo: formatos do calendário, dashboard e pendentes
+    return {
+        "id": l.id,
+        "status": l.status,
+        "setor_id": l.setor_id,
+        "espaco_id": l.espaco_id,
+        "data": l.inicio.date().isoformat(),
+        "evento": evento_calendario(l),
+        "item": item_dashboard(l),
+        "horario": f"{l.inicio.strftime('%d/%m %H:%M')} - {l.fim.strftime('%H:%M')}",
+    }
@@ -1,46 +1,425 @@
-from models import db, Agendamento
+import threading
+from contextlib import contextmanager, ExitStack
+
+from dateutil.rrule import rrule, DAILY, WEEKLY, MONTHLY
+from sqlalchemy import func, insert
+
+from models import db, Agendamento, Espaco
+from conflitos import indice, AgendaEspaco
+from banco import iniciar_escrita, repetir_se_ocupado
+from cache import versao_agendamentos
+from eventos import broker
+import serializacao
+import feeds
+import tarefas
+import alteracoes
+import arquivo
+
+
+# --------------------------
+# CONTADORES (por status e por setor)
+# --------------------------
+_contadores = {"versao": None, "por_status": {}, "por_setor": {}}
+_contadores_lock = threading.Lock()
+
+
+def contadores():
+    """Contagens por status e por (setor, status).
+
+    Recalculadas com um GROUP BY só quando a versão dos agendamentos mudou
+    (escrita deste ou de outro processo); entre escritas a leitura só
+    consulta a versão.
+    """
+    versao = versao_agendamentos.atual()
+    with _contadores_lock:
+        if _contadores["versao"] == versao:
+            return _contadores
+
+        por_status = {}
+        por_setor = {}
+        linhas = (
+            db.session.query(Espaco.setor_id, Agendamento.status, func.count(Agendamento.id))
+            .join(Agendamento.espaco)
+            .group_by(Espaco.setor_id, Agendamento.status)
+        )
+        for setor_id, status, total in linhas:
+            por_status[status] = por_status.get(status, 0) + total
+            por_setor.setdefault(setor_id, {})[status] = total
+
+        _contadores.update(versao=versao, por_status=por_status, por_setor=por_setor)
+        return _contadores
+
+
+def total_pendentes():
+    return contadores()["por_status"].get("PENDENTE", 0)
+
+
+def _publicar(tipo, ids):
+    # envia aos clientes SSE o estado atual dos agendamentos alterados
+    if not len(broker) or not ids:
+        return
+    pendentes = total_pendentes()
+    for linha in serializacao.linhas_por_ids(ids):
+        broker.publicar("agendamento", {
+            "tipo": tipo,
+            "agendamento": serializacao.delta_agendamento(linha),
+            "pendentes_count": pendentes,
+        })
+
+
+def _publicar_exclusao(ag_id):
+    if not len(broker):
+        return
+    broker.publicar("agendamento", {
+        "tipo": "excluido",
+        "agendamento": {"id": ag_id},
+        "pendentes_count": total_pendentes(),
+    })
 
 
 def existe_conflito(ag):
-    existentes = Agendamento.query.filter(
-        Agendamento.espaco_id == ag.espaco_id,
-        Agendamento.status != "CANCELADO"
-    ).all()
+    # antes do flush só o relacionamento está preenchido
+    espaco_id = ag.espaco_id if ag.espaco_id is not None else ag.espaco.id
+    return bool(indice.conflitos(espaco_id, ag.inicio, ag.fim, ignorar_id=ag.id))
+
+
+# --------------------------
+# CRIAÇÃO SERIALIZADA POR ESPAÇO
+# --------------------------
+# Verificar e gravar precisam ser um passo só. Neste processo, quem cria no
+# mesmo espaço espera numa das TRAVAS_ESPACOS (espaços diferentes quase
+# nunca dividem trava); entre processos, quem decide é a consulta ao banco
+# depois do BEGIN IMMEDIATE, já com o lock de escrita do SQLite. O índice em
+# memória é só um palpite, descartado quando discorda do banco.
+TRAVAS_ESPACOS = 64
+_travas_espacos = [threading.Lock() for _ in range(TRAVAS_ESPACOS)]
 
-    for x in existentes:
-        if ag.conflita_com(x):
-            return True
+MSG_CONFLITO = "Conflito de horário com outro agendamento."
 
-    return False
+
+def trava_espaco(espaco_id):
+    return _travas_espacos[int(espaco_id) % TRAVAS_ESPACOS]
+
+
+@contextmanager
+def travas_espacos(espaco_ids):
+    """Trava vários espaços de uma vez, sempre na mesma ordem (sem deadlock)."""
+    with ExitStack() as pilha:
+        for n in sorted({int(e) % TRAVAS_ESPACOS for e in espaco_ids}):
+            pilha.enter_context(_travas_espacos[n])
+        yield
+
+
+def ocupados_no_banco(espaco_id, periodos, status=None):
+    """Para cada (inicio, fim), os ids que o banco tem sobrepostos agora.
+
+    Pega também o que outro processo gravou e o índice deste ainda não viu,
+    e o que já foi para o arquivo. Com `status`, só os desse status (senão,
+    todos menos os CANCELADOS).
+    """
+    if not periodos:
+        return []
+    inicio = min(i for i, _ in periodos)
+    fim = max(f for _, f in periodos)
+
+    def montar(modelo):
+        return db.session.query(modelo.id, modelo.inicio, modelo.fim).filter(
+            modelo.espaco_id == espaco_id,
+            modelo.status == status if status else modelo.status != "CANCELADO",
+            modelo.inicio < fim,
+            modelo.fim > inicio,
+        )
+
+    agenda = AgendaEspaco(arquivo.incluir_arquivo(montar, inicio).all())
+    return [agenda.sobrepostos(i, f) for i, f in periodos]
 
 
 def criar_agendamento(usuario, espaco, inicio, fim, motivo):
     if espaco.status == "BLOQUEADO":
         raise ValueError("Este espaço está BLOQUEADO e não pode ser agendado.")
+    espaco_id = espaco.id
 
-    ag = Agendamento(
-        usuario=usuario,
-        espaco=espaco,
-        inicio=inicio,
-        fim=fim,
-        motivo=motivo,
-        status="PENDENTE"
-    )
+    def gravar():
+        # o índice é só um palpite (pode não ter visto uma exclusão ou uma
+        # gravação recente); quem decide é o banco, já com o lock de escrita
+        palpite = bool(indice.conflitos(espaco_id, inicio, fim))
+        iniciar_escrita(db.session)
+        ocupado = bool(ocupados_no_banco(espaco_id, [(inicio, fim)])[0])
+        if palpite != ocupado:
+            indice.invalidar(espaco_id)
+        if ocupado:
+            db.session.rollback()
+            raise ValueError(MSG_CONFLITO)
 
-    if existe_conflito(ag):
-        raise ValueError("Conflito de horário com outro agendamento.")
+        ag = Agendamento(
+            usuario=usuario,
+            espaco=espaco,
+            inicio=inicio,
+            fim=fim,
+            motivo=motivo,
+            status="PENDENTE"
+        )
+        db.session.add(ag)
+        db.session.flush()
+        alteracoes.registrar([ag.id])
+        db.session.commit()
+        indice.registrar(ag)
+        return ag
 
-    db.session.add(ag)
-    db.session.commit()
+    with trava_espaco(espaco_id):
+        ag = repetir_se_ocupado(gravar, db.session)
+    versao_agendamentos.incrementar()
+    _publicar("criado", [ag.id])
     return ag
 
 
+# --------------------------
+# RECORRÊNCIA
+# --------------------------
+FREQUENCIAS = {"diaria": DAILY, "semanal": WEEKLY, "mensal": MONTHLY}
+MAX_OCORRENCIAS = 366
+
+
+def expandir_recorrencia(inicio, fim, frequencia, ate=None, ocorrencias=None):
+    """Lista de (inicio, fim) da série, incluindo a primeira ocorrência.
+
+    `ate` é a data (inclusiva) da última ocorrência; `ocorrencias` limita a
+    quantidade. Um dos dois é obrigatório. Séries com mais de
+    MAX_OCORRENCIAS são recusadas inteiras, nunca cortadas.
+    """
+    if frequencia not in FREQUENCIAS:
+        raise ValueError("Frequência de repetição inválida.")
+    if not ate and ocorrencias is None:
+        raise ValueError("Informe a data final ou o número de ocorrências.")
+    if ocorrencias is not None and ocorrencias < 1:
+        raise ValueError("O número de ocorrências deve ser pelo menos 1.")
+    if ocorrencias and ocorrencias > MAX_OCORRENCIAS:
+        raise ValueError(f"Uma série pode ter no máximo {MAX_OCORRENCIAS} ocorrências.")
+    if ate and ate.date() < inicio.date():
+        raise ValueError("A data final da repetição é anterior ao início.")
+
+    duracao = fim - inicio
+    regra = rrule(
+        FREQUENCIAS[frequencia],
+        dtstart=inicio,
+        until=ate.replace(hour=23, minute=59, second=59) if ate else None,
+        # uma a mais que o máximo: basta para saber se a data final passa dele
+        count=ocorrencias or MAX_OCORRENCIAS + 1,
+    )
+    datas = list(regra)
+    if not datas:
+        raise ValueError("A repetição não gera nenhuma ocorrência.")
+    if len(datas) > MAX_OCORRENCIAS:
+        raise ValueError(f"A série passaria de {MAX_OCORRENCIAS} ocorrências até a data final; "
+                         "escolha uma data mais próxima.")
+    return [(d, d + duracao) for d in datas]
+
+
+def criar_agendamentos_recorrentes(usuario, espaco, inicio, fim, motivo,
+                                   frequencia, ate=None, ocorrencias=None):
+    """Cria a série inteira em um commit, pulando as ocorrências em conflito.
+
+    Devolve (ids_criados, periodos_em_conflito).
+    """
+    if espaco.status == "BLOQUEADO":
+        raise ValueError("Este espaço está BLOQUEADO e não pode ser agendado.")
+
+    periodos = expandir_recorrencia(inicio, fim, frequencia, ate, ocorrencias)
+    espaco_id, usuario_id = espaco.id, usuario.id
+
+    def gravar():
+        # como em criar_agendamento: o índice é palpite, o banco decide
+        palpite = [bool(ids) for ids in indice.conflitos_lote(espaco_id, periodos)]
+        iniciar_escrita(db.session)
+        no_banco = ocupados_no_banco(espaco_id, periodos)
+        if palpite != [bool(ids) for ids in no_banco]:
+            indice.invalidar(espaco_id)
+
+        livres = []
+        conflitantes = []
+        fim_anterior = None
+        for (ini, f), ids in zip(periodos, no_banco):
+            # ocorrências da própria série também não podem se sobrepor
+            if ids or (fim_anterior and ini < fim_anterior):
+                conflitantes.append((ini, f))
+            else:
+                livres.append((ini, f))
+                fim_anterior = f
+
+        if not livres:
+            db.session.rollback()
+            return [], conflitantes
+
+        ids = list(db.session.scalars(
+            insert(Agendamento).returning(Agendamento.id, sort_by_parameter_order=True),
+            [
+                {
+                    "inicio": ini,
+                    "fim": f,
+                    "motivo": motivo,
+                    "status": "PENDENTE",
+                    "espaco_id": espaco_id,
+                    "usuario_id": usuario_id,
+                }
+                for ini, f in livres
+            ]
+        ))
+        alteracoes.registrar(ids)
+        db.session.commit()
+
+        indice.registrar_lote(espaco_id, [(i, ini, f) for i, (ini, f) in zip(ids, livres)])
+        return ids, conflitantes
+
+    with trava_espaco(espaco_id):
+        ids, conflitantes = repetir_se_ocupado(gravar, db.session)
+    if ids:
+        versao_agendamentos.incrementar()
+        _publicar("criado", ids)
+    return ids, conflitantes
+
+
+def _notificar(ids, decisao):
+    # entra na transação da decisão: o aviso só existe se a decisão gravou
+    if ids:
+        tarefas.enfileirar("notificar_decisao", {"ids": list(ids), "decisao": decisao})
+
+
 def aprovar_agendamento(agendamento):
     agendamento.status = "APROVADO"
+    feeds.registrar_alteracao([agendamento.espaco_id], [agendamento.usuario_id])
+    _notificar([agendamento.id], "APROVADO")
+    alteracoes.registrar([agendamento.id])
     db.session.commit()
+    indice.registrar(agendamento)
+    versao_agendamentos.incrementar()
+    _publicar("aprovado", [agendamento.id])
+    tarefas.acordar()
 
 
 def recusar_agendamento(agendamento, justificativa):
     agendamento.status = "RECUSADO"
     agendamento.motivo_recusa = justificativa
+    feeds.registrar_alteracao([agendamento.espaco_id], [agendamento.usuario_id])
+    _notificar([agendamento.id], "RECUSADO")
+    alteracoes.registrar([agendamento.id])
+    db.session.commit()
+    indice.registrar(agendamento)
+    versao_agendamentos.incrementar()
+    _publicar("recusado", [agendamento.id])
+    tarefas.acordar()
+
+
+def editar_agendamento(agendamento, espaco_id, inicio, fim, motivo):
+    espaco_anterior = agendamento.espaco_id
+
+    agendamento.espaco_id = espaco_id
+    agendamento.inicio = inicio
+    agendamento.fim = fim
+    agendamento.motivo = motivo
+    feeds.registrar_alteracao([espaco_anterior, espaco_id], [agendamento.usuario_id])
+    alteracoes.registrar([agendamento.id])
+    db.session.commit()
+
+    indice.remover(agendamento.id, espaco_anterior)
+    indice.registrar(agendamento)
+    versao_agendamentos.incrementar()
+    _publicar("editado", [agendamento.id])
+
+
+def excluir_agendamento(agendamento):
+    ag_id, espaco_id = agendamento.id, agendamento.espaco_id
+    feeds.registrar_alteracao([espaco_id], [agendamento.usuario_id])
+    db.session.delete(agendamento)
+    alteracoes.registrar([ag_id], "DELETE")
     db.session.commit()
+    indice.remover(ag_id, espaco_id)
+    versao_agendamentos.incrementar()
+    _publicar_exclusao(ag_id)
+
+
+def aprovar_com_conflitos(agendamento, justificativa):
+    # aprova o alvo e recusa todos os sobrepostos em um único commit
+    ids = indice.conflitos(agendamento.espaco_id, agendamento.inicio,
+                           agendamento.fim, ignorar_id=agendamento.id)
+
+    agendamento.status = "APROVADO"
+    recusados = []
+    usuarios = {agendamento.usuario_id}
+    if ids:
+        for i, usuario_id in db.session.query(Agendamento.id, Agendamento.usuario_id).filter(
+            Agendamento.id.in_(ids),
+            Agendamento.status.in_(["PENDENTE", "APROVADO"])
+        ):
+            recusados.append(i)
+            usuarios.add(usuario_id)
+    feeds.registrar_alteracao([agendamento.espaco_id], usuarios)
+    if recusados:
+        Agendamento.query.filter(Agendamento.id.in_(recusados)).update(
+            {"status": "RECUSADO", "motivo_recusa": justificativa},
+            synchronize_session="fetch"
+        )
+    _notificar([agendamento.id], "APROVADO")
+    _notificar(recusados, "RECUSADO")
+    alteracoes.registrar([agendamento.id] + recusados)
+    db.session.commit()
+    versao_agendamentos.incrementar()
+    _publicar("aprovado", [agendamento.id])
+    _publicar("recusado", recusados)
+    tarefas.acordar()
+    return recusados
+
+
+def aprovar_em_lote(ids):
+    """Aprova os PENDENTES de `ids` que não conflitam com um aprovado.
+
+    Verifica no banco, com o lock de escrita, contra os já aprovados e
+    contra os aprovados do próprio lote (em ordem de início: entre dois
+    que se sobrepõem, fica o primeiro). Devolve (aprovados, em_conflito).
+    """
+    espacos = {e for (e,) in db.session.query(Agendamento.espaco_id).filter(Agendamento.id.in_(ids))}
+
+    def gravar():
+        iniciar_escrita(db.session)
+        linhas = (
+            db.session.query(Agendamento.id, Agendamento.espaco_id, Agendamento.usuario_id,
+                             Agendamento.inicio, Agendamento.fim)
+            .filter(Agendamento.id.in_(ids), Agendamento.status == "PENDENTE")
+            .order_by(Agendamento.inicio, Agendamento.id)
+            .all()
+        )
+        por_espaco = {}
+        for l in linhas:
+            por_espaco.setdefault(l.espaco_id, []).append(l)
+
+        aceitos = []
+        em_conflito = []
+        for espaco_id, grupo in por_espaco.items():
+            no_banco = ocupados_no_banco(espaco_id, [(l.inicio, l.fim) for l in grupo], status="APROVADO")
+            do_lote = AgendaEspaco()
+            for l, ocupados in zip(grupo, no_banco):
+                if ocupados or do_lote.sobrepostos(l.inicio, l.fim):
+                    em_conflito.append(l.id)
+                else:
+                    do_lote.adicionar(l.id, l.inicio, l.fim)
+                    aceitos.append(l)
+
+        aprovados = [l.id for l in aceitos]
+        if not aprovados:
+            db.session.rollback()
+            return [], em_conflito
+        Agendamento.query.filter(Agendamento.id.in_(aprovados)).update(
+            {"status": "APROVADO"}, synchronize_session="fetch"
+        )
+        feeds.registrar_alteracao({l.espaco_id for l in aceitos}, {l.usuario_id for l in aceitos})
+        _notificar(aprovados, "APROVADO")
+        alteracoes.registrar(aprovados)
+        db.session.commit()
+        return aprovados, em_conflito
+
+    with travas_espacos(espacos):
+        aprovados, em_conflito = repetir_se_ocupado(gravar, db.session)
+    if aprovados:
+        versao_agendamentos.incrementar()
+        _publicar("aprovado", aprovados)
+        tarefas.acordar()
+    return aprovados, em_conflito
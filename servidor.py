@@ -0,0 +1,202 @@
+"""Servidor de produção: vários processos, cada um com um pool de threads.
+
+O processo principal inicializa o banco uma única vez (`inicializar_banco`),
+abre o socket e cria WORKERS processos filhos com fork; todos aceitam
+conexões no mesmo socket e atendem com THREADS threads cada. Um filho que
+morre é substituído; SIGTERM/SIGINT encerra todos.
+
+    python servidor.py                                  # 127.0.0.1:8000, 1 processo por CPU
+    python servidor.py --workers 4 --threads 16 --porta 8080
+
+Cada processo tem seus próprios caches (índice de conflitos, contadores,
+dashboard, referências), mas toda escrita registra na própria transação
+uma versão compartilhada em versoes_dados, lida uma vez por requisição:
+uma escrita em um processo invalida os caches dos outros na requisição
+seguinte. O broker SSE e a fila de tarefas são por processo; as páginas
+abertas se ressincronizam pelo /api/changes, então um evento publicado
+em um processo chega aos navegadores dos outros em até um minuto.
+
+Cada stream SSE aberto ocupa uma thread do pool enquanto dura, então cada
+processo aceita no máximo threads // FRACAO_SSE streams; além disso,
+/api/eventos responde 503 e a página fica só com o /api/changes. No
+SIGTERM os streams são encerrados antes de o servidor parar.
+
+Sem fork (Windows), roda um único processo.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+
+log = logging.getLogger("reserveja.servidor")
+
+THREADS_PADRAO = 16
+FRACAO_SSE = 2             # streams SSE por processo: até threads // FRACAO_SSE
+ESPERA_ENCERRAR = 10       # s para os filhos terminarem antes do SIGKILL
+
+
+# --------------------------
+# UM PROCESSO: pool de threads
+# --------------------------
+class Atendente(WSGIRequestHandler):
+    # HTTP/1.0: a conexão fecha ao fim da resposta, então uma conexão
+    # keep-alive ociosa não prende uma thread do pool
+    protocol_version = "HTTP/1.0"
+
+
+class ServidorPool(BaseWSGIServer):
+    """Servidor WSGI do Werkzeug que atende cada conexão numa thread de um pool fixo."""
+
+    multithread = True
+
+    def __init__(self, host, porta, app, threads, fd=None):
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix="http")
+        super().__init__(host, porta, app, handler=Atendente, fd=fd)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._atender, request, client_address)
+
+    def _atender(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:  # noqa: BLE001 - erro de uma conexão não derruba o pool
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def servir(host, porta, threads, fd=None):
+    """Atende neste processo até SIGTERM/SIGINT."""
+    from app import criar_app, db
+    from eventos import broker
+    import tarefas
+
+    app = criar_app()
+    # streams SSE ficam com parte do pool; o resto atende o que não é
+    # tempo real mesmo com muitas abas abertas
+    broker.max_assinantes = threads // FRACAO_SSE
+    servidor = ServidorPool(host, porta, app, threads, fd=fd)
+
+    def encerrar(_sinal, _quadro):
+        # os streams SSE abertos terminam e liberam suas threads
+        broker.encerrar()
+        # shutdown() espera o serve_forever, que roda nesta mesma thread
+        threading.Thread(target=servidor.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, encerrar)
+    signal.signal(signal.SIGINT, encerrar)
+    try:
+        servidor.serve_forever()
+    finally:
+        servidor.server_close()
+        servidor.pool.shutdown(wait=False, cancel_futures=True)
+        tarefas.parar()
+        with app.app_context():
+            db.engine.dispose()
+
+
+# --------------------------
+# VÁRIOS PROCESSOS (pre-fork)
+# --------------------------
+def _filho(sock, host, porta, threads):
+    pid = os.fork()
+    if pid:
+        return pid
+    # no filho: as conexões do pool vieram do pai; abandona sem fechar
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
+    codigo = 0
+    try:
+        servir(host, porta, threads, fd=sock.fileno())
+    except BaseException:  # noqa: BLE001 - o filho nunca volta para o laço do pai
+        log.exception("processo %s terminou com erro", os.getpid())
+        codigo = 1
+    finally:
+        os._exit(codigo)
+
+
+def _sinalizar(filhos, sinal):
+    for pid in list(filhos):
+        try:
+            os.kill(pid, sinal)
+        except ProcessLookupError:
+            pass
+
+
+def supervisionar(host, porta, workers, threads):
+    sock = socket.create_server((host, porta), backlog=1024)
+    sock.set_inheritable(True)
+    filhos = {}
+    parando = threading.Event()
+
+    def encerrar(_sinal, _quadro):
+        parando.set()
+        _sinalizar(filhos, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, encerrar)
+    signal.signal(signal.SIGINT, encerrar)
+
+    for _ in range(workers):
+        filhos[_filho(sock, host, porta, threads)] = time.monotonic()
+    log.info("atendendo em http://%s:%s com %s processo(s) x %s thread(s)", host, porta, workers, threads)
+
+    limite = None
+    while filhos:
+        if parando.is_set():
+            limite = limite or time.monotonic() + ESPERA_ENCERRAR
+            if time.monotonic() > limite:
+                _sinalizar(filhos, signal.SIGKILL)
+        try:
+            pid, situacao = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.2)
+            continue
+        iniciado = filhos.pop(pid, None)
+        if parando.is_set() or iniciado is None:
+            continue
+        log.warning("processo %s saiu (status %s); substituindo", pid, situacao)
+        # filho que morre logo ao subir (porta, banco): não entra em laço apertado
+        if time.monotonic() - iniciado < 1:
+            time.sleep(1)
+        filhos[_filho(sock, host, porta, threads)] = time.monotonic()
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=int(os.environ.get("PORTA", 8000)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WORKERS", os.cpu_count() or 1)),
+                        help="processos (padrão: WORKERS ou um por CPU)")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("THREADS", THREADS_PADRAO)),
+                        help=f"threads por processo (padrão: THREADS ou {THREADS_PADRAO})")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s [%(process)d] %(message)s")
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    # esquema, busca e admin uma vez, antes de existir qualquer worker
+    from app import inicializar_banco
+    inicializar_banco()
+
+    if args.workers <= 1 or not hasattr(os, "fork"):
+        log.info("atendendo em http://%s:%s com 1 processo x %s thread(s)", args.host, args.porta, args.threads)
+        servir(args.host, args.porta, args.threads)
+    else:
+        supervisionar(args.host, args.porta, args.workers, args.threads)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""Fila de tarefas em segundo plano, persistida na tabela `tarefas`.
+
+As rotas (ou os serviços, dentro da mesma transação da escrita) chamam
+`enfileirar` e respondem na hora; threads do próprio processo pegam as
+tarefas PENDENTES com um UPDATE ... RETURNING atômico, então vários
+processos podem dividir a mesma fila. Uma tarefa que ficou EXECUTANDO
+além de PRAZO_EXECUCAO (o processo caiu no meio) volta para a fila; as
+que falham são repetidas com espera crescente até MAX_TENTATIVAS.
+
+TAREFAS_THREADS define quantas threads cada processo usa (padrão 2;
+0 desliga, e `flask processar-tarefas` esvazia a fila em primeiro plano).
+"""
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from models import db, Tarefa
+from conflitos import indice
+import alteracoes
+import arquivo
+import notificacoes
+import relatorios
+
+
+log = logging.getLogger("reserveja.tarefas")
+
+MAX_TENTATIVAS = 3
+PRAZO_EXECUCAO = timedelta(minutes=10)
+RETENCAO = timedelta(hours=24)
+INTERVALO_ESPERA = 5        # s entre consultas à fila quando não há aviso
+INTERVALO_LIMPEZA = 600     # s entre limpezas de tarefas antigas
+
+_tratadores = {}
+_estado = {"app": None, "threads": [], "ultima_limpeza": 0.0}
+_manutencao_lock = threading.Lock()
+_acordar = threading.Event()
+_parar = threading.Event()
+
+
+# --------------------------
+# REGISTRO DE TIPOS
+# --------------------------
+def tarefa(tipo):
+    """Decorador: registra a função que executa as tarefas de `tipo`.
+
+    A função recebe os parâmetros como argumentos nomeados e pode devolver
+    uma string curta (caminho do arquivo gerado, contagem) que fica em
+    `Tarefa.resultado`.
+    """
+    def registrar(funcao):
+        _tratadores[tipo] = funcao
+        return funcao
+    return registrar
+
+
+# --------------------------
+# ENFILEIRAR / CONSULTAR
+# --------------------------
+def enfileirar(tipo, parametros=None, usuario_id=None):
+    """Adiciona a tarefa à sessão atual; o chamador faz o commit e chama acordar()."""
+    if tipo not in _tratadores:
+        raise ValueError(f"Tipo de tarefa desconhecido: {tipo}")
+    t = Tarefa(tipo=tipo, parametros=json.dumps(parametros or {}), usuario_id=usuario_id)
+    db.session.add(t)
+    return t
+
+
+def acordar():
+    _acordar.set()
+
+
+def pasta_resultados(app=None):
+    pasta = os.path.join((app or _estado["app"]).instance_path, "tarefas")
+    os.makedirs(pasta, exist_ok=True)
+    return pasta
+
+
+def situacao(t):
+    return {
+        "id": t.id,
+        "tipo": t.tipo,
+        "status": t.status,
+        "tentativas": t.tentativas,
+        "erro": t.erro if t.status == "ERRO" else None,
+        "criado_em": t.criado_em.isoformat() if t.criado_em else None,
+        "concluido_em": t.concluido_em.isoformat() if t.concluido_em else None,
+    }
+
+
+# --------------------------
+# EXECUÇÃO
+# --------------------------
+def _reservar():
+    # pega a próxima PENDENTE num único comando: dois trabalhadores nunca
+    # ficam com a mesma tarefa
+    agora = datetime.now()
+    proxima = (
+        select(Tarefa.id)
+        .where(Tarefa.status == "PENDENTE", Tarefa.disponivel_em <= agora)
+        .order_by(Tarefa.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    tarefa_id = db.session.execute(
+        update(Tarefa)
+        .where(Tarefa.id == proxima, Tarefa.status == "PENDENTE")
+        .values(status="EXECUTANDO", iniciado_em=agora, tentativas=Tarefa.tentativas + 1)
+        .returning(Tarefa.id)
+    ).scalar()
+    db.session.commit()
+    return tarefa_id
+
+
+def _executar(tarefa_id):
+    t = db.session.get(Tarefa, tarefa_id)
+    tipo, parametros, tentativas = t.tipo, json.loads(t.parametros or "{}"), t.tentativas
+    try:
+        resultado = _tratadores[tipo](**parametros)
+    except Exception as e:  # noqa: BLE001 - qualquer falha vira nova tentativa ou ERRO
+        db.session.rollback()
+        log.warning("tarefa %s (%s) falhou na tentativa %s: %s", tarefa_id, tipo, tentativas, e)
+        t = db.session.get(Tarefa, tarefa_id)
+        t.erro = "".join(traceback.format_exception_only(type(e), e)).strip()
+        if tentativas >= MAX_TENTATIVAS:
+            t.status = "ERRO"
+            t.concluido_em = datetime.now()
+        else:
+            t.status = "PENDENTE"
+            t.disponivel_em = datetime.now() + timedelta(seconds=30 * 2 ** (tentativas - 1))
+        db.session.commit()
+        return
+
+    t = db.session.get(Tarefa, tarefa_id)
+    t.status = "CONCLUIDA"
+    t.resultado = None if resultado is None else str(resultado)
+    t.erro = None
+    t.concluido_em = datetime.now()
+    db.session.commit()
+
+
+def recuperar_abandonadas():
+    """Devolve à fila as tarefas EXECUTANDO há mais que PRAZO_EXECUCAO."""
+    n = Tarefa.query.filter(
+        Tarefa.status == "EXECUTANDO",
+        Tarefa.iniciado_em < datetime.now() - PRAZO_EXECUCAO,
+    ).update({"status": "PENDENTE", "disponivel_em": datetime.now()}, synchronize_session=False)
+    db.session.commit()
+    return n
+
+
+def limpar_antigas():
+    """Apaga tarefas terminadas há mais que RETENCAO e os arquivos delas."""
+    antigas = Tarefa.query.filter(
+        Tarefa.status.in_(["CONCLUIDA", "ERRO"]),
+        Tarefa.concluido_em < datetime.now() - RETENCAO,
+    ).all()
+    pasta = pasta_resultados()
+    for t in antigas:
+        if t.resultado and os.path.dirname(t.resultado) == pasta and os.path.exists(t.resultado):
+            os.remove(t.resultado)
+        db.session.delete(t)
+    db.session.commit()
+    return len(antigas)
+
+
+def processar(limite=None):
+    """Executa PENDENTES até a fila esvaziar (ou `limite`); devolve quantas rodaram."""
+    feitas = 0
+    while limite is None or feitas < limite:
+        tarefa_id = _reservar()
+        if tarefa_id is None:
+            break
+        _executar(tarefa_id)
+        feitas += 1
+    return feitas
+
+
+def agendar_arquivamento():
+    # uma vez por dia (entre todos os processos), se ARQUIVO_DIAS > 0
+    if not arquivo.dias_horizonte():
+        return
+    recente = Tarefa.query.filter(
+        Tarefa.tipo == "arquivar",
+        Tarefa.criado_em > datetime.now() - timedelta(days=1),
+    ).first()
+    if not recente:
+        enfileirar("arquivar")
+        db.session.commit()
+
+
+def _manutencao():
+    # limpeza periódica (inclui a poda do log de alterações); uma thread
+    # por vez, as outras seguem processando a fila
+    if not _manutencao_lock.acquire(blocking=False):
+        return
+    try:
+        agora = time.monotonic()
+        if agora - _estado["ultima_limpeza"] < INTERVALO_LIMPEZA:
+            return
+        _estado["ultima_limpeza"] = agora
+        recuperar_abandonadas()
+        limpar_antigas()
+        alteracoes.podar()
+        agendar_arquivamento()
+    finally:
+        _manutencao_lock.release()
+
+
+def _trabalhar(app):
+    while not _parar.is_set():
+        try:
+            with app.app_context():
+                _manutencao()
+                processar()
+        except Exception:  # noqa: BLE001 - a thread não pode morrer (banco ocupado etc.)
+            log.exception("erro no trabalhador de tarefas")
+        _acordar.wait(INTERVALO_ESPERA)
+        _acordar.clear()
+
+
+# --------------------------
+# CICLO DE VIDA
+# --------------------------
+def iniciar(app):
+    """Guarda o app e sobe as threads trabalhadoras (TAREFAS_THREADS)."""
+    _estado["app"] = app
+    quantidade = int(app.config.get("TAREFAS_THREADS", os.environ.get("TAREFAS_THREADS", 2)))
+    if _estado["threads"] or quantidade <= 0:
+        return
+    _parar.clear()
+    for i in range(quantidade):
+        th = threading.Thread(target=_trabalhar, args=(app,), name=f"tarefas-{i}", daemon=True)
+        th.start()
+        _estado["threads"].append(th)
+
+
+def parar(espera=5):
+    _parar.set()
+    _acordar.set()
+    for th in _estado["threads"]:
+        th.join(espera)
+    _estado["threads"].clear()
+
+
+# --------------------------
+# TIPOS DE TAREFA
+# --------------------------
+@tarefa("notificar_decisao")
+def _notificar_decisao(ids, decisao):
+    return notificacoes.notificar_decisao(ids, decisao)
+
+
+@tarefa("exportar_pdf")
+def _exportar_pdf(**parametros):
+    caminho = os.path.join(pasta_resultados(), f"agenda_{datetime.now():%Y%m%d%H%M%S%f}.pdf")
+    try:
+        relatorios.gerar_pdf_agenda(caminho, parametros)
+    except BaseException:
+        if os.path.exists(caminho):
+            os.remove(caminho)
+        raise
+    return caminho
+
+
+@tarefa("arquivar")
+def _arquivar(dias=None):
+    movidos = arquivo.arquivar(dias)
+    if movidos:
+        indice.invalidar()
+    return movidos